@@ -7,12 +7,16 @@ from flask_moment import Moment
 from flask_sqlalchemy import SQLAlchemy
 
 from config import config
-from .search import init_search
+from .activity import LastSeenTracker
+from .principals import CredentialCache, PrincipalCache, RolePermissions
+from .search import init_search, IndexQueue, SearchCache, Suggestions
+from .storage import init_storage, UploadExecutor
 
 
 babel = Babel()
 bootstrap = Bootstrap()
 db = SQLAlchemy()
+last_seen = LastSeenTracker()
 mail = Mail()
 moment = Moment()
 
@@ -32,13 +36,27 @@ def create_app(config_name: str) -> Flask:
     config[config_name].init_app(app)
     
     app.elasticsearch = init_search(config_name)
+    app.search_cache = SearchCache(app)
+    app.search_queue = IndexQueue(app)
+    app.suggestions = Suggestions(app)
+    app.storage = init_storage(app)
+    app.principals = PrincipalCache(app)
+    app.credentials = CredentialCache(app)
+    app.role_permissions = RolePermissions(app)
+    
+    from .transcode import Transcoder
+    from .waveform import WaveformBuilder
+    app.transcoder = Transcoder(app)
+    app.waveforms = WaveformBuilder(app)
     
     babel.init_app(app)
     bootstrap.init_app(app)
     db.init_app(app)
+    last_seen.init_app(app, db)
     login_manager.init_app(app)
     mail.init_app(app)
     moment.init_app(app)
+    app.uploader = UploadExecutor(app)
     
     from .main import main as main_blueprint
     app.register_blueprint(main_blueprint)
@@ -0,0 +1,128 @@
+import atexit
+from datetime import datetime, timedelta
+from threading import Lock
+from time import monotonic
+from weakref import WeakSet
+
+from flask import current_app
+
+
+# Trackers flushed when process exits.
+_trackers = WeakSet()
+
+
+@atexit.register
+def _flush_trackers():
+    """Flush remaining activity of every tracker when process exits."""
+    for tracker in list(_trackers):
+        tracker._flush_at_exit()
+
+
+class MemoryActivityStore:
+    """Store of not flushed user activity kept in process memory.
+
+    Any object with the same "record" and "drain" methods can be used
+    as a store for LastSeenTracker.
+    """
+
+    def __init__(self):
+        self._seen = {}
+        self._lock = Lock()
+
+    def record(self, user_id, when):
+        """Remember time user was seen.
+
+        :param user_id: user identifier.
+        :param when: date and time user was seen.
+        """
+        with self._lock:
+            if self._seen.get(user_id) is None or self._seen[user_id] < when:
+                self._seen[user_id] = when
+
+    def drain(self):
+        """Return all remembered activity and clear store."""
+        with self._lock:
+            seen, self._seen = self._seen, {}
+        return seen
+
+
+class LastSeenTracker:
+    """Flask extension which coalesces users last seen updates.
+
+    Activity is recorded in store and written to database with single
+    batched update once per LAST_SEEN_FLUSH_INTERVAL seconds. Users seen
+    less than LAST_SEEN_THRESHOLD seconds ago are not recorded at all.
+
+    :param app: flask application instance.
+    :param db: flask sqlalchemy instance.
+    :param store: store for not flushed activity.
+    """
+
+    def __init__(self, app=None, db=None, store=None):
+        self.store = store or MemoryActivityStore()
+        self._last_flush = monotonic()
+        self._apps = WeakSet()
+        if app is not None:
+            self.init_app(app, db)
+
+    def init_app(self, app, db):
+        """Initialize tracker for application.
+
+        :param app: flask application instance.
+        :param db: flask sqlalchemy instance.
+        """
+        self.db = db
+        app.config.setdefault("LAST_SEEN_FLUSH_INTERVAL", 60)
+        app.config.setdefault("LAST_SEEN_THRESHOLD", 60)
+        app.teardown_request(self._teardown)
+        self._apps.add(app)
+        _trackers.add(self)
+
+    def touch(self, user):
+        """Record that user is active now.
+
+        :param user: application user.
+        """
+        now = datetime.utcnow()
+        threshold = timedelta(seconds=current_app.config["LAST_SEEN_THRESHOLD"])
+        if user.last_seen is not None and now - user.last_seen < threshold:
+            return
+        self.store.record(user.user_id, now)
+
+    def flush(self):
+        """Write recorded activity to database with single batched update."""
+        self._last_flush = monotonic()
+        seen = self.store.drain()
+        if not seen:
+            return
+        users = self.db.metadata.tables["users"]
+        statement = users.update() \
+            .where(users.c.user_id == self.db.bindparam("_user_id")) \
+            .values(last_seen=self.db.bindparam("_last_seen"))
+        try:
+            with self.db.engine.begin() as connection:
+                connection.execute(statement, [
+                    {"_user_id": user_id, "_last_seen": when} for user_id, when in seen.items()
+                ])
+        except Exception:
+            for user_id, when in seen.items():
+                self.store.record(user_id, when)
+            raise
+
+    def _teardown(self, exc):
+        """Flush activity after request if flush interval has passed."""
+        if monotonic() - self._last_flush < current_app.config["LAST_SEEN_FLUSH_INTERVAL"]:
+            return
+        try:
+            self.flush()
+        except Exception:
+            current_app.logger.exception("Failed to flush users last seen.")
+
+    def _flush_at_exit(self):
+        """Flush remaining activity when process exits."""
+        for app in list(self._apps):
+            with app.app_context():
+                try:
+                    self.flush()
+                except Exception:
+                    app.logger.exception("Failed to flush users last seen.")
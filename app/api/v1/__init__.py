@@ -2,4 +2,4 @@ from flask import Blueprint
 
 api = Blueprint("api", __name__)
 
-from . import authentication, comment, decorators, errors, song, user
\ No newline at end of file
+from . import authentication, comment, decorators, errors, search, song, upload, user
\ No newline at end of file
@@ -1,8 +1,8 @@
-from flask import g, jsonify
+from flask import current_app, g, jsonify, request
 from flask_httpauth import HTTPBasicAuth
 
 from . import api
-from .errors import unauthorized
+from .errors import bad_request, unauthorized
 from ...models import AnonymousUser, User
 
 
@@ -17,11 +17,10 @@ def verify_password(username_or_token, password):
     :param password: user password.
     """
     if username_or_token == "":
-        print("Here")
         g.current_user = AnonymousUser()
         return True 
     if password == "":
-        g.current_user = User.validate_auth_token(username_or_token)
+        g.current_user = User.principal_for_token(username_or_token)
         g.token_used = True
         return g.current_user is not None
     user = User.query.filter_by(username=username_or_token).first()
@@ -29,7 +28,7 @@ def verify_password(username_or_token, password):
         return False 
     g.current_user = user 
     g.token_used = False 
-    return user.verify_password(password)
+    return current_app.credentials.verify(user, password)
 
 
 @auth.error_handler
@@ -44,7 +43,7 @@ def before_request():
     """API validaion for confirmed user."""
     if not g.current_user.is_anonymous \
         and not g.current_user.confirmed:
-            unauthorized("Unconfirmed user.")
+            return unauthorized("Unconfirmed user.")
 
 
 @api.route("/tokens/", methods=["POST"])
@@ -52,4 +51,34 @@ def get_token():
     """Get API authentication token."""
     if g.current_user.is_anonymous or g.token_used:
         return unauthorized("Invalid credentials.")
-    return jsonify({"token": g.current_user.generate_auth_token(), "expiration": 3600})
+    return jsonify(tokens_json(g.current_user))
+
+
+@api.route("/tokens/refresh", methods=["POST"])
+def refresh_token():
+    """Exchange refresh token for new API authentication tokens."""
+    token = (request.get_json(silent=True) or {}).get("refresh_token")
+    if not token:
+        return bad_request("Refresh token is required.")
+    user = User.validate_refresh_token(token)
+    if user is None or not user.confirmed:
+        return unauthorized("Invalid refresh token.")
+    return jsonify(tokens_json(user))
+
+
+def tokens_json(user):
+    """Issue API tokens of user in json format.
+    
+    :param token: API auth token.
+    :param expiration: time until auth token is valid.
+    :param refresh_token: token to get new auth token without password.
+    :param refresh_expiration: time until refresh token is valid.
+    """
+    expiration = current_app.config["API_TOKEN_EXPIRATION"]
+    refresh_expiration = current_app.config["API_REFRESH_TOKEN_EXPIRATION"]
+    return {
+        "token": user.generate_auth_token(expiration),
+        "expiration": expiration,
+        "refresh_token": user.generate_refresh_token(refresh_expiration),
+        "refresh_expiration": refresh_expiration
+    }
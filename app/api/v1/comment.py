@@ -1,6 +1,9 @@
-from flask import current_app, url_for, jsonify, request
+from flask import current_app, jsonify
 
 from . import api 
+from .expand import comments_query, expand_comments
+from .pagination import paginate_collection
+from ...conditional import conditional, conditional_body, make_etag
 from ...models import Comment
 
 
@@ -8,26 +11,18 @@ from ...models import Comment
 def get_comments():
     """API comments route handler.
     
-    :GET get all comments.
+    :GET get all comments by "page" or "after" cursor.
     """
-    page = request.args.get("page", 1, type=int)
-    pagination = Comment.query.order_by(Comment.timestamp.desc()).paginate(
-        page, per_page=current_app.config["COMMENTS_PER_REQUEST"],
-        error_out=False
+    comments, prev_url, next_url = paginate_collection(
+        comments_query(Comment.query), Comment.timestamp, Comment.comment_id,
+        current_app.config["COMMENTS_PER_REQUEST"], "api.get_comments"
     )
-    prev_url = None
-    if pagination.has_prev:
-        prev_url = url_for("api.get_comments", page=page-1, _external=True)
-    next_url = None 
-    if pagination.has_next:
-        next_url = url_for("api.get_comments", page=page+1, _extrnal=True)
-    comments = pagination.items 
     resp = {
         "prev_url": prev_url,
-        "comments": [url_for("api.get_comment", comment_id=comment.comment_id, _external=True) for comment in comments],
+        "comments": expand_comments(comments),
         "next_url": next_url
     }
-    return jsonify(resp)
+    return conditional_body(jsonify(resp))
 
 
 @api.route("/comments/<int:comment_id>", methods=["GET"])
@@ -38,4 +33,5 @@ def get_comment(comment_id):
     :GET get comment.
     """
     comment = Comment.query.get_or_404(comment_id)
-    return jsonify(comment.to_json())
+    etag = make_etag(comment.comment_id, comment.updated_at)
+    return conditional(etag, comment.updated_at, lambda: jsonify(comment.to_json()))
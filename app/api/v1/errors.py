@@ -1,6 +1,7 @@
 from flask import request, jsonify 
 
 from app.exceptions import ValidationError
+from app.storage import UploadQueueFull
 from . import api
 
 
@@ -34,7 +35,23 @@ def unauthorized(message):
     return resp
 
 
+def service_unavailable(message):
+    """API service unavailable error.
+    
+    :return json with message and 503 code error.
+    """
+    resp = jsonify({"error": "service unavailable", "message": message})
+    resp.status_code = 503
+    return resp
+
+
 @api.errorhandler(ValidationError)
 def validation_error(e):
     """API validation error."""
     return bad_request(e.args[0])
+
+
+@api.errorhandler(UploadQueueFull)
+def upload_queue_full(e):
+    """API upload queue full error."""
+    return service_unavailable("Server is busy, try to upload later.")
@@ -0,0 +1,114 @@
+from flask import request, url_for
+
+from ... import db
+from ...models import Comment, Song, User
+
+
+def requested(name):
+    """Get set of comma separated values of request argument.
+    
+    :param name: name of request argument.
+    """
+    return {value.strip() for value in request.args.get(name, "").split(",") if value.strip()}
+
+
+def select_fields(json_item, fields):
+    """Leave only requested fields of item, all fields if none requested.
+    
+    :param json_item: item in json format.
+    :param fields: names of requested fields.
+    """
+    if not fields:
+        return json_item
+    return {key: value for key, value in json_item.items() if key in fields}
+
+
+def songs_query(query):
+    """Join authors to songs query if songs are going to be expanded.
+    
+    Every expanded song links to its author, so authors are joined
+    even without "author" in "?expand=".
+    
+    :param query: query of songs.
+    """
+    if "songs" in requested("expand"):
+        query = query.options(db.joinedload(Song.author), db.selectinload(Song.renditions))
+    return query
+
+
+def comments_query(query):
+    """Join authors and songs to comments query if comments are going to be expanded.
+    
+    Every expanded comment links to its author and song, so they are
+    joined even without "author" or "song" in "?expand=".
+    
+    :param query: query of comments.
+    """
+    expand = requested("expand")
+    if "comments" in expand:
+        query = query.options(db.joinedload(Comment.author),
+                              db.joinedload(Comment.song).joinedload(Song.author))
+    if {"comments", "song"} <= expand:
+        query = query.options(db.joinedload(Comment.song).selectinload(Song.renditions))
+    return query
+
+
+def expand_songs(songs):
+    """Represent songs as urls or, with "?expand=songs", as full objects.
+    
+    "?expand=songs,author" embeds song authors, "?fields=" selects song fields.
+    
+    :param songs: page of songs.
+    """
+    expand = requested("expand")
+    if "songs" not in expand:
+        return [url_for("api.get_song", song_id=song.song_id, _external=True) for song in songs]
+    fields = requested("fields")
+    counts = User.count_songs([song.author_id for song in songs]) if "author" in expand else {}
+    json_songs = []
+    for song in songs:
+        json_song = song.to_json()
+        if "author" in expand:
+            json_song["published_by"] = song.author.to_json(songs_count=counts.get(song.author_id, 0))
+        json_songs.append(select_fields(json_song, fields))
+    return json_songs
+
+
+def expand_comments(comments):
+    """Represent comments as urls or, with "?expand=comments", as full objects.
+    
+    "?expand=comments,author,song" embeds comment authors and songs,
+    "?fields=" selects comment fields.
+    
+    :param comments: page of comments.
+    """
+    expand = requested("expand")
+    if "comments" not in expand:
+        return [url_for("api.get_comment", comment_id=comment.comment_id, _external=True)
+                for comment in comments]
+    fields = requested("fields")
+    counts = User.count_songs([comment.author_id for comment in comments]) if "author" in expand else {}
+    json_comments = []
+    for comment in comments:
+        json_comment = comment.to_json()
+        if "author" in expand:
+            json_comment["author"] = comment.author.to_json(songs_count=counts.get(comment.author_id, 0))
+        if "song" in expand:
+            json_comment["song"] = comment.song.to_json()
+        json_comments.append(select_fields(json_comment, fields))
+    return json_comments
+
+
+def expand_users(users):
+    """Represent users as urls or, with "?expand=users", as full objects.
+    
+    "?fields=" selects user fields.
+    
+    :param users: page of users.
+    """
+    if "users" not in requested("expand"):
+        return [url_for("api.get_user", username=user.username, _external=True) for user in users]
+    fields = requested("fields")
+    counts = User.count_songs([user.user_id for user in users])
+    return [select_fields(user.to_json(songs_count=counts.get(user.user_id, 0)), fields)
+            for user in users]
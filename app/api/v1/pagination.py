@@ -0,0 +1,89 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from flask import request, url_for
+
+from ...exceptions import ValidationError
+
+
+def encode_cursor(timestamp, ident):
+    """Encode position in collection to opaque token.
+    
+    :param timestamp: timestamp of last item on page.
+    :param ident: identifier of last item on page.
+    """
+    position = [timestamp.isoformat() if timestamp is not None else None, ident]
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode().rstrip("=")
+
+
+def decode_cursor(token):
+    """Decode opaque token to timestamp and identifier.
+    
+    :param token: token made by "encode_cursor".
+    """
+    try:
+        timestamp, ident = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+        if timestamp is not None:
+            timestamp = datetime.fromisoformat(timestamp)
+        if not isinstance(ident, int):
+            raise ValueError(ident)
+    except (binascii.Error, TypeError, ValueError):
+        raise ValidationError("Invalid cursor.")
+    return timestamp, ident
+
+
+def paginate_after(query, timestamp, ident, after, per_page):
+    """Get page of query items after cursor, newest first, without counting all items.
+    
+    :param query: query of collection items.
+    :param timestamp: timestamp column items are ordered by.
+    :param ident: primary key column breaking ties of timestamp.
+    :param after: token of last item of previous page or None for first page.
+    :param per_page: amount of per page items.
+    :return items and token of next page or None.
+    """
+    if after:
+        after_timestamp, after_ident = decode_cursor(after)
+        if after_timestamp is None:
+            query = query.filter(timestamp.is_(None), ident < after_ident)
+        else:
+            # Redundant bound lets database seek in index instead of filtering from start.
+            query = query.filter(timestamp <= after_timestamp,
+                                 (timestamp < after_timestamp) | (ident < after_ident))
+    items = query.order_by(timestamp.desc(), ident.desc()).limit(per_page + 1).all()
+    if len(items) <= per_page:
+        return items, None
+    items = items[:per_page]
+    last = items[-1]
+    return items, encode_cursor(getattr(last, timestamp.key), getattr(last, ident.key))
+
+
+def paginate_collection(query, timestamp, ident, per_page, endpoint, **values):
+    """Paginate collection by "after" cursor if it is in request, by "page" otherwise.
+    
+    :param query: query of collection items.
+    :param timestamp: timestamp column items are ordered by.
+    :param ident: primary key column breaking ties of timestamp.
+    :param per_page: amount of per page items.
+    :param endpoint: endpoint of collection.
+    :param values: arguments of endpoint.
+    :return items, url of previous page and url of next page.
+    """
+    if "after" in request.args:
+        items, after = paginate_after(query, timestamp, ident, request.args["after"], per_page)
+        next_url = url_for(endpoint, after=after, _external=True, **values) if after else None
+        return items, None, next_url
+    page = request.args.get("page", 1, type=int)
+    pagination = query.order_by(timestamp.desc(), ident.desc()).paginate(
+        page, per_page=per_page,
+        error_out=False
+    )
+    prev_url = None
+    if pagination.has_prev:
+        prev_url = url_for(endpoint, page=page-1, _external=True, **values)
+    next_url = None
+    if pagination.has_next:
+        next_url = url_for(endpoint, page=page+1, _external=True, **values)
+    return pagination.items, prev_url, next_url
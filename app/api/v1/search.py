@@ -0,0 +1,28 @@
+from flask import current_app, jsonify, request, url_for
+
+from . import api
+
+
+@api.route("/search/suggest", methods=["GET"])
+def suggest():
+    """API search suggestions route handler.
+    
+    :GET return songs and users with name starting with "q".
+    """
+    prefix = request.args.get("q", "", type=str)
+    limit = min(request.args.get("limit", current_app.config["SUGGEST_LIMIT"], type=int),
+                current_app.config["SUGGEST_LIMIT"])
+    if not prefix.strip() or limit <= 0:
+        return jsonify({"songs": [], "users": []})
+    found = current_app.suggestions.suggest(prefix, limit)
+    resp = {
+        "songs": [
+            {"song_id": song_id, "name": name, "url": url_for("api.get_song", song_id=song_id, _external=True)}
+            for song_id, name in found.get("songs", [])
+        ],
+        "users": [
+            {"username": username, "url": url_for("api.get_user", username=username, _external=True)}
+            for _, username in found.get("users", [])
+        ]
+    }
+    return jsonify(resp)
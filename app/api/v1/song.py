@@ -1,36 +1,36 @@
-from flask import current_app, g, jsonify, request, url_for
+from base64 import b64encode
+
+from flask import abort, current_app, g, jsonify, request, url_for
 
 from . import api
 from .authentication import auth
 from .decorators import permission_required
 from .errors import forbidden
+from .expand import comments_query, expand_comments, expand_songs, songs_query
+from .pagination import paginate_collection
+from ...conditional import conditional, conditional_body, make_etag
+from ...hls import PLAYLIST_MIME_TYPE, master_playlist, playlist_name
 from ...models import Comment, Song, Permission, db
+from ...transcode import requested_quality, vary_on_client_hints
+from ...waveform import waveform_name
 
 
 @api.route("/songs/", methods=["GET"])
 def get_songs():
     """API songs route handler.
     
-    :GET get all songs.
+    :GET get all songs by "page" or "after" cursor.
     """
-    page = request.args.get("page", 1, type=int)
-    pagination = Song.query.paginate(
-        page, per_page=current_app.config["SONGS_PER_PAGE"],
-        error_out=False
+    songs, prev_url, next_url = paginate_collection(
+        songs_query(Song.query), Song.timestamp, Song.song_id,
+        current_app.config["SONGS_PER_PAGE"], "api.get_songs"
     )
-    prev_url = None 
-    if pagination.has_prev:
-        prev_url = url_for("api.get_songs", page=page-1, _external=True)
-    next_url = None 
-    if pagination.has_next:
-        next_url = url_for("api.get_songs", page=page+1, _external=True)
-    songs = pagination.items
     resp = {
         "prev_url": prev_url,
-        "songs": [url_for("api.get_song", song_id=song.song_id, _external=True) for song in songs],
+        "songs": expand_songs(songs),
         "next_url": next_url
     }
-    return jsonify(resp)
+    return conditional_body(jsonify(resp))
 
 
 @api.route("/songs/<int:song_id>", methods=["GET"])
@@ -41,7 +41,11 @@ def get_song(song_id):
     :GET return song info.
     """
     song = Song.query.get_or_404(song_id)
-    return jsonify(song.to_json())
+    rendition = song.pick_rendition(requested_quality(request))
+    etag = make_etag(song.song_id, song.updated_at, song.like_count, song.comment_count,
+                     song.upload_state, song.url, rendition and rendition.name)
+    resp = conditional(etag, song.updated_at, lambda: jsonify(song.to_json(rendition)))
+    return vary_on_client_hints(resp)
 
 
 @api.route("/songs/<int:song_id>/comments", methods=["GET"])
@@ -49,27 +53,19 @@ def get_song_comments(song_id):
     """API song comments route handler.
     
     :param song_id: unique song identifier.
-    :GET return all song comments.
+    :GET return all song comments by "page" or "after" cursor.
     """
     song = Song.query.get_or_404(song_id)
-    page = request.args.get("page", 1, type=int)
-    pagination = song.comments.order_by(Comment.timestamp.desc()).paginate(
-        page, per_page=current_app.config["COMMENTS_PER_REQUEST"],
-        error_out=False
+    comments, prev_url, next_url = paginate_collection(
+        comments_query(song.comments), Comment.timestamp, Comment.comment_id,
+        current_app.config["COMMENTS_PER_REQUEST"], "api.get_song_comments", song_id=song.song_id
     )
-    prev_url = None 
-    if pagination.has_prev:
-        prev_url = url_for("api.get_song_comments", song_id=song.song_id, page=page-1, _external=True)
-    next_url = None 
-    if pagination.has_next:
-        next_url = url_for("api.get_song_comments", song_id=song.song_id, page=page+1, _external=True)
-    comments = pagination.items 
     resp = {
         "prev_url": prev_url,
-        "comments": [url_for("api.get_comment", comment_id=comment.comment_id, _external=True) for comment in comments],
+        "comments": expand_comments(comments),
         "next_url": next_url
     }
-    return jsonify(resp)
+    return conditional_body(jsonify(resp))
 
 
 @api.route("/songs/<int:song_id>/comments/", methods=["POST"])
@@ -83,7 +79,7 @@ def new_song_comment(song_id):
     """
     song = Song.query.get_or_404(song_id)
     comment = Comment.from_json(request.json)
-    comment.author = g.current_user
+    comment.author_id = g.current_user.user_id
     comment.song = song 
     db.session.add(comment)
     db.session.commit()
@@ -101,8 +97,80 @@ def update_song(song_id):
     :PUT update song name and lyrics.
     """
     song = Song.query.get_or_404(song_id)
-    if song.author != g.current_user:
+    if song.author_id != g.current_user.user_id:
         return forbidden("Can't update someone else song.")
     song.update_json(request.json)
     return jsonify(song.to_json()), 200, \
         {"song_location": url_for("api.get_song", song_id=song.song_id, _external=True)}
+
+
+@api.route("/songs/<int:song_id>/waveform", methods=["GET"])
+def get_song_waveform(song_id):
+    """API song waveform route handler.
+    
+    :param song_id: unique song identifier.
+    :GET return packed waveform peaks, in json with base64 data if "?encoding=base64".
+    """
+    song = Song.query.get_or_404(song_id)
+    if not song.has_waveform:
+        abort(404)
+    encoding = request.args.get("encoding")
+    etag = make_etag(song.song_id, song.url, encoding)
+    
+    def render():
+        with current_app.storage.open(waveform_name(song.song_id)) as f:
+            data = f.read()
+        if encoding == "base64":
+            return jsonify({"encoding": "base64", "data": b64encode(data).decode("ascii")})
+        return current_app.response_class(data, mimetype="application/octet-stream")
+    
+    return conditional(etag, None, render, cache_control="public, max-age=31536000, immutable")
+
+
+@api.route("/songs/<int:song_id>/hls.m3u8", methods=["GET"])
+def get_song_playlist(song_id):
+    """API song HLS master playlist route handler.
+    
+    :param song_id: unique song identifier.
+    :GET return master playlist of segmented renditions.
+    """
+    song = Song.query.get_or_404(song_id)
+    variants = song.playlist_variants()
+    if not variants:
+        abort(404)
+    versions = [(name, bitrate, song.playlist_version(name)) for name, bitrate in variants]
+    etag = make_etag(song.song_id, versions)
+    
+    def render():
+        return current_app.response_class(master_playlist(variants), mimetype=PLAYLIST_MIME_TYPE)
+    
+    return conditional(etag, None, render)
+
+
+@api.route("/songs/<int:song_id>/hls/<name>.m3u8", methods=["GET"])
+def get_song_media_playlist(song_id, name):
+    """API song HLS media playlist route handler.
+    
+    Playlist lists storage urls of segments, which are fetched from
+    storage directly. It is revalidated, as rendition may be segmented
+    anew under the same url.
+    
+    :param song_id: unique song identifier.
+    :param name: rendition name or "original".
+    :GET return media playlist of rendition segments.
+    """
+    song = Song.query.get_or_404(song_id)
+    version = song.playlist_version(name)
+    if version is None:
+        abort(404)
+    etag = make_etag(song.song_id, name, version)
+    
+    def render():
+        try:
+            f = current_app.storage.open(playlist_name(song.song_id, name))
+        except FileNotFoundError:
+            abort(404)
+        with f:
+            return current_app.response_class(f.read(), mimetype=PLAYLIST_MIME_TYPE)
+    
+    return conditional(etag, None, render)
@@ -0,0 +1,66 @@
+from flask import g, jsonify, request, url_for
+
+from . import api
+from .decorators import permission_required
+from ...models import Permission
+from ...uploads import ChunkedUpload
+
+
+def upload_json(upload):
+    """Convert chunked upload to json for API client.
+    
+    :param upload: chunked upload.
+    """
+    json_upload = upload.status_json(url_for("api.upload_chunk", upload_id=upload.upload_id, _external=True))
+    json_upload["song"] = url_for("api.get_song", song_id=upload.song_id, _external=True)
+    return json_upload
+
+
+def get_own_upload(upload_id):
+    """Get upload started by current user or None."""
+    upload = ChunkedUpload.get(upload_id)
+    if upload is None or upload.user_id != g.current_user.user_id:
+        return None
+    return upload
+
+
+@api.route("/uploads/", methods=["POST"])
+@permission_required(Permission.PUBLISH)
+def new_upload():
+    """API new upload route handler.
+    
+    :POST create song and start its chunked upload.
+    """
+    upload = ChunkedUpload.start(g.current_user, request.json or {})
+    return jsonify(upload_json(upload)), 201, \
+        {"Location": url_for("api.upload_chunk", upload_id=upload.upload_id, _external=True)}
+
+
+@api.route("/uploads/<upload_id>", methods=["GET"])
+@permission_required(Permission.PUBLISH)
+def get_upload(upload_id):
+    """API upload route handler.
+    
+    :param upload_id: unique upload identifier.
+    :GET return how many bytes are received to resume upload.
+    """
+    upload = get_own_upload(upload_id)
+    if upload is None:
+        return jsonify({"error": "not found"}), 404
+    return jsonify(upload_json(upload))
+
+
+@api.route("/uploads/<upload_id>", methods=["PUT"])
+@permission_required(Permission.PUBLISH)
+def upload_chunk(upload_id):
+    """API upload chunk route handler.
+    
+    :param upload_id: unique upload identifier.
+    :PUT append chunk described by Content-Range header to upload.
+    """
+    upload = get_own_upload(upload_id)
+    if upload is None:
+        return jsonify({"error": "not found"}), 404
+    upload.write_chunk(request.stream, request.headers.get("Content-Range"),
+                       request.headers.get("X-Chunk-Sha256"))
+    return jsonify(upload_json(upload))
@@ -4,6 +4,9 @@ from . import api
 from .authentication import auth
 from .decorators import permission_required
 from .errors import forbidden
+from .expand import expand_songs, expand_users, songs_query
+from .pagination import paginate_collection
+from ...conditional import conditional, conditional_body, make_etag
 from ...models import User, Song, Permission
 
 
@@ -11,26 +14,18 @@ from ...models import User, Song, Permission
 def get_users():
     """API users route handler.
     
-    :GET get all application users.
+    :GET get all application users by "page" or "after" cursor.
     """
-    page = request.args.get("page", 1, type=int)
-    pagination = User.query.paginate(
-        page, per_page=current_app.config["USERS_PER_REQUEST"],
-        error_out=False
+    users, prev_url, next_url = paginate_collection(
+        User.query, User.member_since, User.user_id,
+        current_app.config["USERS_PER_REQUEST"], "api.get_users"
     )
-    prev_url = None 
-    if pagination.has_prev:
-        prev_url = url_for("api.get_users", page=page-1, _extrnal=True)
-    next_url = None 
-    if pagination.has_next:
-        next_url = url_for("api.get_users", page=page+1, _external=True)
-    users = pagination.items
     resp = {
         "prev_url": prev_url,
-        "users": [url_for("api.get_user", username=user.username, _external=True) for user in users],
+        "users": expand_users(users),
         "next_url": next_url
     }
-    return jsonify(resp)
+    return conditional_body(jsonify(resp))
 
 
 @api.route("/users/<username>", methods=["GET"])
@@ -43,7 +38,9 @@ def get_user(username):
     user = User.query.filter_by(username=username).first()
     if user is None:
         abort(404)
-    return jsonify(user.to_json())
+    songs_count = user.songs.count()
+    etag = make_etag(user.user_id, user.updated_at, user.last_seen, songs_count)
+    return conditional(etag, user.updated_at, lambda: jsonify(user.to_json(songs_count=songs_count)))
 
 
 @api.route("/users/<username>", methods=["PUT"])
@@ -55,7 +52,9 @@ def update_user(username):
     :PUT update info about user.
     """
     user = User.query.filter_by(username=username).first()
-    if g.current_user != user and not g.current_user.can(Permission.ADMIN):
+    if user is None:
+        abort(404)
+    if g.current_user.is_anonymous or g.current_user.user_id != user.user_id and not g.current_user.can(Permission.ADMIN):
         return forbidden("Can't update someone else account.")
     user.update_json(request.json)
     return jsonify(user.to_json()), 200, \
@@ -67,26 +66,18 @@ def get_user_songs(username):
     """API user songs route handler.
     
     :param username: user nick name.
-    :GET return user songs.
+    :GET return user songs by "page" or "after" cursor.
     """
     user = User.query.filter_by(username=username).first()
     if user is None:
         abort(404)
-    page = request.args.get("page", 1, type=int)
-    pagination = user.songs.order_by(Song.timestamp.desc()).paginate(
-        page, per_page=current_app.config["SONGS_PER_PAGE"],
-        error_out=False
+    songs, prev_url, next_url = paginate_collection(
+        songs_query(user.songs), Song.timestamp, Song.song_id,
+        current_app.config["SONGS_PER_PAGE"], "api.get_user_songs", username=username
     )
-    prev_url = None
-    if pagination.has_prev:
-        prev_url = url_for("api.get_user_songs", username=username, page=page-1, _external=True)
-    next_url = None 
-    if pagination.has_next:
-        next_url = url_for("api.get_user_songs", username=username, page=page+1, _external=True)
-    songs = pagination.items
     resp = {
         "prev_url": prev_url,
-        "songs": [url_for("api.get_song", song_id=song.song_id, _external=True) for song in songs],
+        "songs": expand_songs(songs),
         "next_url": next_url
     }
-    return jsonify(resp)  
+    return conditional_body(jsonify(resp))  
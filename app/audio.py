@@ -0,0 +1,307 @@
+import os
+import struct
+from typing import NamedTuple
+
+
+# Amount of bytes read from file head and tail when probing.
+PROBE_SIZE = 64 * 1024
+
+MIME_TYPES = {
+    "mp3": "audio/mpeg",
+    "pcm": "audio/wav",
+    "flac": "audio/flac",
+    "vorbis": "audio/ogg",
+    "opus": "audio/ogg"
+}
+
+# MPEG audio bitrates in kbps by (version is MPEG1, layer).
+MPEG_BITRATES = {
+    (True, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (True, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (True, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (False, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (False, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (False, 3): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160)
+}
+
+# MPEG audio sample rates by version bits.
+MPEG_SAMPLE_RATES = {
+    3: (44100, 48000, 32000),
+    2: (22050, 24000, 16000),
+    0: (11025, 12000, 8000)
+}
+
+
+class AudioInfo(NamedTuple):
+    """Technical description of audio file.
+
+    :param codec: audio codec name.
+    :param duration: duration in seconds.
+    :param bitrate: average bitrate in bits per second.
+    :param sample_rate: samples per second.
+    :param channels: number of channels.
+    :param size: file size in bytes.
+    """
+    codec: str
+    duration: float
+    bitrate: int
+    sample_rate: int
+    channels: int
+    size: int
+
+    @property
+    def mime_type(self):
+        """MIME type of audio file."""
+        return MIME_TYPES[self.codec]
+
+
+class MpegFrame(NamedTuple):
+    """Header of MPEG audio frame.
+
+    :param offset: position of frame in file.
+    :param length: frame length in bytes.
+    :param bitrate: frame bitrate in bits per second.
+    :param sample_rate: samples per second.
+    :param channels: number of channels.
+    :param samples: samples per frame.
+    :param mpeg1: is frame MPEG1 or MPEG2/2.5.
+    """
+    offset: int
+    length: int
+    bitrate: int
+    sample_rate: int
+    channels: int
+    samples: int
+    mpeg1: bool
+
+
+def probe(path):
+    """Describe audio file reading only its headers and tail.
+
+    :param path: path of audio file.
+    :return audio info or None if format isn't recognized.
+    """
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        head = f.read(PROBE_SIZE)
+        for parse in (parse_wav, parse_flac, parse_ogg, parse_mp3):
+            info = parse(f, head, size)
+            if info is not None:
+                return info
+    return None
+
+
+def parse_wav(f, head, size):
+    """Parse RIFF WAVE "fmt " and "data" chunk headers.
+
+    :param f: audio file opened for binary reading.
+    :param head: first bytes of file.
+    :param size: file size in bytes.
+    """
+    if len(head) < 12 or head[:4] != b"RIFF" or head[8:12] != b"WAVE":
+        return None
+    fmt = None
+    data_size = None
+    offset = 12
+    while offset + 8 <= size and (fmt is None or data_size is None):
+        f.seek(offset)
+        chunk = f.read(8)
+        if len(chunk) < 8:
+            break
+        chunk_id, chunk_size = struct.unpack("<4sI", chunk)
+        if chunk_id == b"fmt ":
+            body = f.read(16)
+            if chunk_size < 16 or len(body) < 16:
+                return None
+            fmt = struct.unpack_from("<HHIIHH", body)
+        elif chunk_id == b"data":
+            data_size = min(chunk_size, size - offset - 8)
+        offset += 8 + chunk_size + (chunk_size & 1)
+    if fmt is None or data_size is None:
+        return None
+    _, channels, sample_rate, byte_rate, _, _ = fmt
+    if not byte_rate:
+        return None
+    return AudioInfo("pcm", data_size / byte_rate, byte_rate * 8, sample_rate, channels, size)
+
+
+def parse_flac(f, head, size):
+    """Parse FLAC STREAMINFO metadata block.
+
+    :param f: audio file opened for binary reading.
+    :param head: first bytes of file.
+    :param size: file size in bytes.
+    """
+    if len(head) < 42 or head[:4] != b"fLaC" or head[4] & 0x7f != 0:
+        return None
+    info = int.from_bytes(head[18:26], "big")
+    sample_rate = info >> 44
+    channels = ((info >> 41) & 0x7) + 1
+    total_samples = info & 0xfffffffff
+    if not sample_rate:
+        return None
+    duration = total_samples / sample_rate
+    bitrate = int(size * 8 / duration) if duration else 0
+    return AudioInfo("flac", duration, bitrate, sample_rate, channels, size)
+
+
+def ogg_pages(data):
+    """Iterate over Ogg pages found in data.
+
+    :param data: bytes containing Ogg pages.
+    :return generator of (offset, granule position, serial number, body).
+    """
+    offset = data.find(b"OggS")
+    while offset != -1 and offset + 27 <= len(data):
+        granule, serial = struct.unpack_from("<qI", data, offset + 6)
+        segments = data[offset + 26]
+        start = offset + 27 + segments
+        table = data[offset + 27:start]
+        yield offset, granule, serial, data[start:start + sum(table)]
+        offset = data.find(b"OggS", offset + 4)
+
+
+def parse_ogg(f, head, size):
+    """Parse Ogg Vorbis or Opus identification header and last granule position.
+
+    :param f: audio file opened for binary reading.
+    :param head: first bytes of file.
+    :param size: file size in bytes.
+    """
+    if head[:4] != b"OggS":
+        return None
+    _, _, serial, body = next(ogg_pages(head), (0, 0, 0, b""))
+    if body[:7] == b"\x01vorbis" and len(body) >= 30:
+        channels, sample_rate = struct.unpack_from("<BI", body, 11)
+        codec, pre_skip, granule_rate = "vorbis", 0, sample_rate
+    elif body[:8] == b"OpusHead" and len(body) >= 19:
+        channels, pre_skip, sample_rate = struct.unpack_from("<BHI", body, 9)
+        codec, granule_rate = "opus", 48000
+    else:
+        return None
+    f.seek(max(0, size - PROBE_SIZE))
+    tail = f.read(PROBE_SIZE)
+    granule = 0
+    for _, page_granule, page_serial, _ in ogg_pages(tail):
+        if page_serial == serial and page_granule >= 0:
+            granule = page_granule
+    duration = max(0, granule - pre_skip) / granule_rate if granule_rate else 0
+    bitrate = int(size * 8 / duration) if duration else 0
+    return AudioInfo(codec, duration, bitrate, sample_rate or granule_rate, channels, size)
+
+
+def id3v2_size(head):
+    """Get size of ID3v2 tag at file start or 0.
+
+    :param head: first bytes of file.
+    """
+    if len(head) < 10 or head[:3] != b"ID3":
+        return 0
+    body = 0
+    for byte in head[6:10]:
+        body = (body << 7) | (byte & 0x7f)
+    footer = 10 if head[5] & 0x10 else 0
+    return 10 + body + footer
+
+
+def mpeg_frame(data, offset, base=0):
+    """Parse MPEG audio frame header.
+
+    :param data: bytes containing frame.
+    :param offset: position of header in data.
+    :param base: position of data in file.
+    :return frame or None if there is no valid header at offset.
+    """
+    if offset + 4 > len(data):
+        return None
+    b1, b2, b3 = data[offset + 1], data[offset + 2], data[offset + 3]
+    if data[offset] != 0xff or b1 & 0xe0 != 0xe0:
+        return None
+    version = (b1 >> 3) & 0x3
+    layer = 4 - ((b1 >> 1) & 0x3)
+    bitrate_index = b2 >> 4
+    rate_index = (b2 >> 2) & 0x3
+    if version == 1 or layer == 4 or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+    mpeg1 = version == 3
+    bitrate = MPEG_BITRATES[(mpeg1, layer)][bitrate_index] * 1000
+    sample_rate = MPEG_SAMPLE_RATES[version][rate_index]
+    padding = (b2 >> 1) & 0x1
+    channels = 1 if b3 >> 6 == 3 else 2
+    if layer == 1:
+        samples = 384
+        length = (12 * bitrate // sample_rate + padding) * 4
+    else:
+        samples = 1152 if mpeg1 or layer == 2 else 576
+        length = samples // 8 * bitrate // sample_rate + padding
+    return MpegFrame(base + offset, length, bitrate, sample_rate, channels, samples, mpeg1)
+
+
+def find_mpeg_frame(data, start, base=0):
+    """Find first MPEG audio frame confirmed by following frame header.
+
+    :param data: bytes to search in.
+    :param start: position to search from.
+    :param base: position of data in file.
+    """
+    offset = data.find(b"\xff", start)
+    while offset != -1:
+        frame = mpeg_frame(data, offset, base)
+        if frame is not None:
+            following = offset + frame.length
+            if following + 4 > len(data) or mpeg_frame(data, following) is not None:
+                return frame
+        offset = data.find(b"\xff", offset + 1)
+    return None
+
+
+def vbr_frames(data, frame, start):
+    """Get number of frames from Xing/Info or VBRI header of first frame.
+
+    :param data: bytes containing first frame.
+    :param frame: first frame.
+    :param start: position of first frame in data.
+    :return number of frames or None for constant bitrate stream.
+    """
+    if frame.mpeg1:
+        side_info = 17 if frame.channels == 1 else 32
+    else:
+        side_info = 9 if frame.channels == 1 else 17
+    xing = start + 4 + side_info
+    if data[xing:xing + 4] in (b"Xing", b"Info") and len(data) >= xing + 12:
+        flags, = struct.unpack_from(">I", data, xing + 4)
+        if flags & 0x1:
+            return struct.unpack_from(">I", data, xing + 8)[0]
+    vbri = start + 36
+    if data[vbri:vbri + 4] == b"VBRI" and len(data) >= vbri + 18:
+        return struct.unpack_from(">I", data, vbri + 14)[0]
+    return None
+
+
+def parse_mp3(f, head, size):
+    """Parse ID3v2 tag, first MPEG audio frame and its VBR header.
+
+    :param f: audio file opened for binary reading.
+    :param head: first bytes of file.
+    :param size: file size in bytes.
+    """
+    start = id3v2_size(head)
+    data, base = head, 0
+    if start + 4 > len(head):
+        f.seek(start)
+        data, base, start = f.read(PROBE_SIZE), start, 0
+    frame = find_mpeg_frame(data, start, base)
+    if frame is None:
+        return None
+    audio_size = size - frame.offset
+    f.seek(max(0, size - 128))
+    if f.read(3) == b"TAG":
+        audio_size -= 128
+    frames = vbr_frames(data, frame, frame.offset - base)
+    if frames:
+        duration = frames * frame.samples / frame.sample_rate
+        bitrate = int(audio_size * 8 / duration) if duration else frame.bitrate
+    else:
+        duration = audio_size * 8 / frame.bitrate
+        bitrate = frame.bitrate
+    return AudioInfo("mp3", duration, bitrate, frame.sample_rate, frame.channels, size)
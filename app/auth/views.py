@@ -1,11 +1,11 @@
-from flask import flash, g, redirect, render_template, request, url_for
+from flask import current_app, flash, g, redirect, render_template, request, url_for
 from flask_babel import gettext, get_locale
 from flask_login import current_user, login_user, login_required, logout_user
 
 from . import auth
 from .forms import ChangeEmailForm, ChangePasswordForm, LoginForm, RegistrationForm,  \
     RequsetResetPasswordForm, ResetPasswordForm, SearchForm
-from .. import db
+from .. import db, last_seen
 from ..email import send_mail
 from ..models import User
 
@@ -19,7 +19,8 @@ def before_request():
     g.search_form = SearchForm()
     g.locale = str(get_locale())
     if current_user.is_authenticated:
-        current_user.ping()
+        if request.endpoint != "static":
+            last_seen.touch(current_user)
         if not current_user.confirmed and \
              request.blueprint != "auth" and \
                 request.endpoint != "static" and \
@@ -54,6 +55,7 @@ def logout():
     
     :GET logout user. redirect to index page.
     """
+    current_app.principals.invalidate(current_user.user_id)
     logout_user()
     flash(gettext("You have been logged out."))
     return redirect(request.referrer or url_for("main.index"))
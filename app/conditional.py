@@ -0,0 +1,43 @@
+from hashlib import md5
+
+from flask import current_app, make_response, request
+from werkzeug.http import is_resource_modified
+
+
+def make_etag(*parts):
+    """Make entity tag from values representation depends on.
+    
+    :param parts: values representation depends on.
+    """
+    return md5(repr(parts).encode()).hexdigest()
+
+
+def conditional(etag, last_modified, render, cache_control="no-cache"):
+    """Respond with 304 if client has current representation, with rendered one otherwise.
+    
+    Representation isn't rendered at all when client has it.
+    
+    :param etag: entity tag of current representation.
+    :param last_modified: date and time representation was last changed or None.
+    :param render: function returning response for changed representation.
+    :param cache_control: value of Cache-Control header.
+    """
+    if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        resp = current_app.response_class(status=304)
+    else:
+        resp = make_response(render())
+    resp.set_etag(etag)
+    if last_modified is not None:
+        resp.last_modified = last_modified
+    resp.headers["Cache-Control"] = cache_control
+    return resp
+
+
+def conditional_body(resp):
+    """Tag response with hash of its body and respond with 304 if client has it.
+    
+    :param resp: rendered response.
+    """
+    resp.add_etag()
+    resp.headers["Cache-Control"] = "no-cache"
+    return resp.make_conditional(request)
@@ -0,0 +1,220 @@
+import math
+import os
+import struct
+from datetime import datetime
+from typing import NamedTuple
+
+from flask import current_app
+
+from . import db
+from .audio import PROBE_SIZE, find_mpeg_frame, id3v2_size, mpeg_frame, vbr_frames
+from .models import Rendition, Song
+from .uploads import spool_path, spool_storage_file
+
+
+# Owner of ID3 PRIV frame with timestamp of packed audio segment.
+TIMESTAMP_OWNER = b"com.apple.streaming.transportStreamTimestamp\x00"
+
+# Codec of MPEG audio layer III in playlist CODECS attribute.
+MP3_CODEC = "mp4a.40.34"
+
+PLAYLIST_MIME_TYPE = "application/vnd.apple.mpegurl"
+
+
+class Segment(NamedTuple):
+    """Part of MP3 file cut at frame boundaries.
+
+    :param start: position of first frame in file.
+    :param end: position after last frame in file.
+    :param start_time: time segment starts at in seconds.
+    :param duration: segment duration in seconds.
+    """
+    start: int
+    end: int
+    start_time: float
+    duration: float
+
+
+def mp3_frames(f):
+    """Iterate over MPEG audio frames of file.
+
+    ID3 tags and Xing/Info/VBRI header frame are skipped, so frames can
+    be regrouped into segments freely.
+
+    :param f: MP3 file opened for binary reading.
+    :return generator of frames.
+    """
+    start = id3v2_size(f.read(10))
+    f.seek(start)
+    data, base = f.read(PROBE_SIZE), start
+    frame = find_mpeg_frame(data, 0, base)
+    if frame is None:
+        return
+    offset = frame.offset
+    if vbr_frames(data, frame, frame.offset - base) is not None:
+        offset += frame.length
+    while True:
+        if offset + 4 > base + len(data):
+            f.seek(offset)
+            data, base = f.read(PROBE_SIZE), offset
+        frame = mpeg_frame(data, offset - base, base)
+        if frame is None or frame.length <= 0:
+            return
+        yield frame
+        offset += frame.length
+
+
+def segment_mp3(f, target_duration):
+    """Group MP3 frames into segments of about target duration.
+
+    :param f: MP3 file opened for binary reading.
+    :param target_duration: wanted segment duration in seconds.
+    :return list of segments.
+    """
+    segments = []
+    start = end = None
+    time = duration = 0.0
+    for frame in mp3_frames(f):
+        if start is None:
+            start = frame.offset
+        end = frame.offset + frame.length
+        duration += frame.samples / frame.sample_rate
+        if duration >= target_duration:
+            segments.append(Segment(start, end, time, duration))
+            time += duration
+            start, duration = None, 0.0
+    if start is not None:
+        segments.append(Segment(start, end, time, duration))
+    return segments
+
+
+def timestamp_tag(start_time):
+    """Build ID3 tag with MPEG-2 timestamp of packed audio segment.
+
+    :param start_time: time segment starts at in seconds.
+    """
+    timestamp = int(round(start_time * 90000)) & ((1 << 33) - 1)
+    body = TIMESTAMP_OWNER + struct.pack(">Q", timestamp)
+    frame = b"PRIV" + struct.pack(">IH", len(body), 0) + body
+    return b"ID3\x04\x00\x00" + struct.pack(">I", len(frame)) + frame
+
+
+def media_playlist(segments, urls):
+    """Build VOD media playlist of segments.
+
+    :param segments: segments of rendition.
+    :param urls: public storage urls of segments.
+    """
+    target = max((math.ceil(segment.duration) for segment in segments), default=0)
+    lines = ["#EXTM3U", "#EXT-X-VERSION:3", f"#EXT-X-TARGETDURATION:{target}",
+             "#EXT-X-MEDIA-SEQUENCE:0", "#EXT-X-PLAYLIST-TYPE:VOD"]
+    for segment, url in zip(segments, urls):
+        lines.append(f"#EXTINF:{segment.duration:.3f},")
+        lines.append(url)
+    lines.append("#EXT-X-ENDLIST")
+    return "\n".join(lines) + "\n"
+
+
+def master_playlist(variants):
+    """Build master playlist of renditions.
+
+    :param variants: list of (name, bitrate in bits per second).
+    """
+    lines = ["#EXTM3U"]
+    for name, bitrate in variants:
+        lines.append(f'#EXT-X-STREAM-INF:BANDWIDTH={bitrate},CODECS="{MP3_CODEC}"')
+        lines.append(f"hls/{name}.m3u8")
+    return "\n".join(lines) + "\n"
+
+
+def playlist_name(song_id, name):
+    """Get name of rendition playlist in storage.
+
+    :param song_id: song identifier.
+    :param name: rendition name or "original".
+    """
+    return f"{song_id}.{name}.m3u8"
+
+
+def segment_name(song_id, name, index):
+    """Get name of rendition segment in storage.
+
+    :param song_id: song identifier.
+    :param name: rendition name or "original".
+    :param index: segment number.
+    """
+    return f"{song_id}.{name}.{index}.mp3"
+
+
+def upload_bytes(data, name, content_type):
+    """Put bytes to storage through spool file.
+
+    :param data: file content.
+    :param name: name of file in storage.
+    :param content_type: type of file.
+    :return public url of uploaded file.
+    """
+    path = spool_path(f"{name}.part")
+    try:
+        with open(path, "wb") as f:
+            f.write(data)
+        return current_app.storage.upload(path, name, content_type)
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def segment_file(path, song_id, name):
+    """Split local MP3 file into segments and put them with playlist to storage.
+
+    Playlist lists public storage urls of segments, so players fetch them
+    from storage directly.
+
+    :param path: path of local MP3 file.
+    :param song_id: song identifier.
+    :param name: rendition name or "original".
+    :return number of segments.
+    """
+    with open(path, "rb") as f:
+        segments = segment_mp3(f, current_app.config["HLS_SEGMENT_DURATION"])
+        urls = []
+        for index, segment in enumerate(segments):
+            f.seek(segment.start)
+            data = timestamp_tag(segment.start_time) + f.read(segment.end - segment.start)
+            urls.append(upload_bytes(data, segment_name(song_id, name, index), "audio/mpeg"))
+    if segments:
+        upload_bytes(media_playlist(segments, urls).encode("utf-8"), playlist_name(song_id, name),
+                     PLAYLIST_MIME_TYPE)
+    return len(segments)
+
+
+def segment_song(song_id):
+    """Segment MP3 original and renditions of song which have no playlist yet.
+
+    :param song_id: song identifier.
+    :return names of segmented renditions.
+    """
+    song = Song.query.get(song_id)
+    if song is None or song.url is None:
+        return []
+    sources = []
+    if song.codec == "mp3" and not song.has_playlist:
+        sources.append(("original", str(song_id), db.update(Song).where(Song.song_id == song_id)))
+    for rendition in song.renditions:
+        if rendition.codec == "mp3" and not rendition.has_playlist:
+            sources.append((rendition.name, Rendition.storage_name(song_id, rendition.name),
+                            db.update(Rendition).where(Rendition.rendition_id == rendition.rendition_id)))
+    segmented = []
+    for name, storage_name, mark in sources:
+        path = spool_storage_file(storage_name)
+        try:
+            if not segment_file(path, song_id, name):
+                continue
+        finally:
+            os.remove(path)
+        db.session.execute(mark.values(has_playlist=True))
+        segmented.append(name)
+    if segmented:
+        db.session.execute(db.update(Song).where(Song.song_id == song_id).values(updated_at=datetime.utcnow()))
+    db.session.commit()
+    return segmented
@@ -0,0 +1,67 @@
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+
+
+class BackgroundJobs(ABC):
+    """Pool of threads running jobs of application in background.
+
+    Subclasses implement run, which is called inside application context
+    with arguments given to submit. Failed jobs are logged.
+
+    :param app: flask application instance.
+    :param workers: number of threads.
+    """
+
+    # Description of failed job, formatted with job arguments.
+    failure = "Background job {} failed."
+
+    def __init__(self, app, workers):
+        self.app = app
+        self._executor = ThreadPoolExecutor(workers)
+        self._futures = set()
+        self._lock = Lock()
+
+    def submit(self, *args):
+        """Run job in background.
+
+        :param args: arguments of job.
+        """
+        future = self._executor.submit(self._run, *args)
+        with self._lock:
+            self._futures.add(future)
+        future.add_done_callback(self._done)
+
+    def join(self):
+        """Wait until all submitted jobs are finished."""
+        while True:
+            with self._lock:
+                futures = list(self._futures)
+            if not futures:
+                return
+            for future in futures:
+                future.exception()
+
+    def shutdown(self):
+        """Stop worker threads after submitted jobs are finished."""
+        self._executor.shutdown(wait=True)
+
+    @abstractmethod
+    def run(self, *args):
+        """Do job, called in worker thread.
+
+        :param args: arguments of job.
+        """
+
+    def _done(self, future):
+        """Forget finished job."""
+        with self._lock:
+            self._futures.discard(future)
+
+    def _run(self, *args):
+        """Do job inside application context."""
+        with self.app.app_context():
+            try:
+                self.run(*args)
+            except Exception:
+                self.app.logger.exception(self.failure.format(*args))
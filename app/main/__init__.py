@@ -2,10 +2,10 @@ from flask import Blueprint
 
 main = Blueprint("main", __name__)
 from . import views, errors
-from ..models import Permission
+from ..models import Permission, UploadState
 
 
 @main.app_context_processor
 def inject_permissions():
     """Inject permissions to make it available in jinja2 templates without additional send."""
-    return dict(Permission=Permission)
+    return dict(Permission=Permission, UploadState=UploadState)
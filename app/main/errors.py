@@ -1,6 +1,8 @@
 from flask import render_template, request, jsonify
 
 from . import main
+from ..exceptions import ValidationError
+from ..storage import UploadQueueFull
 
 
 @main.app_errorhandler(404)
@@ -43,3 +45,26 @@ def internal_server_error(e):
             resp.status_code = 500
             return resp
     return render_template("500.html"), 500
+
+
+
+@main.errorhandler(ValidationError)
+def validation_error(e):
+    """Validation error handler for json routes.
+    
+    End with 400 status code.
+    """
+    resp = jsonify({"error": "bad request", "message": e.args[0]})
+    resp.status_code = 400
+    return resp
+
+
+@main.errorhandler(UploadQueueFull)
+def upload_queue_full(e):
+    """Upload queue full error handler for json routes.
+    
+    End with 503 status code.
+    """
+    resp = jsonify({"error": "service unavailable", "message": "Server is busy, try to upload later."})
+    resp.status_code = 503
+    return resp
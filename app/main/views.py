@@ -1,15 +1,25 @@
+import mimetypes
 import os
+from time import time
 
-from flask import abort, current_app, flash, g, make_response, redirect, request, render_template, url_for
+from flask import abort, current_app, flash, g, jsonify, make_response, redirect, request, \
+    render_template, send_from_directory, session, url_for
 from flask_babel import gettext
 from flask_login import current_user, login_required
+from flask_wtf.csrf import validate_csrf
+from wtforms.validators import ValidationError as CSRFError
 
 from . import main
 from .forms import CommentForm, EditProfileAdminForm, EditProfileForm, UploadSongForm, UpdateSongForm
-from .. import db
+from .. import db, get_locale
+from ..audio import MIME_TYPES
+from ..conditional import conditional, make_etag
 from ..decorators import admin_required, permission_required
 from ..models import Comment, Permission, User, Role, Song
-from ..storage import upload_to_storage, delete_from_storage
+from ..song_files import delete_song_files
+from ..storage import LocalStorage, UploadQueueFull
+from ..transcode import requested_quality, vary_on_client_hints
+from ..uploads import ChunkedUpload, spool_stream, start_song_upload
 
 
 @main.route("/")
@@ -17,16 +27,15 @@ def index():
     show_followed = False 
     if current_user.is_authenticated:
         show_followed = bool(request.cookies.get("show_followed", ""))
+    page = request.args.get("page", 1, type=int)
     if show_followed:
-        query = current_user.followed_songs
+        pagination = current_user.paginate_timeline(page, current_app.config["SONGS_PER_PAGE"])
     else:
-        query = Song.query
-    page = request.args.get("page", 1, type=int)
-    pagination = query.order_by(Song.timestamp.desc()).paginate(
-        page, per_page=current_app.config["SONGS_PER_PAGE"],
-        error_out=False
-    )
-    songs = pagination.items
+        pagination = Song.query.order_by(Song.timestamp.desc()).paginate(
+            page, per_page=current_app.config["SONGS_PER_PAGE"],
+            error_out=False
+        )
+    songs = Song.load_cards(pagination.items, current_user)
     processed_songs = []
     for i in range(0, 9, 3):
         processed_songs.append(songs[i:i+3])
@@ -48,7 +57,7 @@ def user(username):
         page, per_page=current_app.config["SONGS_PER_USER_PAGE"],
         error_out=False
     )
-    songs = pagination.items
+    songs = Song.load_cards(pagination.items, current_user)
     return render_template("user.html", user=user, songs=[songs], pagination=pagination)
 
 
@@ -125,14 +134,85 @@ def upload_song():
         db.session.add(song)
         db.session.commit()
         
-        f.save(str(song.song_id))
-        if f.filename.endswith(".mp3"):
-            upload_to_storage(str(song.song_id), content_type="audio/mpeg")
+        path = spool_stream(f.stream)
+        try:
+            start_song_upload(song, path, content_type=f.mimetype or "audio/mpeg")
+        except UploadQueueFull:
+            os.remove(path)
+            db.session.delete(song)
+            db.session.commit()
+            flash(gettext("Server is busy right now. Please try to upload your song later."))
+            return render_template("upload_song.html", form=form), 503
         flash(gettext("Your song has been uploaded!"))
         return redirect(url_for("main.index"))
     return render_template("upload_song.html", form=form)
 
 
+def check_csrf_header():
+    """Abort json request without valid X-CSRFToken header."""
+    if not current_app.config.get("WTF_CSRF_ENABLED", True):
+        return
+    try:
+        validate_csrf(request.headers.get("X-CSRFToken"))
+    except CSRFError:
+        abort(400)
+
+
+def get_own_upload(upload_id):
+    """Get upload started by current user or abort with 404."""
+    upload = ChunkedUpload.get(upload_id)
+    if upload is None or upload.user_id != current_user.user_id:
+        abort(404)
+    return upload
+
+
+@main.route("/uploads/", methods=["POST"])
+@login_required
+@permission_required(Permission.PUBLISH)
+def new_upload():
+    """New chunked upload route handler.
+    
+    :POST create song and start its chunked upload.
+    """
+    check_csrf_header()
+    upload = ChunkedUpload.start(current_user._get_current_object(), request.json or {})
+    return jsonify(upload.status_json(url_for("main.upload_chunk", upload_id=upload.upload_id))), 201
+
+
+@main.route("/uploads/<upload_id>", methods=["GET", "PUT"])
+@login_required
+@permission_required(Permission.PUBLISH)
+def upload_chunk(upload_id):
+    """Chunked upload route handler.
+    
+    :GET return how many bytes are received to resume upload.
+    :PUT append chunk described by Content-Range header to upload.
+    """
+    upload = get_own_upload(upload_id)
+    if request.method == "PUT":
+        check_csrf_header()
+        upload.write_chunk(request.stream, request.headers.get("Content-Range"),
+                           request.headers.get("X-Chunk-Sha256"))
+    return jsonify(upload.status_json(url_for("main.upload_chunk", upload_id=upload_id)))
+
+
+@main.route("/media/<path:name>")
+def media(name):
+    """Local storage media route handler.
+    
+    :GET stream file from local storage. Supports Range requests and ETag.
+    """
+    if not isinstance(current_app.storage, LocalStorage):
+        abort(404)
+    mimetype = mimetypes.guess_type(name)[0]
+    if mimetype is None and name.isdigit():
+        song = Song.query.get(int(name))
+        mimetype = MIME_TYPES.get(song.codec, "audio/mpeg") if song is not None else None
+    return send_from_directory(current_app.storage.root, name,
+                               mimetype=mimetype or "application/octet-stream",
+                               conditional=True, etag=True)
+
+
 @main.route("/song/<int:song_id>", methods=["GET", "POST"])
 def song(song_id):
     """Song page route handler.
@@ -154,8 +234,26 @@ def song(song_id):
         error_out=False
     )
     comments = pagination.items
-    return render_template("song.html", song=song, comments=comments,
-                           pagination=pagination, form=form)
+    rendition = song.pick_rendition(requested_quality(request))
+    render = lambda: render_template("song.html", song=song, comments=comments, pagination=pagination,
+                                     form=form, audio_url=song.stream_url(rendition))
+    if session.get("_flashes"):
+        return vary_on_client_hints(make_response(render()))
+    viewer = None
+    if current_user.is_authenticated:
+        # Cached page must not outlive CSRF token of comment form.
+        csrf_period = int(time() // ((current_app.config.get("WTF_CSRF_TIME_LIMIT") or 3600) / 2))
+        viewer = (current_user.user_id, current_user.updated_at, current_user.role_id,
+                  song.is_liked_by(current_user), csrf_period)
+    etag = make_etag(song.song_id, song.updated_at, song.like_count, song.comment_count,
+                     song.upload_state, song.url, song.author.updated_at,
+                     [(comment.comment_id, comment.updated_at) for comment in comments],
+                     pagination.page, pagination.pages, viewer, str(get_locale()),
+                     rendition and rendition.name)
+    cache_control = "private, no-cache" if viewer else "public, no-cache"
+    resp = conditional(etag, None, render, cache_control)
+    resp.vary.add("Cookie")
+    return vary_on_client_hints(resp)
 
 
 @main.route("/update-song/<int:song_id>", methods=["GET", "POST"])
@@ -194,7 +292,7 @@ def delete_song(song_id):
     song = Song.query.get_or_404(song_id)
     if current_user != song.author and not current_user.can(Permission.ADMIN):
         abort(403)
-    delete_from_storage(str(song.song_id))
+    delete_song_files(song)
     db.session.delete(song)
     db.session.commit()
     flash(gettext("Song has been deleted."))
@@ -361,11 +459,8 @@ def like(song_id):
     :GET like song and redirect to "main/song/<song_id>"
     """
     song = Song.query.get_or_404(song_id)
-    if song is None:
-        abort(404)
-    if song.is_liked_by(current_user):
+    if not song.like(current_user):
         return redirect(url_for("main.song", song_id=song.song_id))
-    song.like(current_user)
     db.session.commit()
     flash(gettext("You liked %(name)s.", name=song.name))
     return redirect(request.referrer or url_for("main.song", song_id=song.song_id))
@@ -379,11 +474,8 @@ def unlike(song_id):
     :GET unlike song and redirect to "main/song/<song_id>"
     """
     song = Song.query.get_or_404(song_id)
-    if song is None:
-        abort(404)
-    if not song.is_liked_by(current_user):
+    if not song.unlike(current_user):
         return redirect(url_for("main.song", song_id=song.song_id))
-    song.unlike(current_user)
     db.session.commit()
     flash(gettext("You unliked %(name)s.", name=song.name))
     return redirect(request.referrer or url_for("main.song", song_id=song.song_id))
@@ -398,6 +490,7 @@ def search():
     page = request.args.get("page", 1, type=int)
     songs, total = Song.search(g.search_form.q.data, page,
                                current_app.config["SEARCH_PER_PAGE"])
+    songs = Song.load_cards(songs, current_user)
     next_url = url_for("main.search", q=g.search_form.q.data, page=page+1) \
         if total > page * current_app.config["SEARCH_PER_PAGE"] else None
     prev_url = url_for("main.search", q=g.search_form.q.data, page=page-1) \
@@ -1,16 +1,22 @@
 from datetime import datetime, timezone, timedelta
-from hashlib import md5
+from hashlib import md5, sha256
 from typing import NamedTuple
 
 import jwt
 from flask import current_app, url_for
 from flask_login import AnonymousUserMixin, UserMixin
+from flask_sqlalchemy import Pagination
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm.attributes import set_committed_value
 from werkzeug.security import check_password_hash, generate_password_hash
 
 from . import db, login_manager
+from .audio import MIME_TYPES
 from .exceptions import ValidationError
-from .search import add_to_index, remove_from_index, query_index
-from .storage import get_public_url
+from .principals import Principal
+from .search import add_to_index, bulk_reindex, database_index, remove_from_index, query_index, \
+    suggest_source, SUGGEST_SOURCES
 
 
 class PermissionTuple(NamedTuple):
@@ -23,6 +29,16 @@ class PermissionTuple(NamedTuple):
     default: bool
 
 
+class SongCard(NamedTuple):
+    """Named tuple to represent song with everything needed to render its card.
+    
+    :param song: song object with author loaded.
+    :param liked: is song liked by viewer.
+    """
+    song: "Song"
+    liked: bool
+
+
 class Permission:
     """Class to represent permissions in hex code.
     
@@ -39,6 +55,18 @@ class Permission:
     ADMIN = 0x80
 
 
+class UploadState:
+    """Class to represent states of song upload to storage.
+    
+    :param PENDING: song is uploading to storage.
+    :param READY: song is uploaded and has public url.
+    :param FAILED: song upload failed.
+    """
+    PENDING = "pending"
+    READY = "ready"
+    FAILED = "failed"
+
+
 class Role(db.Model):
     """SQLAlchemy model to represent roles table.
     
@@ -96,14 +124,15 @@ class SearchableMixin:
         """
         ids, total = query_index(cls.__tablename__,
                                  expression, page, per_page)
-        if total == 0:
+        if not ids:
             if cls == Song:
-                return cls.query.filter_by(song_id=0), 0
+                return cls.query.filter_by(song_id=0), total
         when = []
         for i in range(len(ids)):
             when.append((ids[i], i))
         if cls == Song:
-            return cls.query.filter(cls.song_id.in_(ids)).order_by(db.case(when, value=(cls.song_id))), total
+            return cls.query.options(db.joinedload(cls.author)) \
+                .filter(cls.song_id.in_(ids)).order_by(db.case(when, value=(cls.song_id))), total
     
     @classmethod 
     def before_commit(cls, session):
@@ -117,6 +146,28 @@ class SearchableMixin:
             "delete": list(session.deleted)
         }
     
+    @classmethod
+    def after_flush(cls, session, flush_context):
+        """Remember suggestion labels changed by flush.
+        
+        Objects may be flushed long before commit, e.g. by autoflush,
+        so labels are gathered on every flush.
+        
+        :param session: sqlalchemy session.
+        """
+        changed = session.info.setdefault("suggestions", {})
+        for obj in session.new | session.dirty:
+            source = SUGGEST_SOURCES.get(getattr(obj, "__tablename__", None))
+            if source is None:
+                continue
+            field = source[1]
+            if obj in session.new or db.inspect(obj).attrs[field].history.has_changes():
+                ident = db.inspect(obj).mapper.primary_key_from_instance(obj)[0]
+                changed[(obj.__tablename__, ident)] = getattr(obj, field)
+        for obj in session.deleted:
+            if getattr(obj, "__tablename__", None) in SUGGEST_SOURCES:
+                changed[(obj.__tablename__, db.inspect(obj).identity[0])] = None
+    
     @classmethod 
     def after_commit(cls, session):
         """Apply changes after commit.
@@ -134,12 +185,28 @@ class SearchableMixin:
         for obj in session._changes["delete"]:
             if isinstance(obj, SearchableMixin):
                 remove_from_index(obj.__tablename__, obj)
+        
+        for (kind, ident), label in session.info.pop("suggestions", {}).items():
+            if label is None:
+                current_app.suggestions.remove(kind, ident)
+            else:
+                current_app.suggestions.add(kind, ident, label)
     
     @classmethod
-    def reindex(cls):
-        """Update index for model."""
-        for obj in cls.query:
-            add_to_index(obj.__tablename__, obj)
+    def after_rollback(cls, session):
+        """Forget suggestion changes which were rolled back.
+        
+        :param session: sqlalchemy session.
+        """
+        session.info.pop("suggestions", None)
+    
+    @classmethod
+    def reindex(cls, **kwargs):
+        """Update index for model with bulk requests.
+        
+        :param **kwargs: options of bulk reindex.
+        """
+        return bulk_reindex(cls, **kwargs)
 
 
 class Comment(db.Model):
@@ -151,8 +218,13 @@ class Comment(db.Model):
     :param disabled: is comment disabled by moderator.
     :param auhtor_id: foreing key to comment author.
     :param song_id: foreign key to comment song page.
+    :param updated_at: date and time comment was last changed.
     """
     __tablename__ = "comments"
+    __table_args__ = (
+        db.Index("ix_comments_song_id_timestamp", "song_id", "timestamp"),
+        db.Index("ix_comments_timestamp", "timestamp")
+    )
     
     comment_id = db.Column(db.Integer, primary_key=True)
     body = db.Column(db.Text, nullable=False)
@@ -160,6 +232,7 @@ class Comment(db.Model):
     disabled = db.Column(db.Boolean, default=False)
     author_id = db.Column(db.Integer, db.ForeignKey("users.user_id"))
     song_id = db.Column(db.Integer, db.ForeignKey("songs.song_id"))
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     @staticmethod
     def from_json(json_comment):
@@ -172,6 +245,16 @@ class Comment(db.Model):
             raise ValidationError("Comment doesn't have a body.")
         return Comment(body=body)
     
+    @staticmethod
+    def after_insert(mapper, connection, comment):
+        """Increase song comment counter when comment is inserted."""
+        Song.change_counter("comment_count", connection, comment.song_id, 1)
+    
+    @staticmethod
+    def after_delete(mapper, connection, comment):
+        """Decrease song comment counter when comment is deleted."""
+        Song.change_counter("comment_count", connection, comment.song_id, -1)
+    
     def to_json(self):
         """Convert comment object to json.
         
@@ -202,12 +285,133 @@ class Follow(db.Model):
     :param timestamp: data when user followed another user.
     """
     __tablename__ = "follows"
+    __table_args__ = (
+        db.Index("ix_follows_followed_id", "followed_id"),
+    )
     
     follower_id = db.Column(db.Integer, db.ForeignKey("users.user_id"),
                             primary_key=True)
     followed_id = db.Column(db.Integer, db.ForeignKey("users.user_id"),
                             primary_key=True)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    @staticmethod
+    def after_insert(mapper, connection, follow):
+        """Put recent songs of followed user to follower timeline."""
+        TimelineEntry.backfill(connection, follow.follower_id, follow.followed_id)
+    
+    @staticmethod
+    def after_delete(mapper, connection, follow):
+        """Remove songs of unfollowed user from follower timeline."""
+        timelines = TimelineEntry.__table__
+        connection.execute(
+            timelines.delete()
+            .where(timelines.c.user_id == follow.follower_id)
+            .where(timelines.c.author_id == follow.followed_id)
+        )
+
+
+class TimelineEntry(db.Model):
+    """SQLAlchemy model to represent timelines table.
+    Precomputed songs of followed users, written when song is published.
+    
+    :param user_id: foreign key to user who owns timeline.
+    :param song_id: foreign key to song in timeline.
+    :param author_id: foreign key to song author.
+    :param timestamp: song publish date.
+    """
+    __tablename__ = "timelines"
+    __table_args__ = (
+        db.Index("ix_timelines_user_id_timestamp", "user_id", "timestamp"),
+    )
+    
+    user_id = db.Column(db.Integer, db.ForeignKey("users.user_id"), primary_key=True)
+    song_id = db.Column(db.Integer, db.ForeignKey("songs.song_id"), primary_key=True)
+    author_id = db.Column(db.Integer, db.ForeignKey("users.user_id"))
+    timestamp = db.Column(db.DateTime)
+    
+    @staticmethod
+    def fan_out(connection, song):
+        """Write song to timelines of author followers inside current flush.
+        Authors with more than TIMELINE_FANOUT_LIMIT followers are switched
+        to fan-out on read for good and their songs are merged in on read.
+        
+        :param connection: connection of current flush.
+        :param song: published song.
+        """
+        if song.author_id is None:
+            return
+        users = User.__table__
+        follows = Follow.__table__
+        on_read = connection.execute(
+            db.select(users.c.fanout_on_read).where(users.c.user_id == song.author_id)
+        ).scalar()
+        if on_read:
+            return
+        limit = current_app.config["TIMELINE_FANOUT_LIMIT"]
+        followers = db.select(follows.c.follower_id).where(follows.c.followed_id == song.author_id)
+        count = connection.execute(
+            db.select(db.func.count()).select_from(followers.limit(limit + 1).subquery())
+        ).scalar()
+        if count > limit:
+            connection.execute(
+                users.update().where(users.c.user_id == song.author_id).values(fanout_on_read=True)
+            )
+            return
+        timelines = TimelineEntry.__table__
+        connection.execute(timelines.insert().from_select(
+            ["user_id", "song_id", "author_id", "timestamp"],
+            db.select(follows.c.follower_id, db.literal(song.song_id), db.literal(song.author_id),
+                      db.literal(song.timestamp, db.DateTime))
+            .where(follows.c.followed_id == song.author_id)
+        ))
+        TimelineEntry.trim(connection, followers)
+    
+    @staticmethod
+    def backfill(connection, user_id, author_id):
+        """Write recent songs of author to user timeline inside current flush.
+        
+        :param connection: connection of current flush.
+        :param user_id: identifier of user who owns timeline.
+        :param author_id: identifier of followed author.
+        """
+        users = User.__table__
+        on_read = connection.execute(
+            db.select(users.c.fanout_on_read).where(users.c.user_id == author_id)
+        ).scalar()
+        if on_read:
+            return
+        songs = Song.__table__
+        timelines = TimelineEntry.__table__
+        connection.execute(timelines.insert().from_select(
+            ["user_id", "song_id", "author_id", "timestamp"],
+            db.select(db.literal(user_id), songs.c.song_id, songs.c.author_id, songs.c.timestamp)
+            .where(songs.c.author_id == author_id)
+            .order_by(songs.c.timestamp.desc())
+            .limit(current_app.config["TIMELINE_DEPTH"])
+        ))
+        TimelineEntry.trim(connection, [user_id])
+    
+    @staticmethod
+    def trim(connection, user_ids):
+        """Delete timeline entries older than TIMELINE_DEPTH newest ones.
+        
+        :param connection: connection of current flush.
+        :param user_ids: identifiers or select of identifiers of timeline owners.
+        """
+        timelines = TimelineEntry.__table__
+        newer = timelines.alias("newer")
+        cutoff = db.select(newer.c.timestamp) \
+            .where(newer.c.user_id == timelines.c.user_id) \
+            .order_by(newer.c.timestamp.desc()) \
+            .offset(current_app.config["TIMELINE_DEPTH"] - 1) \
+            .limit(1) \
+            .scalar_subquery()
+        connection.execute(
+            timelines.delete()
+            .where(timelines.c.user_id.in_(user_ids))
+            .where(timelines.c.timestamp < cutoff)
+        )
 
 
 class SongLike(db.Model):
@@ -218,10 +422,93 @@ class SongLike(db.Model):
     :param user_id: foreign key user identifier.
     """
     __tablename__ = "songlikes"
+    __table_args__ = (
+        db.UniqueConstraint("song_id", "user_id", name="uq_songlikes_song_id_user_id"),
+    )
     
     like_id = db.Column(db.Integer, primary_key=True)
     song_id = db.Column(db.Integer, db.ForeignKey("songs.song_id"))
     user_id = db.Column(db.Integer, db.ForeignKey("users.user_id"))
+    
+    @staticmethod
+    def after_insert(mapper, connection, like):
+        """Increase song like counter when like is inserted."""
+        Song.change_counter("like_count", connection, like.song_id, 1)
+    
+    @staticmethod
+    def after_delete(mapper, connection, like):
+        """Decrease song like counter when like is deleted."""
+        Song.change_counter("like_count", connection, like.song_id, -1)
+
+
+class Rendition(db.Model):
+    """SQLAlchemy model to represent renditions table.
+    Transcoded copy of song in lower bitrate.
+    
+    :param rendition_id: unique rendition identifier.
+    :param song_id: foreign key to transcoded song.
+    :param name: rendition quality name.
+    :param bitrate: bitrate in bits per second.
+    :param codec: audio codec of rendition.
+    :param url: public rendition url.
+    :param size: rendition file size in bytes.
+    :param has_playlist: is rendition split into HLS segments.
+    """
+    __tablename__ = "renditions"
+    __table_args__ = (
+        db.UniqueConstraint("song_id", "name", name="uq_renditions_song_id_name"),
+    )
+    
+    rendition_id = db.Column(db.Integer, primary_key=True)
+    song_id = db.Column(db.Integer, db.ForeignKey("songs.song_id"), nullable=False)
+    name = db.Column(db.String(16), nullable=False)
+    bitrate = db.Column(db.Integer, nullable=False)
+    codec = db.Column(db.String(16), nullable=False)
+    url = db.Column(db.String(256), nullable=False)
+    size = db.Column(db.BigInteger)
+    has_playlist = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
+    
+    @staticmethod
+    def storage_name(song_id, name):
+        """Get name of rendition file in storage.
+        
+        :param song_id: song identifier.
+        :param name: rendition quality name.
+        """
+        return f"{song_id}.{name}.mp3"
+    
+    @staticmethod
+    def store(song_id, name, bitrate, codec, url, size):
+        """Record made rendition of song, replacing previous one.
+        
+        :param song_id: song identifier.
+        :param name: rendition quality name.
+        :param bitrate: bitrate in bits per second.
+        :param codec: audio codec of rendition.
+        :param url: public rendition url.
+        :param size: rendition file size in bytes.
+        """
+        db.session.execute(db.delete(Rendition).where(Rendition.song_id == song_id, Rendition.name == name))
+        db.session.add(Rendition(song_id=song_id, name=name, bitrate=bitrate, codec=codec, url=url, size=size))
+        db.session.execute(db.update(Song).where(Song.song_id == song_id).values(updated_at=datetime.utcnow()))
+        db.session.commit()
+    
+    def to_json(self):
+        """Convert rendition to json.
+        
+        :param name: rendition quality name.
+        :param bitrate: bitrate in bits per second.
+        :param content_type: MIME type of rendition.
+        :param url: public rendition url.
+        :param size: rendition file size in bytes.
+        """
+        return {
+            "name": self.name,
+            "bitrate": self.bitrate,
+            "content_type": MIME_TYPES.get(self.codec),
+            "url": self.url,
+            "size": self.size
+        }
 
 
 class Song(SearchableMixin, db.Model):
@@ -233,9 +520,25 @@ class Song(SearchableMixin, db.Model):
     :param lyrics: song lyrics.
     :param timestamp: song publish date.
     :param author_id: song author identifier.
+    :param like_count: denormalized number of song likes.
+    :param comment_count: denormalized number of song comments.
+    :param upload_state: state of song upload to storage.
+    :param updated_at: date and time song or its counters were last changed.
+    :param codec: audio codec of uploaded file.
+    :param duration: audio duration in seconds.
+    :param bitrate: average audio bitrate in bits per second.
+    :param sample_rate: audio samples per second.
+    :param channels: number of audio channels.
+    :param size: uploaded file size in bytes.
+    :param has_waveform: is waveform of song built.
+    :param has_playlist: is original MP3 file split into HLS segments.
     """
     __tablename__ = "songs"
-    __searchable__ = ["name"]
+    __table_args__ = (
+        db.Index("ix_songs_author_id_timestamp", "author_id", "timestamp"),
+        db.Index("ix_songs_timestamp", "timestamp")
+    )
+    __searchable__ = ["name", "lyrics"]
     
     song_id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(64), nullable=False, index=True)
@@ -243,9 +546,24 @@ class Song(SearchableMixin, db.Model):
     lyrics = db.Column(db.Text)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
     author_id = db.Column(db.Integer, db.ForeignKey("users.user_id"))
+    like_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    comment_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    upload_state = db.Column(db.String(16), nullable=False, default=UploadState.PENDING,
+                             server_default=UploadState.PENDING)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    codec = db.Column(db.String(16))
+    duration = db.Column(db.Float)
+    bitrate = db.Column(db.Integer)
+    sample_rate = db.Column(db.Integer)
+    channels = db.Column(db.Integer)
+    size = db.Column(db.BigInteger)
+    has_waveform = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
+    has_playlist = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
     
     comments = db.relationship("Comment", backref="song", cascade="all,delete", lazy="dynamic")
     likes = db.relationship("SongLike", backref="song", cascade="all,delete", lazy="dynamic")
+    renditions = db.relationship("Rendition", backref="song", cascade="all,delete",
+                                 order_by="Rendition.bitrate")
     
     def is_liked_by(self, user):
         """Check if song liked by user.
@@ -255,39 +573,223 @@ class Song(SearchableMixin, db.Model):
         l = self.likes.filter_by(user_id=user.user_id).first()
         return l is not None
     
+    @staticmethod
+    def load_cards(songs, viewer):
+        """Load song cards for page of songs with constant number of queries.
+        
+        Like and comment counters are read from song columns, authors are
+        loaded only for songs which don't have them loaded yet.
+        
+        :param songs: list of songs to render.
+        :param viewer: user who is looking at songs.
+        """
+        songs = list(songs)
+        if not songs:
+            return []
+        song_ids = [song.song_id for song in songs]
+        unloaded = [song for song in songs if "author" in db.inspect(song).unloaded]
+        if unloaded:
+            authors = {user.user_id: user for user in
+                       User.query.filter(User.user_id.in_({song.author_id for song in unloaded}))}
+            for song in unloaded:
+                set_committed_value(song, "author", authors.get(song.author_id))
+        liked = set()
+        if viewer.is_authenticated:
+            liked = {song_id for song_id, in db.session.query(SongLike.song_id)
+                     .filter(SongLike.user_id == viewer.user_id, SongLike.song_id.in_(song_ids))}
+        return [SongCard(song, song.song_id in liked) for song in songs]
+    
     def like(self, user):
-        """Like song.
+        """Like song with single statement, liking song twice does nothing.
+        
+        Statement bypasses mapper events, so like counter is changed here.
         
         :param user: user who wants to like a song.
+        :return was song liked by this call.
         """
-        if not self.is_liked_by(user):
-            l = SongLike(song=self, user=user)
-            db.session.add(l)
+        db.session.flush()
+        values = {"song_id": self.song_id, "user_id": user.user_id}
+        insert = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}.get(db.engine.dialect.name)
+        if insert is not None:
+            statement = insert(SongLike.__table__).values(values) \
+                .on_conflict_do_nothing(index_elements=["song_id", "user_id"])
+            liked = db.session.execute(statement).rowcount > 0
+        else:
+            try:
+                with db.session.begin_nested():
+                    db.session.execute(SongLike.__table__.insert().values(values))
+                liked = True
+            except IntegrityError:
+                liked = False
+        if liked:
+            Song.change_counter("like_count", db.session.connection(), self.song_id, 1)
+            db.session.expire(self, ["like_count"])
+        return liked
     
     def unlike(self, user):
-        """Unlike song.
+        """Unlike song with single statement, unliking not liked song does nothing.
+        
+        Statement bypasses mapper events, so like counter is changed here.
         
         :param user: user who wants to unlike a song.
+        :return was song unliked by this call.
+        """
+        db.session.flush()
+        statement = SongLike.__table__.delete() \
+            .where(SongLike.song_id == self.song_id, SongLike.user_id == user.user_id)
+        unliked = db.session.execute(statement).rowcount > 0
+        if unliked:
+            Song.change_counter("like_count", db.session.connection(), self.song_id, -1)
+            db.session.expire(self, ["like_count"])
+        return unliked
+    
+    @staticmethod
+    def recount():
+        """Recalculate like and comment counters for all songs with single statement."""
+        likes = db.select(db.func.count(SongLike.like_id)) \
+            .where(SongLike.song_id == Song.song_id).scalar_subquery()
+        comments = db.select(db.func.count(Comment.comment_id)) \
+            .where(Comment.song_id == Song.song_id).scalar_subquery()
+        db.session.execute(db.update(Song).values(like_count=likes, comment_count=comments))
+        db.session.commit()
+    
+    @staticmethod
+    def after_insert(mapper, connection, song):
+        """Fan song out to timelines of author followers."""
+        TimelineEntry.fan_out(connection, song)
+    
+    @staticmethod
+    def before_delete(mapper, connection, song):
+        """Remove song from timelines before it is deleted."""
+        timelines = TimelineEntry.__table__
+        connection.execute(timelines.delete().where(timelines.c.song_id == song.song_id))
+    
+    @staticmethod
+    def change_counter(counter, connection, song_id, delta):
+        """Change song counter inside current flush transaction.
+        
+        :param counter: name of counter column.
+        :param connection: connection of current flush.
+        :param song_id: song identifier.
+        :param delta: value to add to counter.
+        """
+        if song_id is None:
+            return
+        column = getattr(Song.__table__.c, counter)
+        connection.execute(
+            Song.__table__.update()
+            .where(Song.__table__.c.song_id == song_id)
+            .values({column: column + delta})
+        )
+    
+    @staticmethod
+    def finish_upload(song_id, url):
+        """Store result of song upload to storage.
+        
+        :param song_id: song identifier.
+        :param url: public song url or None if upload failed.
         """
-        if self.is_liked_by(user):
-            l = SongLike.query.filter(SongLike.song_id == self.song_id and SongLike.user_id == user.user_id).first()
-            if l:
-                db.session.delete(l)
+        state = UploadState.READY if url else UploadState.FAILED
+        db.session.execute(db.update(Song).where(Song.song_id == song_id)
+                           .values(url=url, upload_state=state))
+        db.session.commit()
+    
+    @staticmethod
+    def store_audio_info(song_id, info):
+        """Store technical description of uploaded audio file.
+        
+        :param song_id: song identifier.
+        :param info: audio info of uploaded file.
+        """
+        db.session.execute(db.update(Song).where(Song.song_id == song_id)
+                           .values(codec=info.codec, duration=info.duration, bitrate=info.bitrate,
+                                   sample_rate=info.sample_rate, channels=info.channels, size=info.size))
+        db.session.commit()
+    
+    def audio_json(self):
+        """Convert audio description of song to json or None if it is unknown.
+        
+        :param codec: audio codec.
+        :param content_type: MIME type of audio file.
+        :param duration: duration in seconds.
+        :param bitrate: average bitrate in bits per second.
+        :param sample_rate: samples per second.
+        :param channels: number of channels.
+        :param size: file size in bytes.
+        """
+        if self.codec is None:
+            return None
+        return {
+            "codec": self.codec,
+            "content_type": MIME_TYPES.get(self.codec),
+            "duration": self.duration,
+            "bitrate": self.bitrate,
+            "sample_rate": self.sample_rate,
+            "channels": self.channels,
+            "size": self.size
+        }
     
     def get_url(self):
-        """Getter for url."""
-        if self.url is None:
-            try:
-                self.url = get_public_url(str(self.song_id))
-                db.session.add(self)
-                db.session.commit()
-            except:
-                pass
+        """Getter for url. Returns None until song is uploaded."""
+        if self.upload_state != UploadState.READY:
+            return None
         return self.url
     
-    def to_json(self):
+    def pick_rendition(self, quality=None):
+        """Choose rendition of song to play.
+        
+        :param quality: rendition name, "original" or None for TRANSCODE_DEFAULT_QUALITY.
+        :return rendition or None to play original file.
+        """
+        if quality == "original" or not self.renditions:
+            return None
+        qualities = current_app.config["TRANSCODE_RENDITIONS"]
+        target = qualities.get(quality or current_app.config["TRANSCODE_DEFAULT_QUALITY"])
+        if target is None or (self.bitrate and target * 1000 >= self.bitrate):
+            return None
+        fitting = [rendition for rendition in self.renditions if rendition.bitrate <= target * 1000]
+        return fitting[-1] if fitting else self.renditions[0]
+    
+    def playlist_variants(self):
+        """Get segmented renditions of song for HLS master playlist.
+        
+        :return list of (rendition name or "original", bitrate in bits per second).
+        """
+        variants = [(rendition.name, rendition.bitrate) for rendition in self.renditions
+                    if rendition.has_playlist]
+        if self.has_playlist:
+            variants.append(("original", self.bitrate or 0))
+        return variants
+    
+    def playlist_version(self, name):
+        """Get value which changes whenever rendition is segmented anew.
+        
+        Segmenting touches song updated_at, as identifiers of deleted
+        renditions may be reused.
+        
+        :param name: rendition name or "original".
+        :return version or None if rendition isn't segmented.
+        """
+        if name == "original":
+            return (self.url, self.updated_at) if self.has_playlist else None
+        for rendition in self.renditions:
+            if rendition.name == name and rendition.has_playlist:
+                return rendition.rendition_id, self.updated_at
+        return None
+    
+    def stream_url(self, rendition):
+        """Get url to play song from.
+        
+        :param rendition: chosen rendition or None for original file.
+        """
+        if rendition is None:
+            return self.get_url()
+        return rendition.url
+    
+    def to_json(self, rendition=None):
         """Convert song object to json.
         
+        :param rendition: rendition chosen for client or None for original file.
         :param url: url representation of song.
         :param html_url: url to user in source html tag.
         :param name: song name.
@@ -296,6 +798,11 @@ class Song(SearchableMixin, db.Model):
         :param comment: url for song comments.
         :param comments_count: number of song comments.
         :param likes_count: number of song likes.
+        :param audio: technical description of uploaded audio.
+        :param waveform: url for song waveform peaks or None until it is built.
+        :param renditions: transcoded copies of song.
+        :param stream_url: url of chosen rendition to play.
+        :param hls_url: url of HLS master playlist or None if song isn't segmented.
         """
         json_song = {
             "url": url_for("api.get_song", song_id=self.song_id, _external=True),
@@ -304,8 +811,15 @@ class Song(SearchableMixin, db.Model):
             "timestamp": self.timestamp,
             "published_by": url_for("api.get_user", username=self.author.username, _external=True),
             "comments": url_for("api.get_song_comments", song_id=self.song_id, _external=True),
-            "comments_count": self.comments.count(),
-            "likes_count": self.likes.count()
+            "comments_count": self.comment_count,
+            "likes_count": self.like_count,
+            "audio": self.audio_json(),
+            "waveform": url_for("api.get_song_waveform", song_id=self.song_id, _external=True)
+                if self.has_waveform else None,
+            "renditions": [rendition.to_json() for rendition in self.renditions],
+            "stream_url": self.stream_url(rendition),
+            "hls_url": url_for("api.get_song_playlist", song_id=self.song_id, _external=True)
+                if self.playlist_variants() else None
         }
         return json_song
     
@@ -346,8 +860,13 @@ class User(UserMixin, db.Model):
     :param name: user real name.
     :param password: user password. can't be readed.
     :param password_hash: user password hash.
+    :param updated_at: date and time user was last changed.
+    :param fanout_on_read: are user songs merged into timelines on read.
     """
     __tablename__ = "users"
+    __table_args__ = (
+        db.Index("ix_users_member_since", "member_since"),
+    )
     
     user_id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(64), nullable=False, index=True)
@@ -362,6 +881,8 @@ class User(UserMixin, db.Model):
     password = db.Column(db.String(64))
     password_hash = db.Column(db.String(128))
     role_id = db.Column(db.Integer, db.ForeignKey("roles.role_id"))
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    fanout_on_read = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
     
     songs = db.relationship("Song", backref="author", cascade="all,delete", lazy="dynamic")
     comments = db.relationship("Comment", backref="author", cascade="all,delete", lazy="dynamic")
@@ -392,8 +913,13 @@ class User(UserMixin, db.Model):
     
     def can(self, permissions):
         """Check if user has specified permissions or not."""
-        return self.role is not None \
-            and (self.role.permissions & permissions) == permissions
+        if self.role_id is None:
+            if self.role is None:
+                return False
+            granted = self.role.permissions
+        else:
+            granted = current_app.role_permissions.get(self.role_id)
+        return (granted & permissions) == permissions
     
     def is_administrator(self):
         """Check if user has admin permissions or not."""
@@ -412,7 +938,89 @@ class User(UserMixin, db.Model):
     def followed_songs(self):
         """Get all song with authors followed by user."""
         return Song.query.join(Follow, Follow.followed_id == Song.author_id).filter(Follow.follower_id == self.user_id)
-            
+    
+    def fanout_on_read_authors(self):
+        """Get identifiers of followed users whose songs are merged into timeline on read."""
+        return [author_id for author_id, in db.session.query(Follow.followed_id)
+                .join(User, User.user_id == Follow.followed_id)
+                .filter(Follow.follower_id == self.user_id, User.fanout_on_read)]
+    
+    def timeline_cutoff(self, on_read):
+        """Get publish date timeline songs are complete from.
+        
+        Full timeline lacks trimmed songs older than its oldest entry, and
+        songs of fan-out on read author are merged in up to TIMELINE_DEPTH
+        newest ones. Older followed songs are read from database instead.
+        
+        :param on_read: identifiers of followed users with fan-out on read.
+        :return publish date or None if timeline has every followed song.
+        """
+        depth = current_app.config["TIMELINE_DEPTH"]
+        cutoffs = [
+            db.session.query(TimelineEntry.timestamp)
+            .filter(TimelineEntry.user_id == self.user_id)
+            .order_by(TimelineEntry.timestamp.desc())
+            .offset(depth - 1).limit(1).scalar()
+        ]
+        for author_id in on_read:
+            cutoffs.append(
+                db.session.query(Song.timestamp)
+                .filter(Song.author_id == author_id)
+                .order_by(Song.timestamp.desc())
+                .offset(depth - 1).limit(1).scalar()
+            )
+        cutoffs = [cutoff for cutoff in cutoffs if cutoff is not None]
+        return max(cutoffs) if cutoffs else None
+    
+    def timeline_query(self, on_read, cutoff):
+        """Get timeline songs published since cutoff, newest first.
+        
+        :param on_read: identifiers of followed users with fan-out on read.
+        :param cutoff: publish date songs are taken from or None for all songs.
+        """
+        query = Song.query.join(TimelineEntry, TimelineEntry.song_id == Song.song_id) \
+            .filter(TimelineEntry.user_id == self.user_id)
+        if cutoff is not None:
+            query = query.filter(TimelineEntry.timestamp >= cutoff)
+        if not on_read:
+            return query.order_by(TimelineEntry.timestamp.desc())
+        merged = Song.query.filter(Song.author_id.in_(on_read))
+        if cutoff is not None:
+            merged = merged.filter(Song.timestamp >= cutoff)
+        return query.union(merged).order_by(Song.timestamp.desc())
+    
+    @property
+    def timeline_songs(self):
+        """Get songs of followed users from precomputed timeline, newest first.
+        Songs of followed users with fan-out on read are merged in, at most
+        TIMELINE_DEPTH newest ones of each.
+        """
+        on_read = self.fanout_on_read_authors()
+        return self.timeline_query(on_read, self.timeline_cutoff(on_read))
+    
+    def paginate_timeline(self, page, per_page):
+        """Paginate songs of followed users, newest first.
+        
+        Pages are served from precomputed timeline and, once it runs out,
+        from followed songs older than it.
+        
+        :param page: page number starting from 1.
+        :param per_page: amount of songs per page.
+        """
+        on_read = self.fanout_on_read_authors()
+        cutoff = self.timeline_cutoff(on_read)
+        timeline = self.timeline_query(on_read, cutoff)
+        if cutoff is None:
+            return timeline.paginate(page, per_page=per_page, error_out=False)
+        page = max(page, 1)
+        older = self.followed_songs.filter(Song.timestamp < cutoff).order_by(Song.timestamp.desc())
+        timeline_total = timeline.count()
+        offset = (page - 1) * per_page
+        items = timeline.offset(offset).limit(per_page).all() if offset < timeline_total else []
+        if len(items) < per_page:
+            items += older.offset(max(0, offset - timeline_total)).limit(per_page - len(items)).all()
+        return Pagination(None, page, per_page, timeline_total + older.order_by(None).count(), items)
+    
     def unfollow(self, user):
         """Unfollow user.
         
@@ -515,6 +1123,26 @@ class User(UserMixin, db.Model):
             algorithm="HS256"
         )
     
+    def generate_refresh_token(self, expiration=30 * 24 * 3600):
+        """Generate API refresh token. It stops working when password changes.
+        
+        :param expiration: time until token is valid.
+        """
+        return jwt.encode(
+            {
+                "refresh": self.user_id,
+                "key": self.password_key(),
+                "exp": datetime.now(timezone.utc) + \
+                    timedelta(seconds=expiration)
+            },
+            current_app.config["SECRET_KEY"],
+            algorithm="HS256"
+        )
+    
+    def password_key(self):
+        """Short fingerprint of password hash to bind tokens to password."""
+        return sha256(self.password_hash.encode("utf-8")).hexdigest()[:16]
+    
     def validate_confirmation_token(self, token):
         """Validate confirmation token. 
         
@@ -561,17 +1189,102 @@ class User(UserMixin, db.Model):
         
         :param token: confrimation token to confim authentication.
         """
+        data = User.decode_auth_token(token)
+        if data is None or data.get("user_id") is None:
+            return None
+        return User.query.get(data.get("user_id"))
+    
+    @staticmethod
+    def validate_refresh_token(token):
+        """Validate API refresh token.
+        
+        :param token: refresh token to issue new auth token.
+        :return user or None if token is invalid or password was changed.
+        """
+        data = User.decode_auth_token(token)
+        if data is None or data.get("refresh") is None:
+            return None
+        user = User.query.get(data.get("refresh"))
+        if user is None or data.get("key") != user.password_key():
+            return None
+        return user
+    
+    @staticmethod
+    def decode_auth_token(token):
+        """Decode API auth token.
+        
+        :param token: API auth token.
+        :return token payload or None if token is invalid or expired.
+        """
         try:
-            data = jwt.decode(
+            return jwt.decode(
                 token, 
                 current_app.config["SECRET_KEY"],
                 algorithms=["HS256"]
             )
-            print("Here")
-        except:
-            print("here2")
+        except jwt.PyJWTError:
             return None
-        return User.query.get(data.get("user_id"))
+    
+    @staticmethod
+    def principal_for_token(token):
+        """Get principal of API auth token, from cache if possible.
+        
+        :param token: API auth token.
+        :return principal or None if token is invalid.
+        """
+        principal = current_app.principals.get(token)
+        if principal is not None:
+            return principal
+        data = User.decode_auth_token(token)
+        if data is None or data.get("user_id") is None:
+            return None
+        user = User.query.get(data.get("user_id"))
+        if user is None:
+            return None
+        principal = Principal.from_user(user)
+        current_app.principals.set(token, principal, data["exp"])
+        return principal
+    
+    @staticmethod
+    def after_flush(session, flush_context):
+        """Remember users and roles whose permissions are changed by flush.
+        
+        :param session: sqlalchemy session.
+        """
+        changed = session.info.setdefault("principals", set())
+        for obj in session.new | session.dirty | session.deleted:
+            state = db.inspect(obj)
+            if isinstance(obj, Role):
+                if obj not in session.dirty or state.attrs.permissions.history.has_changes():
+                    changed.add(None)
+            elif isinstance(obj, User) and obj not in session.new:
+                if obj in session.deleted or any(state.attrs[attr].history.has_changes()
+                                                 for attr in ("role", "role_id", "confirmed")):
+                    changed.add(obj.user_id)
+    
+    @staticmethod
+    def after_commit(session):
+        """Forget cached principals changed by commit.
+        
+        :param session: sqlalchemy session.
+        """
+        changed = session.info.pop("principals", None)
+        if not changed:
+            return
+        if None in changed:
+            current_app.role_permissions.refresh()
+            current_app.principals.invalidate()
+            return
+        for user_id in changed:
+            current_app.principals.invalidate(user_id)
+    
+    @staticmethod
+    def after_rollback(session):
+        """Forget principal changes which were rolled back.
+        
+        :param session: sqlalchemy session.
+        """
+        session.info.pop("principals", None)
     
     @staticmethod
     def reset_password(token, new_password):
@@ -621,9 +1334,10 @@ class User(UserMixin, db.Model):
         """
         return check_password_hash(self.password_hash, password)
     
-    def to_json(self):
+    def to_json(self, songs_count=None):
         """Convert user object to json.
         
+        :param songs_count: number of user songs if it is already known.
         :param url: url for user.
         :param username: user nick name.
         :param member_since: date user joined site.
@@ -641,10 +1355,22 @@ class User(UserMixin, db.Model):
             "real_name": self.name,
             "location": self.location,
             "songs": url_for("api.get_user_songs", username=self.username, _external=True),
-            "songs_count": self.songs.count()
+            "songs_count": self.songs.count() if songs_count is None else songs_count
         }
         return json_user
     
+    @staticmethod
+    def count_songs(user_ids):
+        """Count songs of several users with single query.
+        
+        :param user_ids: user identifiers.
+        :return dict of user identifier and number of songs.
+        """
+        if not user_ids:
+            return {}
+        return dict(db.session.query(Song.author_id, db.func.count(Song.song_id))
+                    .filter(Song.author_id.in_(set(user_ids))).group_by(Song.author_id))
+    
     def update_json(self, json_user):
         """Update user from json.
         
@@ -671,6 +1397,8 @@ class User(UserMixin, db.Model):
 class AnonymousUser(AnonymousUserMixin):
     """Class to repersent anonymous user."""
     
+    user_id = None
+    
     def can(self, permissions):
         """Check if anonymous user has specified permissions or not."""
         return False
@@ -682,8 +1410,24 @@ class AnonymousUser(AnonymousUserMixin):
 
 login_manager.anonymous_user = AnonymousUser
 
+db.event.listen(Follow, "after_insert", Follow.after_insert)
+db.event.listen(Follow, "after_delete", Follow.after_delete)
+db.event.listen(Song, "after_insert", Song.after_insert)
+db.event.listen(Song, "before_delete", Song.before_delete)
+db.event.listen(SongLike, "after_insert", SongLike.after_insert)
+db.event.listen(SongLike, "after_delete", SongLike.after_delete)
+db.event.listen(Comment, "after_insert", Comment.after_insert)
+db.event.listen(Comment, "after_delete", Comment.after_delete)
 db.event.listen(db.session, "before_commit", SearchableMixin.before_commit)
 db.event.listen(db.session, "after_commit", SearchableMixin.after_commit)
+db.event.listen(db.session, "after_flush", SearchableMixin.after_flush)
+db.event.listen(db.session, "after_rollback", SearchableMixin.after_rollback)
+db.event.listen(db.session, "after_flush", User.after_flush)
+db.event.listen(db.session, "after_commit", User.after_commit)
+db.event.listen(db.session, "after_rollback", User.after_rollback)
+database_index(Song.__table__, Song.__searchable__)
+suggest_source(Song, "name")
+suggest_source(User, "username")
 
 @login_manager.user_loader
 def load_user(user_id):
@@ -691,5 +1435,5 @@ def load_user(user_id):
     
     :param user_id: user identifier.
     """
-    return User.query.get(int(user_id))
+    return User.query.options(db.joinedload(User.role)).get(int(user_id))
     
\ No newline at end of file
@@ -0,0 +1,184 @@
+import hashlib
+import hmac
+import os
+from threading import Lock
+from time import monotonic, time
+from typing import NamedTuple
+
+from cachetools import TTLCache
+from flask import current_app
+
+
+class Principal(NamedTuple):
+    """Identity of API user enough to authorize request without database.
+    
+    :param user_id: user identifier.
+    :param permissions: permissions of user role.
+    :param confirmed: is user account confirmed.
+    """
+    user_id: int
+    permissions: int
+    confirmed: bool
+    
+    is_anonymous = False
+    is_authenticated = True
+    
+    @staticmethod
+    def from_user(user):
+        """Make principal of user.
+        
+        :param user: application user.
+        """
+        permissions = current_app.role_permissions.get(user.role_id)
+        return Principal(user.user_id, permissions, bool(user.confirmed))
+    
+    def can(self, permissions):
+        """Check if user has specified permissions or not."""
+        return (self.permissions & permissions) == permissions
+    
+    def is_administrator(self):
+        """Check if user has admin permissions or not."""
+        from .models import Permission
+        return self.can(Permission.ADMIN)
+
+
+class PrincipalCache:
+    """LRU cache of API auth token principals with TTL.
+    
+    Entries live at most API_TOKEN_CACHE_TTL seconds and never longer
+    than token itself. Changes made by other processes are seen after TTL.
+    
+    :param app: flask application instance.
+    """
+    
+    def __init__(self, app):
+        self._cache = TTLCache(app.config.get("API_TOKEN_CACHE_SIZE", 4096),
+                               app.config.get("API_TOKEN_CACHE_TTL", 60))
+        self._lock = Lock()
+    
+    def get(self, token):
+        """Get principal of token or None.
+        
+        :param token: API auth token.
+        """
+        with self._lock:
+            entry = self._cache.get(token)
+        if entry is None or entry[1] <= time():
+            return None
+        return entry[0]
+    
+    def set(self, token, principal, expires):
+        """Remember principal of token.
+        
+        :param token: API auth token.
+        :param principal: principal of token user.
+        :param expires: unix time token expires.
+        """
+        with self._lock:
+            self._cache[token] = (principal, expires)
+    
+    def invalidate(self, user_id=None):
+        """Forget principals of user or all principals.
+        
+        :param user_id: user identifier or None to forget all.
+        """
+        with self._lock:
+            if user_id is None:
+                self._cache.clear()
+                return
+            for token, (principal, _) in list(self._cache.items()):
+                if principal.user_id == user_id:
+                    del self._cache[token]
+
+
+class CredentialCache:
+    """Short lived cache of successfully verified API passwords.
+    
+    Keys are HMAC of user identifier, password hash and password with
+    key random per process, so neither passwords nor fast offline
+    verifier outlive process. Changed password hash misses cache.
+    
+    :param app: flask application instance.
+    """
+    
+    def __init__(self, app):
+        self._cache = TTLCache(app.config.get("API_CREDENTIAL_CACHE_SIZE", 1024),
+                               app.config.get("API_CREDENTIAL_CACHE_TTL", 60))
+        self._key = os.urandom(32)
+        self._lock = Lock()
+    
+    def key(self, user, password):
+        """Make cache key of user credentials.
+        
+        :param user: application user.
+        :param password: user password.
+        """
+        message = f"{user.user_id}\0{user.password_hash}\0{password}".encode("utf-8")
+        return hmac.new(self._key, message, hashlib.sha256).digest()
+    
+    def verify(self, user, password):
+        """Verify user password, hashing it only on cache miss.
+        
+        :param user: application user.
+        :param password: user password.
+        """
+        key = self.key(user, password)
+        with self._lock:
+            if self._cache.get(key):
+                return True
+        if not user.verify_password(password):
+            return False
+        with self._lock:
+            self._cache[key] = True
+        return True
+
+
+class RolePermissions:
+    """Process wide table of role permissions.
+    
+    Table is reloaded when role changes are committed, when unknown role
+    is asked and at least every ROLE_PERMISSIONS_TTL seconds to see
+    changes made by other processes. Role missing after reload is
+    remembered until the next reload.
+    
+    :param app: flask application instance.
+    """
+    
+    def __init__(self, app):
+        self.ttl = app.config.get("ROLE_PERMISSIONS_TTL", 60)
+        self._table = None
+        self._loaded = 0
+        self._missing = set()
+        self._lock = Lock()
+    
+    def load(self):
+        """Load permissions of all roles."""
+        from .models import Role
+        table = dict(Role.query.with_entities(Role.role_id, Role.permissions))
+        with self._lock:
+            self._table = table
+            self._missing = set()
+            self._loaded = monotonic()
+        return table
+    
+    def get(self, role_id):
+        """Get permissions of role.
+        
+        :param role_id: role identifier or None.
+        :return role permissions or 0 if role doesn't exist.
+        """
+        if role_id is None:
+            return 0
+        table = self._table
+        if table is None or monotonic() - self._loaded > self.ttl \
+                or role_id not in table and role_id not in self._missing:
+            table = self.load()
+            if role_id not in table:
+                with self._lock:
+                    self._missing.add(role_id)
+        return table.get(role_id, 0)
+    
+    def refresh(self):
+        """Forget table so it is reloaded on next permission check."""
+        with self._lock:
+            self._table = None
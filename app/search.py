@@ -1,8 +1,35 @@
+import atexit
 import os
+import re
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from threading import Event, Lock, Thread
+from time import monotonic, sleep, time
 from urllib.parse import urlparse
+from weakref import WeakSet
 
+from cachetools import TTLCache
 from elasticsearch import Elasticsearch
+from elasticsearch.exceptions import ElasticsearchException
 from flask import current_app
+from sqlalchemy import event, text
+
+
+# Tables with database full text index: name -> (primary key, fields).
+DATABASE_INDICES = {}
+# Models suggested by name prefix: table name -> (model, field).
+SUGGEST_SOURCES = {}
+# Index queues flushed when process exits.
+_queues = WeakSet()
+
+
+@atexit.register
+def _flush_queues():
+    """Send pending changes of every index queue when process exits."""
+    for queue in list(_queues):
+        queue.flush_all()
 
 
 def init_search(config_name):
@@ -23,59 +50,839 @@ def init_search(config_name):
     return None
 
 
+class SearchCache:
+    """Cache of search results kept in process memory.
+    
+    Results are keyed by normalised query, page and page size, expire
+    after SEARCH_CACHE_TTL seconds and are dropped for whole index when
+    it is written to. Writes made by other processes are seen after TTL.
+    
+    :param app: flask application instance.
+    """
+    
+    def __init__(self, app):
+        self.maxsize = app.config.get("SEARCH_CACHE_SIZE", 1024)
+        self.ttl = app.config.get("SEARCH_CACHE_TTL", 60)
+        self._caches = {}
+        self._lock = Lock()
+    
+    @staticmethod
+    def key(query, page, per_page):
+        """Get cache key of search.
+        
+        :param query: query to execute.
+        :param page: current pagination page.
+        :param per_page: amount of per page items.
+        """
+        return " ".join((query or "").lower().split()), page, per_page
+    
+    def get(self, index, query, page, per_page):
+        """Get cached ids and total of search or None.
+        
+        :param index: index to query.
+        :param query: query to execute.
+        :param page: current pagination page.
+        :param per_page: amount of per page items.
+        """
+        with self._lock:
+            cache = self._caches.get(index)
+            return cache.get(self.key(query, page, per_page)) if cache is not None else None
+    
+    def set(self, index, query, page, per_page, result):
+        """Remember ids and total of search.
+        
+        :param index: index to query.
+        :param query: query to execute.
+        :param page: current pagination page.
+        :param per_page: amount of per page items.
+        :param result: ids and total.
+        """
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            cache = self._caches.setdefault(index, TTLCache(self.maxsize, self.ttl))
+            cache[self.key(query, page, per_page)] = (list(result[0]), result[1])
+    
+    def invalidate(self, index):
+        """Drop cached results of index.
+        
+        :param index: index that was written to.
+        """
+        with self._lock:
+            self._caches.pop(index, None)
+
+
+class IndexQueue:
+    """Outbox of index changes flushed to elasticsearch in background.
+    
+    Repeated changes of the same document are merged, so only the last
+    one is sent. Changes are sent with bulk API and retried with
+    exponential backoff while elasticsearch is unavailable. Search cache
+    is invalidated again once sent changes are visible to search.
+    
+    :param app: flask application instance.
+    """
+    
+    def __init__(self, app):
+        self.app = app
+        self.batch_size = app.config.get("SEARCH_BULK_SIZE", 500)
+        self.interval = app.config.get("SEARCH_FLUSH_INTERVAL", 1.0)
+        self.backoff = app.config.get("SEARCH_RETRY_BACKOFF", 1.0)
+        self._pending = OrderedDict()
+        self._lock = Lock()
+        self._wakeup = Event()
+        self._idle = Event()
+        self._idle.set()
+        self._worker = None
+        _queues.add(self)
+    
+    def add(self, index, doc_id, payload):
+        """Queue document to be indexed.
+        
+        :param index: index to add document to.
+        :param doc_id: document identifier.
+        :param payload: document fields.
+        """
+        self._put(index, doc_id, ("index", payload))
+    
+    def remove(self, index, doc_id):
+        """Queue document to be deleted.
+        
+        :param index: index to delete document from.
+        :param doc_id: document identifier.
+        """
+        self._put(index, doc_id, ("delete", None))
+    
+    def _put(self, index, doc_id, change):
+        """Replace pending change of document and wake worker up."""
+        with self._lock:
+            self._pending.pop((index, doc_id), None)
+            self._pending[(index, doc_id)] = change
+            self._idle.clear()
+            if self._worker is None:
+                self._worker = Thread(target=self._work, daemon=True)
+                self._worker.start()
+        self._wakeup.set()
+    
+    def _take(self):
+        """Take batch of pending changes."""
+        with self._lock:
+            batch = []
+            while self._pending and len(batch) < self.batch_size:
+                batch.append(self._pending.popitem(last=False))
+            return batch
+    
+    def _requeue(self, batch):
+        """Return changes to queue unless document was changed again."""
+        with self._lock:
+            for key, change in reversed(batch):
+                if key not in self._pending:
+                    self._pending[key] = change
+                    self._pending.move_to_end(key, last=False)
+    
+    def flush(self):
+        """Send one batch of pending changes with bulk API.
+        
+        :return amount of sent changes.
+        """
+        batch = self._take()
+        if not batch:
+            return 0
+        actions = []
+        for (index, doc_id), (op, payload) in batch:
+            actions.append({op: {"_index": index, "_id": doc_id}})
+            if op == "index":
+                actions.append(payload)
+        try:
+            resp = self.app.elasticsearch.bulk(body=actions, refresh="wait_for")
+        except Exception:
+            self._requeue(batch)
+            raise
+        # Results cached before index refresh miss sent changes.
+        cache = getattr(self.app, "search_cache", None)
+        if cache is not None:
+            for index in {index for (index, _), _ in batch}:
+                cache.invalidate(index)
+        if resp.get("errors"):
+            failed = []
+            for item, change in zip(resp["items"], batch):
+                result = next(iter(item.values()))
+                status = result.get("status", 500)
+                if status == 429 or status >= 500:
+                    failed.append(change)
+                elif status >= 400 and not (change[1][0] == "delete" and status == 404):
+                    self.app.logger.error(f"Failed to index {change[0]}: {result.get('error')}")
+            if failed:
+                self._requeue(failed)
+                raise RuntimeError(f"Elasticsearch rejected {len(failed)} documents.")
+        return len(batch)
+    
+    def flush_all(self):
+        """Send all pending changes, giving up on first failure."""
+        try:
+            while self.flush():
+                pass
+        except Exception:
+            self.app.logger.exception("Failed to flush search index queue.")
+    
+    def join(self, timeout=None):
+        """Wait until queue is empty.
+        
+        :param timeout: amount of seconds to wait.
+        """
+        return self._idle.wait(timeout)
+    
+    def _work(self):
+        """Flush changes until queue is empty.
+        
+        Worker stops when queue becomes idle and is started again by the
+        next change, so queue of dropped application can be released.
+        """
+        failures = 0
+        while True:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            try:
+                while self.flush():
+                    pass
+                failures = 0
+            except Exception:
+                self.app.logger.exception("Failed to flush search index queue.")
+                sleep(min(self.backoff * 2 ** failures, 60))
+                failures += 1
+                continue
+            with self._lock:
+                if not self._pending:
+                    self._idle.set()
+                    self._worker = None
+                    return
+
+
 def add_to_index(index, model):
     """Append index to elasticserch engine.
     
+    Document is sent by index queue in background.
+    
     :param index: index to append.
     :param model: add model field to index.
     """
+    current_app.search_cache.invalidate(index)
     if current_app.elasticsearch is None:
         return 
     payload = {}
     for field in model.__searchable__:
         payload[field] = getattr(model, field)
-    current_app.elasticsearch.index(index=index, id=model.id,
-                                    body=payload)
+    current_app.search_queue.add(index, model.id, payload)
 
 
 def remove_from_index(index, model):
     """Delete index from elasticsearch engine.
     
+    Deletion is sent by index queue in background.
+    
     :param index: index to delete.
     :param model: delete model field from index.
     """
+    current_app.search_cache.invalidate(index)
     if current_app.elasticsearch is None:
         return 
-    current_app.elasticsearch.delete(index=index, id=model.id)
+    current_app.search_queue.remove(index, model.id)
 
 
 def query_index(index, query, page, per_page):
     """Query to elasticsearch engine.
     
+    Database full text index is queried when elasticsearch isn't
+    configured or unavailable.
+    
+    :param index: index to query.
+    :param query: query to execute.
+    :param page: current pagination page.
+    :param per_page: amount of per page items.
+    """
+    cached = current_app.search_cache.get(index, query, page, per_page)
+    if cached is not None:
+        return cached
+    result = search_engine(index, query, page, per_page)
+    current_app.search_cache.set(index, query, page, per_page, result)
+    return result
+
+
+def search_engine(index, query, page, per_page):
+    """Query elasticsearch or database without cache.
+    
     :param index: index to query.
     :param query: query to execute.
     :param page: current pagination page.
     :param per_page: amount of per page items.
     """
     if current_app.elasticsearch is None:
-        return [], 0
-    search = current_app.elasticsearch.search(
-        index=index,
-        body={
-            "query": {
-                "multi_match": {
-                    "query": query,
-                    "fields": ["*"]
-                }
-            },
-            "from": (page-1)*per_page,
-            "size": per_page
-        }
-    )
+        return query_database(index, query, page, per_page)
+    try:
+        search = current_app.elasticsearch.search(
+            index=index,
+            body={
+                "query": {
+                    "multi_match": {
+                        "query": query,
+                        "fields": ["*"]
+                    }
+                },
+                "from": (page-1)*per_page,
+                "size": per_page
+            }
+        )
+    except ElasticsearchException:
+        current_app.logger.exception("Elasticsearch search failed, querying database.")
+        return query_database(index, query, page, per_page)
     ids = [int(hits["_id"]) for hits in search["hits"]["hits"]]
     return ids, search["hits"]["total"]["value"]
 
 
+def database_index_statements(dialect, table, pk, fields):
+    """Get statements creating full text index kept in sync by database.
+    
+    SQLite gets FTS5 table over table content updated by triggers,
+    Postgres gets generated tsvector column with GIN index. First field
+    has the highest weight in ranking.
+    
+    :param dialect: name of database dialect.
+    :param table: name of indexed table.
+    :param pk: name of primary key column.
+    :param fields: names of indexed columns.
+    """
+    if dialect == "sqlite":
+        fts = f"{table}_fts"
+        columns = ", ".join(fields)
+        new = ", ".join(f"new.{field}" for field in fields)
+        old = ", ".join(f"old.{field}" for field in fields)
+        delete = f"INSERT INTO {fts}({fts}, rowid, {columns}) VALUES ('delete', old.{pk}, {old});"
+        insert = f"INSERT INTO {fts}(rowid, {columns}) VALUES (new.{pk}, {new});"
+        return [
+            f"CREATE VIRTUAL TABLE {fts} USING fts5({columns}, content='{table}', content_rowid='{pk}')",
+            f"CREATE TRIGGER {fts}_insert AFTER INSERT ON {table} BEGIN {insert} END",
+            f"CREATE TRIGGER {fts}_delete AFTER DELETE ON {table} BEGIN {delete} END",
+            f"CREATE TRIGGER {fts}_update AFTER UPDATE OF {columns} ON {table} BEGIN {delete} {insert} END",
+            f"INSERT INTO {fts}({fts}) VALUES ('rebuild')"
+        ]
+    if dialect == "postgresql":
+        vector = " || ".join(
+            f"setweight(to_tsvector('simple', coalesce({field}, '')), '{'A' if i == 0 else 'B'}')"
+            for i, field in enumerate(fields)
+        )
+        return [
+            f"ALTER TABLE {table} ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ({vector}) STORED",
+            f"CREATE INDEX ix_{table}_search_vector ON {table} USING gin (search_vector)"
+        ]
+    return []
+
+
+def database_index(table, fields):
+    """Create database full text index together with table.
+    
+    :param table: sqlalchemy table to index.
+    :param fields: names of indexed columns.
+    """
+    pk = table.primary_key.columns.values()[0].name
+    DATABASE_INDICES[table.name] = (pk, fields)
+    event.listen(table, "after_create", _create_database_index)
+    event.listen(table, "after_drop", _drop_database_index)
+
+
+def _create_database_index(table, connection, **kwargs):
+    """Create full text index after table is created."""
+    pk, fields = DATABASE_INDICES[table.name]
+    for statement in database_index_statements(connection.dialect.name, table.name, pk, fields):
+        connection.execute(text(statement))
+
+
+def _drop_database_index(table, connection, **kwargs):
+    """Drop SQLite full text table after indexed table is dropped."""
+    if connection.dialect.name == "sqlite":
+        connection.execute(text(f"DROP TABLE IF EXISTS {table.name}_fts"))
+
+
+def query_database(index, query, page, per_page):
+    """Query database full text index ranked by relevance.
+    
+    Every word of query must match prefix of word in indexed fields.
+    
+    :param index: name of indexed table.
+    :param query: query to execute.
+    :param page: current pagination page.
+    :param per_page: amount of per page items.
+    """
+    terms = re.findall(r"\w+", query or "")
+    if index not in DATABASE_INDICES or not terms:
+        return [], 0
+    pk, fields = DATABASE_INDICES[index]
+    db = current_app.extensions["sqlalchemy"].db
+    session = db.session
+    dialect = db.engine.dialect.name
+    params = {"limit": per_page, "offset": (page-1)*per_page}
+    if dialect == "sqlite":
+        fts = f"{index}_fts"
+        params["query"] = " ".join(f'"{term}"*' for term in terms)
+        weights = ", ".join("10.0" if i == 0 else "1.0" for i in range(len(fields)))
+        ids = session.execute(text(
+            f"SELECT rowid FROM {fts} WHERE {fts} MATCH :query "
+            f"ORDER BY bm25({fts}, {weights}), rowid LIMIT :limit OFFSET :offset"
+        ), params).scalars().all()
+        total = session.execute(text(
+            f"SELECT count(*) FROM {fts} WHERE {fts} MATCH :query"
+        ), params).scalar()
+    elif dialect == "postgresql":
+        params["query"] = " & ".join(f"{term}:*" for term in terms)
+        ids = session.execute(text(
+            f"SELECT {pk} FROM {index}, to_tsquery('simple', :query) query "
+            f"WHERE search_vector @@ query "
+            f"ORDER BY ts_rank(search_vector, query) DESC, {pk} LIMIT :limit OFFSET :offset"
+        ), params).scalars().all()
+        total = session.execute(text(
+            f"SELECT count(*) FROM {index} WHERE search_vector @@ to_tsquery('simple', :query)"
+        ), params).scalar()
+    else:
+        return [], 0
+    return ids, total
+
+
+def iter_batches(model, batch_size, after=None, since=None, fields=None):
+    """Iterate rows of searchable fields page by page using primary key keyset.
+    
+    :param model: searchable model class.
+    :param batch_size: amount of rows per page.
+    :param after: primary key to start after.
+    :param since: take only rows changed since this date and time.
+    :param fields: names of fields to take, searchable fields by default.
+    """
+    pk = model.__mapper__.primary_key[0]
+    fields = model.__searchable__ if fields is None else fields
+    columns = [pk] + [getattr(model, field) for field in fields]
+    while True:
+        query = model.query.with_entities(*columns)
+        if since is not None:
+            query = query.filter(model.updated_at >= since)
+        if after is not None:
+            query = query.filter(pk > after)
+        rows = query.order_by(pk).limit(batch_size).all()
+        if not rows:
+            return
+        yield rows
+        after = rows[-1][0]
+
+
+def send_batch(index, fields, rows):
+    """Index batch of rows with single bulk request.
+    
+    :param index: index to send documents to.
+    :param fields: names of searchable fields.
+    :param rows: rows of primary key followed by searchable fields.
+    """
+    actions = []
+    for row in rows:
+        actions.append({"index": {"_index": index, "_id": row[0]}})
+        actions.append(dict(zip(fields, row[1:])))
+    resp = current_app.elasticsearch.bulk(body=actions)
+    if resp.get("errors"):
+        raise RuntimeError(f"Elasticsearch rejected documents of batch ending with {rows[-1][0]}.")
+    return len(rows)
+
+
+def send_changes(model, index, batch_size, started, last_id, sent):
+    """Index rows changed or inserted while reindex was running.
+    
+    :param model: searchable model class.
+    :param index: index to send documents to.
+    :param batch_size: amount of documents per bulk request.
+    :param started: date and time reindex was started.
+    :param last_id: last primary key sent by reindex.
+    :param sent: primary keys of sent documents, extended with sent rows.
+    """
+    if hasattr(model, "updated_at"):
+        batches = iter_batches(model, batch_size, since=started)
+    else:
+        batches = iter_batches(model, batch_size, after=last_id)
+    done = 0
+    for rows in batches:
+        sent.extend(row[0] for row in rows)
+        done += send_batch(index, model.__searchable__, rows)
+    return done
+
+
+def remove_deleted(model, index, batch_size, sent):
+    """Delete documents of rows deleted while reindex was running.
+    
+    :param model: searchable model class.
+    :param index: index to delete documents from.
+    :param batch_size: amount of documents per bulk request.
+    :param sent: primary keys of sent documents.
+    """
+    deleted = set(sent)
+    for rows in iter_batches(model, batch_size, fields=[]):
+        deleted.difference_update(row[0] for row in rows)
+    if deleted:
+        current_app.elasticsearch.bulk(body=[{"delete": {"_index": index, "_id": ident}}
+                                             for ident in sorted(deleted)])
+    return len(deleted)
+
+
+def swap_alias(alias, index):
+    """Point alias to index and delete indices it pointed to before.
+    
+    Index named as alias is replaced by alias in the same atomic request,
+    so search never misses it.
+    
+    :param alias: name clients search in.
+    :param index: new index.
+    """
+    es = current_app.elasticsearch
+    old_indices = []
+    actions = []
+    if es.indices.exists_alias(name=alias):
+        old_indices = list(es.indices.get_alias(name=alias).keys())
+        actions = [{"remove": {"index": old, "alias": alias}} for old in old_indices]
+    elif es.indices.exists(index=alias):
+        actions = [{"remove_index": {"index": alias}}]
+    actions.append({"add": {"index": index, "alias": alias}})
+    es.indices.update_aliases(body={"actions": actions})
+    for old in old_indices:
+        if old != index:
+            es.indices.delete(index=old)
+
+
+def bulk_reindex(model, batch_size=1000, workers=4, swap=False, progress=None):
+    """Reindex all model rows with parallel bulk requests.
+    
+    With swap documents are written to new index which replaces old one
+    behind alias only when it is complete, so search keeps working.
+    Index queue keeps writing changes to old index meanwhile, so rows
+    changed or deleted since reindex started are caught up before swap
+    and once more after it.
+    
+    :param model: searchable model class.
+    :param batch_size: amount of documents per bulk request.
+    :param workers: amount of parallel bulk requests.
+    :param swap: reindex into new index and swap alias.
+    :param progress: function called with amount of indexed documents and elapsed seconds.
+    """
+    if current_app.elasticsearch is None:
+        return 0
+    alias = model.__tablename__
+    index = f"{alias}-{int(time())}" if swap else alias
+    if swap:
+        current_app.elasticsearch.indices.create(index=index)
+    app = current_app._get_current_object()
+    
+    def send(rows):
+        with app.app_context():
+            return send_batch(index, model.__searchable__, rows)
+    
+    started = monotonic()
+    started_at = datetime.utcnow()
+    done = 0
+    last_id = None
+    sent = []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = []
+        for rows in iter_batches(model, batch_size):
+            last_id = rows[-1][0]
+            if swap:
+                sent.extend(row[0] for row in rows)
+            futures.append(pool.submit(send, rows))
+            # Keep only few batches in memory.
+            while len(futures) >= workers * 2:
+                done += futures.pop(0).result()
+                if progress is not None:
+                    progress(done, monotonic() - started)
+        for future in futures:
+            done += future.result()
+            if progress is not None:
+                progress(done, monotonic() - started)
+    if swap:
+        caught_up_at = datetime.utcnow()
+        done += send_changes(model, index, batch_size, started_at, last_id, sent)
+        remove_deleted(model, index, batch_size, sent)
+        current_app.elasticsearch.indices.refresh(index=index)
+        swap_alias(alias, index)
+        # Changes which reached old index while it was caught up.
+        send_changes(model, alias, batch_size, caught_up_at, last_id, sent)
+        remove_deleted(model, alias, batch_size, sent)
+    current_app.search_cache.invalidate(alias)
+    return done
+
+
+def suggest_source(model, field):
+    """Suggest model instances by prefix of field.
+    
+    :param model: model class.
+    :param field: name of field to suggest by.
+    """
+    SUGGEST_SOURCES[model.__tablename__] = (model, field)
+
+
+class PrefixIndex:
+    """Sorted arrays of lowercase names searched by prefix with bisect.
+    
+    Every word of name starts its own key, so "rain" finds "Summer rain".
+    """
+    
+    def __init__(self):
+        self._keys = {}
+        self._labels = {}
+        self._lock = Lock()
+    
+    @staticmethod
+    def keys(label):
+        """Get keys name is found by.
+        
+        :param label: name to index.
+        """
+        words = label.casefold().split()
+        return [" ".join(words[i:]) for i in range(len(words))]
+    
+    def load(self, entries):
+        """Replace index content.
+        
+        :param entries: iterable of kind, identifier and name.
+        """
+        labels = {(kind, ident): label for kind, ident, label in entries if label}
+        keys = {}
+        for (kind, ident), label in labels.items():
+            keys.setdefault(kind, []).extend((key, ident) for key in self.keys(label))
+        for kind_keys in keys.values():
+            kind_keys.sort()
+        with self._lock:
+            self._labels, self._keys = labels, keys
+    
+    def add(self, kind, ident, label):
+        """Add or rename entry.
+        
+        :param kind: kind of entry.
+        :param ident: entry identifier.
+        :param label: name of entry.
+        """
+        with self._lock:
+            self._discard(kind, ident)
+            if not label:
+                return
+            self._labels[(kind, ident)] = label
+            kind_keys = self._keys.setdefault(kind, [])
+            for key in self.keys(label):
+                insort(kind_keys, (key, ident))
+    
+    def remove(self, kind, ident):
+        """Remove entry.
+        
+        :param kind: kind of entry.
+        :param ident: entry identifier.
+        """
+        with self._lock:
+            self._discard(kind, ident)
+    
+    def _discard(self, kind, ident):
+        """Remove entry keys, lock must be held."""
+        label = self._labels.pop((kind, ident), None)
+        if label is None:
+            return
+        kind_keys = self._keys[kind]
+        for key in self.keys(label):
+            i = bisect_left(kind_keys, (key, ident))
+            if i < len(kind_keys) and kind_keys[i] == (key, ident):
+                del kind_keys[i]
+    
+    def search(self, prefix, limit):
+        """Find entries of every kind with key starting with prefix.
+        
+        :param prefix: typed prefix.
+        :param limit: max amount of entries of one kind.
+        :return dict of kind and list of identifier and name pairs.
+        """
+        prefix = " ".join(prefix.casefold().split())
+        results = {}
+        with self._lock:
+            for kind, kind_keys in self._keys.items():
+                hits = results[kind] = []
+                seen = set()
+                i = bisect_left(kind_keys, (prefix,))
+                while i < len(kind_keys) and len(hits) < limit and kind_keys[i][0].startswith(prefix):
+                    ident = kind_keys[i][1]
+                    if ident not in seen:
+                        seen.add(ident)
+                        hits.append((ident, self._labels[(kind, ident)]))
+                    i += 1
+        return results
+
+
+class Suggestions:
+    """Search as you type suggestions by name prefix.
+    
+    Names are kept in prefix index in process memory which is loaded
+    from database on first use, updated on commit and reloaded in
+    background every SUGGEST_REFRESH_INTERVAL seconds to see changes of
+    other processes. When elasticsearch is configured names are also
+    sent to "suggestions" index and suggested by completion suggester,
+    memory is used only while elasticsearch fails.
+    
+    :param app: flask application instance.
+    """
+    index = "suggestions"
+    
+    def __init__(self, app):
+        self.app = app
+        self.limit = app.config.get("SUGGEST_LIMIT", 5)
+        self.refresh_interval = app.config.get("SUGGEST_REFRESH_INTERVAL", 300)
+        self.prefix_index = PrefixIndex()
+        self._loaded = None
+        self._loading = False
+        self._lock = Lock()
+    
+    def add(self, kind, ident, label):
+        """Add or rename suggested entry.
+        
+        :param kind: table name of entry.
+        :param ident: entry identifier.
+        :param label: name of entry.
+        """
+        if self._loaded is not None:
+            self.prefix_index.add(kind, ident, label)
+        if self.app.elasticsearch is not None:
+            self.app.search_queue.add(self.index, f"{kind}-{ident}", self.document(kind, ident, label))
+    
+    def remove(self, kind, ident):
+        """Remove suggested entry.
+        
+        :param kind: table name of entry.
+        :param ident: entry identifier.
+        """
+        if self._loaded is not None:
+            self.prefix_index.remove(kind, ident)
+        if self.app.elasticsearch is not None:
+            self.app.search_queue.remove(self.index, f"{kind}-{ident}")
+    
+    @staticmethod
+    def document(kind, ident, label):
+        """Get elasticsearch document of entry.
+        
+        :param kind: table name of entry.
+        :param ident: entry identifier.
+        :param label: name of entry.
+        """
+        return {
+            "suggest": PrefixIndex.keys(label or ""),
+            "kind": kind,
+            "ident": ident,
+            "label": label
+        }
+    
+    @staticmethod
+    def entries():
+        """Iterate kind, identifier and name of all suggested entries."""
+        for kind, (model, field) in SUGGEST_SOURCES.items():
+            pk = model.__mapper__.primary_key[0]
+            for ident, label in model.query.with_entities(pk, getattr(model, field)).yield_per(1000):
+                yield kind, ident, label
+    
+    def load(self):
+        """Load prefix index from database."""
+        self.prefix_index.load(self.entries())
+        self._loaded = monotonic()
+    
+    def suggest(self, prefix, limit=None):
+        """Find entries by prefix.
+        
+        :param prefix: typed prefix.
+        :param limit: max amount of entries of one kind.
+        :return dict of kind and list of identifier and name pairs.
+        """
+        limit = limit or self.limit
+        if self.app.elasticsearch is not None:
+            try:
+                return self.suggest_elasticsearch(prefix, limit)
+            except ElasticsearchException:
+                self.app.logger.exception("Elasticsearch suggest failed, using memory index.")
+        self._ensure_loaded()
+        return self.prefix_index.search(prefix, limit)
+    
+    def suggest_elasticsearch(self, prefix, limit):
+        """Find entries by prefix with completion suggester.
+        
+        :param prefix: typed prefix.
+        :param limit: max amount of entries of one kind.
+        """
+        resp = self.app.elasticsearch.search(index=self.index, body={
+            "_source": ["kind", "ident", "label"],
+            "suggest": {
+                "names": {
+                    "prefix": " ".join(prefix.casefold().split()),
+                    "completion": {"field": "suggest", "size": limit * len(SUGGEST_SOURCES)}
+                }
+            }
+        })
+        results = {kind: [] for kind in SUGGEST_SOURCES}
+        for option in resp["suggest"]["names"][0]["options"]:
+            source = option["_source"]
+            hits = results.get(source["kind"])
+            if hits is not None and len(hits) < limit and source["ident"] not in (h[0] for h in hits):
+                hits.append((source["ident"], source["label"]))
+        return results
+    
+    def create_index(self):
+        """Create elasticsearch index with completion field."""
+        es = self.app.elasticsearch
+        if not es.indices.exists(index=self.index):
+            es.indices.create(index=self.index, body={
+                "mappings": {
+                    "properties": {
+                        "suggest": {"type": "completion"},
+                        "kind": {"type": "keyword"},
+                        "ident": {"type": "keyword"},
+                        "label": {"type": "keyword", "index": False}
+                    }
+                }
+            })
+    
+    def reindex(self, batch_size=1000):
+        """Send all entries to elasticsearch with bulk requests.
+        
+        :param batch_size: amount of documents per bulk request.
+        """
+        self.create_index()
+        actions = []
+        for kind, ident, label in self.entries():
+            actions.append({"index": {"_index": self.index, "_id": f"{kind}-{ident}"}})
+            actions.append(self.document(kind, ident, label))
+            if len(actions) >= batch_size * 2:
+                self.app.elasticsearch.bulk(body=actions)
+                actions = []
+        if actions:
+            self.app.elasticsearch.bulk(body=actions)
+    
+    def _ensure_loaded(self):
+        """Load prefix index on first use and refresh it in background."""
+        if self._loaded is None:
+            with self._lock:
+                if self._loaded is None:
+                    self.load()
+            return
+        if not self.refresh_interval or monotonic() - self._loaded < self.refresh_interval:
+            return
+        with self._lock:
+            if self._loading:
+                return
+            self._loading = True
+        Thread(target=self._refresh, daemon=True).start()
+    
+    def _refresh(self):
+        """Reload prefix index in application context."""
+        try:
+            with self.app.app_context():
+                self.load()
+        except Exception:
+            self.app.logger.exception("Failed to refresh suggestions.")
+        finally:
+            self._loading = False
+
+
 def create_index(index):
     """Create index.
     
@@ -0,0 +1,49 @@
+from flask import current_app
+
+from .hls import playlist_name, segment_name
+from .waveform import waveform_name
+
+
+def playlist_segment_names(song_id, name):
+    """Get storage names of segments listed in stored media playlist.
+
+    :param song_id: song identifier.
+    :param name: rendition name or "original".
+    """
+    with current_app.storage.open(playlist_name(song_id, name)) as f:
+        lines = f.read().decode("utf-8").splitlines()
+    count = sum(1 for line in lines if line and not line.startswith("#"))
+    return [segment_name(song_id, name, index) for index in range(count)]
+
+
+def song_file_names(song):
+    """Get storage names of uploaded song file and every file made of it.
+
+    :param song: song the files belong to.
+    """
+    names = [str(song.song_id)]
+    if song.has_waveform:
+        names.append(waveform_name(song.song_id))
+    for rendition in song.renditions:
+        names.append(rendition.storage_name(song.song_id, rendition.name))
+    for name, _ in song.playlist_variants():
+        try:
+            names.extend(playlist_segment_names(song.song_id, name))
+        except Exception:
+            current_app.logger.exception(f"Playlist {name} of song {song.song_id} can't be read.")
+        names.append(playlist_name(song.song_id, name))
+    return names
+
+
+def delete_song_files(song):
+    """Delete uploaded song file, waveform, renditions and HLS segments from storage.
+
+    Files which fail to be deleted are logged, so song can still be deleted.
+
+    :param song: song the files belong to.
+    """
+    for name in song_file_names(song):
+        try:
+            current_app.storage.delete(name)
+        except Exception:
+            current_app.logger.exception(f"File {name} of song {song.song_id} can't be deleted.")
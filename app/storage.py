@@ -1,66 +1,297 @@
 import os
-from threading import Thread
+import shutil
+from abc import ABC, abstractmethod
+from queue import Full, Queue
+from threading import Lock, Thread
+from time import sleep
 from uuid import uuid4
 
-from firebase_admin import storage
 from flask import current_app
 
 
+class UploadQueueFull(Exception):
+    """Raised when upload queue stays full longer than allowed."""
+    pass
+
+
 def generate_access_token():
     """Generate access token to upload to firebase."""
     return uuid4()
 
 
-def async_upload(file_name, content_type, blob):
-    """Upload file to storage asyncronyously.
-    
-    :param file_name: name of local file to upload.
+class StorageBackend(ABC):
+    """Interface of storage songs are kept in."""
+
+    @abstractmethod
+    def upload(self, path, name, content_type):
+        """Upload local file to storage. Local file may be consumed.
+
+        :param path: path of local file to upload.
+        :param name: name of file in storage.
+        :param content_type: type of file.
+        :return public url of uploaded file.
+        """
+
+    @abstractmethod
+    def delete(self, name):
+        """Delete file from storage.
+
+        :param name: name of file in storage.
+        """
+
+    @abstractmethod
+    def public_url(self, name):
+        """Get public url of file.
+
+        :param name: name of file in storage.
+        """
+
+    @abstractmethod
+    def open(self, name):
+        """Open file from storage for binary reading.
+
+        :param name: name of file in storage.
+        """
+
+
+class FirebaseStorage(StorageBackend):
+    """Storage backend kept in firebase storage bucket.
+
+    :param key: path to firebase service account key.
+    :param bucket: firebase storage bucket name.
+    """
+
+    def __init__(self, key, bucket):
+        import firebase_admin
+        from firebase_admin import credentials
+        try:
+            firebase_admin.get_app()
+        except ValueError:
+            firebase_admin.initialize_app(credentials.Certificate(key), {
+                "storageBucket": bucket
+            })
+
+    def blob(self, name):
+        """Get firebase blob object.
+
+        :param name: name of file in storage.
+        """
+        from firebase_admin import storage
+        return storage.bucket().blob(name)
+
+    def upload(self, path, name, content_type):
+        blob = self.blob(name)
+
+        new_token = generate_access_token()
+        metadata  = {"firebaseStorageDownloadTokens": new_token}
+
+        blob.metadata = metadata
+        blob.upload_from_filename(filename=path, content_type=content_type)
+        blob.make_public()
+        return blob.public_url
+
+    def delete(self, name):
+        self.blob(name).delete()
+
+    def public_url(self, name):
+        blob = self.blob(name)
+        blob.make_public()
+        return blob.public_url
+
+    def open(self, name):
+        return self.blob(name).open("rb")
+
+
+class LocalStorage(StorageBackend):
+    """Storage backend kept in local directory and served by "main.media".
+
+    :param root: directory files are kept in.
+    :param url: url prefix files are served from.
+    """
+
+    def __init__(self, root, url):
+        self.root = os.path.abspath(root)
+        self.url = url.rstrip("/")
+        os.makedirs(self.root, exist_ok=True)
+
+    def path(self, name):
+        """Get local path of file.
+
+        :param name: name of file in storage.
+        """
+        return os.path.join(self.root, name)
+
+    def upload(self, path, name, content_type):
+        os.makedirs(os.path.dirname(self.path(name)), exist_ok=True)
+        shutil.move(path, self.path(name))
+        return self.public_url(name)
+
+    def delete(self, name):
+        if os.path.exists(self.path(name)):
+            os.remove(self.path(name))
+
+    def public_url(self, name):
+        return f"{self.url}/{name}"
+
+    def open(self, name):
+        return open(self.path(name), "rb")
+
+
+def init_storage(app):
+    """Initialize storage backend depending on config.
+
+    :param app: flask application instance.
+    """
+    backend = app.config["STORAGE_BACKEND"]
+    if backend == "local":
+        return LocalStorage(app.config["STORAGE_PATH"], app.config["STORAGE_URL"])
+    if backend == "firebase":
+        return FirebaseStorage(app.config["FIREBASE_KEY"], app.config["FIREBASE_BUCKET"])
+    raise ValueError(f"Unknown storage backend {backend}.")
+
+
+def upload_file(path, name, content_type):
+    """Upload local file to application storage.
+
+    :param path: path of local file to upload.
+    :param name: name of file in storage.
     :param content_type: type of file.
-    :param blob: firebase blob object.
+    :return public url of uploaded file.
     """
-    blob.upload_from_filename(filename=file_name, content_type=content_type)
-    os.remove(file_name)
+    return current_app.storage.upload(path, name, content_type)
+
+
+class UploadExecutor:
+    """Pool of upload workers fed from bounded queue.
+
+    Uploads are retried with exponential backoff, local file is always
+    removed and callback is called with public url or None if all
+    attempts failed.
+
+    :param app: flask application instance.
+    :param upload: function to upload single file, returns public url.
+    """
+
+    def __init__(self, app=None, upload=None):
+        self.upload = upload or upload_file
+        self._queue = None
+        self._workers = []
+        self._lock = Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Initialize executor for application.
+
+        Workers started for previous application are stopped.
+
+        :param app: flask application instance.
+        """
+        self.shutdown()
+        self.app = app
+        self.workers = app.config.get("UPLOAD_WORKERS", 4)
+        self.retries = app.config.get("UPLOAD_RETRIES", 3)
+        self.backoff = app.config.get("UPLOAD_RETRY_BACKOFF", 1.0)
+        self.queue_timeout = app.config.get("UPLOAD_QUEUE_TIMEOUT", 5)
+        self._queue = Queue(maxsize=app.config.get("UPLOAD_QUEUE_SIZE", 32))
+        self._workers = []
 
+    def submit(self, path, name, content_type, callback):
+        """Put file to upload queue.
 
-def upload_to_storage(file_name, content_type):
-    """Upload file to storage.
-    
-    :param file_name: name of local file to upload.
+        Blocks while queue is full and raises UploadQueueFull if it
+        stays full for UPLOAD_QUEUE_TIMEOUT seconds.
+
+        :param path: path of local file to upload.
+        :param name: name of file in storage.
+        :param content_type: type of file.
+        :param callback: function called with public url or None if upload failed.
+        """
+        self._start_workers()
+        try:
+            self._queue.put((path, name, content_type, callback), timeout=self.queue_timeout)
+        except Full:
+            raise UploadQueueFull("Upload queue is full.")
+
+    def join(self):
+        """Wait until all queued uploads are finished."""
+        self._queue.join()
+
+    def shutdown(self):
+        """Stop worker threads after queued uploads are finished."""
+        with self._lock:
+            workers, self._workers = self._workers, []
+            for _ in workers:
+                self._queue.put(None)
+        for worker in workers:
+            worker.join()
+
+    def _start_workers(self):
+        """Start worker threads on first submit."""
+        with self._lock:
+            while len(self._workers) < self.workers:
+                worker = Thread(target=self._work, args=[self._queue], daemon=True)
+                worker.start()
+                self._workers.append(worker)
+
+    def _work(self, queue):
+        """Take uploads from queue until executor is shut down.
+
+        :param queue: queue worker was started for.
+        """
+        while True:
+            job = queue.get()
+            if job is None:
+                queue.task_done()
+                return
+            try:
+                with self.app.app_context():
+                    self._run(*job)
+            except Exception:
+                self.app.logger.exception("Upload callback failed.")
+            finally:
+                queue.task_done()
+
+    def _run(self, path, name, content_type, callback):
+        """Upload file with retries and report result to callback."""
+        url = None
+        try:
+            for attempt in range(self.retries + 1):
+                try:
+                    url = self.upload(path, name, content_type)
+                    break
+                except Exception:
+                    self.app.logger.exception(f"Upload attempt {attempt + 1} of {name} failed.")
+                    if attempt < self.retries:
+                        sleep(self.backoff * 2 ** attempt)
+        finally:
+            if os.path.exists(path):
+                os.remove(path)
+        callback(url)
+
+
+def upload_to_storage(path, name, content_type, callback):
+    """Upload file to storage in background.
+
+    :param path: path of local file to upload.
+    :param name: name of file in storage.
     :param content_type: type of file.
+    :param callback: function called with public url or None if upload failed.
     """
-    bucket = storage.bucket()
-    blob = bucket.blob(file_name)
-    
-    new_token = generate_access_token()
-    metadata  = {"firebaseStorageDownloadTokens": new_token}
-    
-    blob.metadata = metadata
-    
-    thr = Thread(target=async_upload, args=[file_name, content_type, blob])
-    thr.start()
-    
-    return thr
- 
- 
+    current_app.uploader.submit(path, name, content_type, callback)
+
+
 def delete_from_storage(file_name):
     """Delete file from storage.
-    
+
     :param file_name: name of file to delete.
     """
-    bucket = storage.bucket()
-    blob = bucket.blob(file_name)
-    blob.delete()
-    
-    
+    current_app.storage.delete(file_name)
+
+
 def get_public_url(file_name):
     """Get file url from storage.
-    
+
     :param file_name: name of file to get url.
     """
-    bucket = storage.bucket()
-    blob = bucket.blob(file_name)
-    
-    blob.make_public()
-    return blob.public_url
-    
-    
\ No newline at end of file
+    return current_app.storage.public_url(file_name)
@@ -0,0 +1,140 @@
+import os
+import shutil
+import subprocess
+
+from flask import current_app
+
+from .hls import segment_song
+from .jobs import BackgroundJobs
+from .models import Rendition, Song
+from .uploads import spool_song_file
+
+
+# Client hints renditions are chosen by.
+CLIENT_HINTS = ("Save-Data", "ECT", "Downlink")
+
+
+def encode_mp3(encoder, src, dst, bitrate):
+    """Encode audio file to MP3 with ffmpeg compatible encoder binary.
+
+    :param encoder: path of encoder binary.
+    :param src: path of source audio file.
+    :param dst: path of encoded file.
+    :param bitrate: target bitrate in kbps.
+    """
+    subprocess.run(
+        [encoder, "-v", "error", "-y", "-i", src, "-vn", "-map_metadata", "-1",
+         "-codec:a", "libmp3lame", "-b:a", f"{bitrate}k", "-f", "mp3", dst],
+        stdin=subprocess.DEVNULL, check=True
+    )
+
+
+def requested_quality(request):
+    """Get rendition quality asked by "?quality=" or client hints.
+
+    :param request: current request.
+    :return rendition name, "original" or None if nothing is asked.
+    """
+    quality = request.args.get("quality")
+    if quality == "original" or quality in current_app.config["TRANSCODE_RENDITIONS"]:
+        return quality
+    if request.headers.get("Save-Data", "").lower() == "on":
+        return "low"
+    ect = request.headers.get("ECT")
+    if ect in ("slow-2g", "2g"):
+        return "low"
+    if ect == "3g":
+        return "medium"
+    downlink = request.headers.get("Downlink", type=float)
+    if downlink is not None:
+        if downlink < 0.5:
+            return "low"
+        return "medium" if downlink < 2 else "high"
+    return None
+
+
+def vary_on_client_hints(resp):
+    """Ask browser for client hints and mark response as depending on them.
+
+    :param resp: response rendition was chosen for.
+    """
+    resp.headers["Accept-CH"] = ", ".join(CLIENT_HINTS)
+    for hint in CLIENT_HINTS:
+        resp.vary.add(hint)
+    return resp
+
+
+class Transcoder(BackgroundJobs):
+    """Pool of workers transcoding uploaded songs into renditions.
+
+    Each worker drives one encoder process at a time, so encoding runs
+    in TRANSCODE_WORKERS parallel processes. Renditions are made only
+    when encoder binary is installed and are split into HLS segments
+    afterwards when HLS_ENABLED is set.
+
+    :param app: flask application instance.
+    :param encode: function to encode single rendition, see encode_mp3.
+    """
+
+    failure = "Transcoding of song {} failed."
+
+    def __init__(self, app, encode=None):
+        super().__init__(app, app.config.get("TRANSCODE_WORKERS", 2))
+        self.encode = encode or encode_mp3
+
+    @property
+    def encoder(self):
+        """Path of encoder binary or None if it isn't installed."""
+        return shutil.which(self.app.config["TRANSCODE_ENCODER"])
+
+    def submit(self, song_id):
+        """Transcode song in background if encoder is available.
+
+        :param song_id: song identifier.
+        """
+        if self.encoder is None and not self.app.config["HLS_ENABLED"]:
+            return
+        super().submit(song_id)
+
+    def run(self, song_id):
+        """Transcode song and split it into HLS segments if enabled.
+
+        :param song_id: song identifier.
+        """
+        self.transcode(song_id)
+        if self.app.config["HLS_ENABLED"]:
+            segment_song(song_id)
+
+    def transcode(self, song_id):
+        """Encode song into every configured rendition below its own bitrate.
+
+        Renditions are made from the lowest one, so it is playable first.
+
+        :param song_id: song identifier.
+        :return names of made renditions.
+        """
+        song = Song.query.get(song_id)
+        if song is None or song.url is None or self.encoder is None:
+            return []
+        renditions = sorted(current_app.config["TRANSCODE_RENDITIONS"].items(), key=lambda item: item[1])
+        renditions = [(name, bitrate) for name, bitrate in renditions
+                      if not song.bitrate or bitrate * 1000 < song.bitrate]
+        if not renditions:
+            return []
+        src = spool_song_file(song_id)
+        made = []
+        try:
+            for name, bitrate in renditions:
+                dst = f"{src}.{name}.mp3"
+                try:
+                    self.encode(self.encoder, src, dst, bitrate)
+                    size = os.path.getsize(dst)
+                    url = current_app.storage.upload(dst, Rendition.storage_name(song_id, name), "audio/mpeg")
+                finally:
+                    if os.path.exists(dst):
+                        os.remove(dst)
+                Rendition.store(song_id, name, bitrate * 1000, "mp3", url, size)
+                made.append(name)
+        finally:
+            os.remove(src)
+        return made
@@ -0,0 +1,332 @@
+import fcntl
+import hashlib
+import json
+import os
+import re
+from functools import partial
+from time import time
+from uuid import uuid4
+
+from flask import current_app
+
+from . import db
+from .audio import probe
+from .exceptions import ValidationError
+from .models import Song
+from .storage import UploadQueueFull, upload_to_storage
+
+
+CONTENT_RANGE = re.compile(r"^bytes (\d+)-(\d+)/(\d+)$")
+
+
+def spool_path(name):
+    """Get path of file in spool directory.
+
+    :param name: name of spooled file.
+    """
+    spool = current_app.config["UPLOAD_SPOOL_DIR"]
+    os.makedirs(spool, exist_ok=True)
+    return os.path.join(spool, name)
+
+
+def copy_stream(stream, f, length=None, digest=None):
+    """Copy stream to file in fixed size chunks.
+
+    :param stream: stream to read from.
+    :param f: file to write to.
+    :param length: amount of bytes to copy, whole stream if None.
+    :param digest: hashlib object updated with copied bytes.
+    :return amount of copied bytes.
+    """
+    chunk_size = current_app.config["UPLOAD_CHUNK_SIZE"]
+    copied = 0
+    while length is None or copied < length:
+        size = chunk_size if length is None else min(chunk_size, length - copied)
+        chunk = stream.read(size)
+        if not chunk:
+            break
+        f.write(chunk)
+        if digest is not None:
+            digest.update(chunk)
+        copied += len(chunk)
+    return copied
+
+
+def spool_stream(stream):
+    """Save stream to spool directory in fixed size chunks.
+
+    :param stream: stream to save.
+    :return path of spooled file.
+    """
+    path = spool_path(uuid4().hex)
+    with open(path, "wb") as f:
+        copy_stream(stream, f)
+    return path
+
+
+def spool_storage_file(name):
+    """Copy file from storage to spool directory.
+
+    :param name: name of file in storage.
+    :return path of spooled file.
+    """
+    path = spool_path(uuid4().hex)
+    with current_app.storage.open(name) as src, open(path, "wb") as dst:
+        copy_stream(src, dst)
+    return path
+
+
+def spool_song_file(song_id):
+    """Copy uploaded song file from storage to spool directory.
+
+    :param song_id: song identifier.
+    :return path of spooled file.
+    """
+    return spool_storage_file(str(song_id))
+
+
+def start_song_upload(song, path, content_type):
+    """Describe spooled song file and hand it off to storage.
+
+    :param song: song the file belongs to.
+    :param path: path of spooled file.
+    :param content_type: type of file if it isn't recognized by headers.
+    """
+    try:
+        info = probe(path)
+    except Exception:
+        current_app.logger.exception(f"Probing of song {song.song_id} failed.")
+        info = None
+    if info is not None:
+        Song.store_audio_info(song.song_id, info)
+        content_type = info.mime_type
+    upload_to_storage(path, str(song.song_id), content_type,
+                      callback=partial(finish_song_upload, song.song_id))
+
+
+def finish_song_upload(song_id, url):
+    """Store result of song upload, build waveform and renditions of uploaded song.
+
+    :param song_id: song identifier.
+    :param url: public song url or None if upload failed.
+    """
+    Song.finish_upload(song_id, url)
+    if url is not None:
+        current_app.waveforms.submit(song_id)
+        current_app.transcoder.submit(song_id)
+
+
+class ChunkedUpload:
+    """Resumable upload spooled to disk chunk by chunk.
+
+    Upload state is kept in "<upload_id>.json" next to "<upload_id>.part"
+    file in UPLOAD_SPOOL_DIR, so any worker process can continue it.
+
+    :param upload_id: unique upload identifier.
+    :param song_id: identifier of song being uploaded.
+    :param user_id: identifier of user who uploads song.
+    :param size: full size of file in bytes.
+    :param sha256: expected hex digest of full file or None.
+    :param content_type: type of file.
+    :param received: amount of already received bytes.
+    :param created: unix time upload was started.
+    """
+
+    def __init__(self, upload_id, song_id, user_id, size, sha256=None,
+                 content_type="audio/mpeg", received=0, created=None):
+        self.upload_id = upload_id
+        self.song_id = song_id
+        self.user_id = user_id
+        self.size = size
+        self.sha256 = sha256
+        self.content_type = content_type
+        self.received = received
+        self.created = created or time()
+
+    @property
+    def part_path(self):
+        """Path of file with received bytes."""
+        return spool_path(f"{self.upload_id}.part")
+
+    @property
+    def state_path(self):
+        """Path of file with upload state."""
+        return spool_path(f"{self.upload_id}.json")
+
+    @property
+    def complete(self):
+        """Are all bytes received."""
+        return self.received == self.size
+
+    @staticmethod
+    def start(author, json_upload):
+        """Create song and start its chunked upload.
+
+        :param author: user or principal of user who uploads song.
+        :param json_upload: song name, lyrics, size, sha256 and content_type in json format.
+        """
+        name = json_upload.get("name")
+        if not name or len(name) > 64:
+            raise ValidationError("Song name must have from 1 to 64 characters.")
+        size = json_upload.get("size")
+        if not isinstance(size, int) or size <= 0 or size > current_app.config["UPLOAD_MAX_SIZE"]:
+            raise ValidationError("Invalid upload size.")
+        sha256 = json_upload.get("sha256")
+        if sha256 is not None and not re.fullmatch(r"[0-9a-f]{64}", sha256):
+            raise ValidationError("Invalid sha256 checksum.")
+        content_type = json_upload.get("content_type") or "audio/mpeg"
+        if not content_type.startswith("audio/"):
+            raise ValidationError("Only audio files can be uploaded.")
+        song = Song(name=name, author_id=author.user_id, lyrics=json_upload.get("lyrics"))
+        db.session.add(song)
+        db.session.commit()
+        upload = ChunkedUpload(uuid4().hex, song.song_id, author.user_id, size,
+                               sha256, content_type)
+        open(upload.part_path, "wb").close()
+        upload.save()
+        return upload
+
+    @staticmethod
+    def get(upload_id):
+        """Load upload state.
+
+        :param upload_id: unique upload identifier.
+        :return upload or None if it doesn't exist.
+        """
+        if not re.fullmatch(r"[0-9a-f]{32}", upload_id):
+            return None
+        try:
+            with open(spool_path(f"{upload_id}.json")) as f:
+                return ChunkedUpload(**json.load(f))
+        except FileNotFoundError:
+            return None
+
+    def save(self):
+        """Store upload state."""
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.to_json(), f)
+        os.replace(tmp_path, self.state_path)
+
+    def write_chunk(self, stream, content_range, chunk_sha256=None):
+        """Append chunk from request stream.
+
+        :param stream: request body stream.
+        :param content_range: value of Content-Range header.
+        :param chunk_sha256: expected hex digest of chunk or None.
+        """
+        match = CONTENT_RANGE.match(content_range or "")
+        if match is None:
+            raise ValidationError("Content-Range header is required.")
+        start, end, total = (int(value) for value in match.groups())
+        if total != self.size or end < start or end >= total:
+            raise ValidationError("Invalid Content-Range header.")
+        with open(self.part_path, "r+b") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            current = ChunkedUpload.get(self.upload_id)
+            if current is None:
+                raise ValidationError("Upload is already finished.")
+            self.received = current.received
+            if start != self.received:
+                raise ValidationError(f"Upload must continue from byte {self.received}.")
+            f.seek(start)
+            digest = hashlib.sha256()
+            length = end - start + 1
+            written = copy_stream(stream, f, length, digest)
+            if written != length or (chunk_sha256 and digest.hexdigest() != chunk_sha256):
+                f.truncate(start)
+                raise ValidationError("Chunk is incomplete or corrupted.")
+            self.received = end + 1
+            self.save()
+        if self.complete:
+            self.finish()
+
+    def finish(self):
+        """Verify checksum of received file and hand it off to storage."""
+        song = Song.query.get(self.song_id)
+        if song is None:
+            self.discard()
+            raise ValidationError("Song of upload was deleted.")
+        if self.sha256 is not None and self.file_sha256() != self.sha256:
+            self.discard()
+            Song.finish_upload(self.song_id, None)
+            raise ValidationError("Checksum of uploaded file doesn't match.")
+        try:
+            start_song_upload(song, self.part_path, self.content_type)
+        except UploadQueueFull:
+            self.discard()
+            Song.finish_upload(self.song_id, None)
+            raise
+        os.remove(self.state_path)
+
+    def file_sha256(self):
+        """Calculate hex digest of received file."""
+        digest = hashlib.sha256()
+        chunk_size = current_app.config["UPLOAD_CHUNK_SIZE"]
+        with open(self.part_path, "rb") as f:
+            for chunk in iter(lambda: f.read(chunk_size), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def discard(self):
+        """Remove upload files."""
+        for path in (self.part_path, self.state_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    @staticmethod
+    def cleanup(max_age):
+        """Discard uploads not finished in time and mark their songs failed.
+
+        :param max_age: amount of seconds upload may last.
+        """
+        spool = current_app.config["UPLOAD_SPOOL_DIR"]
+        if not os.path.isdir(spool):
+            return
+        for file_name in os.listdir(spool):
+            if not file_name.endswith(".json"):
+                continue
+            upload = ChunkedUpload.get(file_name[:-len(".json")])
+            if upload is not None and time() - upload.created > max_age:
+                upload.discard()
+                Song.finish_upload(upload.song_id, None)
+
+    def status_json(self, url):
+        """Convert upload status to json for client.
+
+        :param url: url to send next chunk to.
+        :param song_id: identifier of song being uploaded.
+        :param size: full size of file in bytes.
+        :param received: amount of already received bytes.
+        :param complete: are all bytes received.
+        """
+        return {
+            "url": url,
+            "song_id": self.song_id,
+            "size": self.size,
+            "received": self.received,
+            "complete": self.complete
+        }
+
+    def to_json(self):
+        """Convert upload to json.
+
+        :param upload_id: unique upload identifier.
+        :param song_id: identifier of song being uploaded.
+        :param user_id: identifier of user who uploads song.
+        :param size: full size of file in bytes.
+        :param sha256: expected hex digest of full file.
+        :param content_type: type of file.
+        :param received: amount of already received bytes.
+        :param created: unix time upload was started.
+        """
+        return {
+            "upload_id": self.upload_id,
+            "song_id": self.song_id,
+            "user_id": self.user_id,
+            "size": self.size,
+            "sha256": self.sha256,
+            "content_type": self.content_type,
+            "received": self.received,
+            "created": self.created
+        }
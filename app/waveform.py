@@ -0,0 +1,265 @@
+import os
+import shutil
+import struct
+import subprocess
+import wave
+
+import numpy as np
+from flask import current_app
+
+from . import db
+from .audio import probe
+from .jobs import BackgroundJobs
+from .models import Song
+from .uploads import spool_song_file
+
+
+# Frames decoded and reduced at once.
+BLOCK_FRAMES = 256 * 1024
+
+WAVEFORM_MAGIC = b"WAVF"
+
+# Decoders by codec, see register_decoder.
+DECODERS = {}
+
+
+def register_decoder(codec, decoder):
+    """Register audio decoder used to build waveforms.
+
+    Decoder is called with path of audio file and returns sample rate
+    and iterator over float32 arrays of shape (frames, channels) with
+    samples in [-1, 1].
+
+    :param codec: audio codec name as detected by app.audio.probe.
+    :param decoder: decoder function.
+    """
+    DECODERS[codec] = decoder
+
+
+def decode_wav(path):
+    """Decode PCM WAV file natively.
+
+    :param path: path of audio file.
+    """
+    w = wave.open(path, "rb")
+    width = w.getsampwidth()
+    channels = w.getnchannels()
+    scale = float(1 << (8 * width - 1))
+
+    def blocks():
+        with w:
+            while True:
+                data = w.readframes(BLOCK_FRAMES)
+                if not data:
+                    break
+                if width == 1:
+                    samples = np.frombuffer(data, dtype=np.uint8).astype(np.float32) - 128
+                elif width == 3:
+                    raw = np.frombuffer(data, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+                    samples = (raw[:, 0] | (raw[:, 1] << 8) | (raw[:, 2] << 16)) << 8 >> 8
+                else:
+                    samples = np.frombuffer(data, dtype=f"<i{width}")
+                yield samples.reshape(-1, channels).astype(np.float32) / scale
+
+    return w.getframerate(), blocks()
+
+
+def decode_ffmpeg(path):
+    """Decode any audio file with local ffmpeg binary to mono float samples.
+
+    :param path: path of audio file.
+    """
+    info = probe(path)
+    process = subprocess.Popen(
+        ["ffmpeg", "-v", "error", "-i", path, "-f", "f32le", "-ac", "1", "-"],
+        stdout=subprocess.PIPE, stdin=subprocess.DEVNULL
+    )
+
+    def blocks():
+        try:
+            while True:
+                data = process.stdout.read(BLOCK_FRAMES * 4)
+                if not data:
+                    break
+                data = data[:len(data) // 4 * 4]
+                yield np.frombuffer(data, dtype="<f4").reshape(-1, 1)
+        finally:
+            process.stdout.close()
+            process.wait()
+
+    return info.sample_rate if info is not None else 0, blocks()
+
+
+def decoder_for(codec):
+    """Get decoder of codec or None if it can't be decoded here.
+
+    :param codec: audio codec name.
+    """
+    decoder = DECODERS.get(codec)
+    if decoder is None and codec is not None and shutil.which("ffmpeg"):
+        return decode_ffmpeg
+    return decoder
+
+
+register_decoder("pcm", decode_wav)
+
+
+def bucket_peaks(blocks, bucket):
+    """Reduce decoded blocks to min and max of every bucket of frames.
+
+    :param blocks: iterator over arrays of shape (frames, channels).
+    :param bucket: frames per bucket.
+    :return arrays of bucket minimums and maximums.
+    """
+    mins, maxs = [], []
+    carry_min = carry_max = np.empty(0, dtype=np.float32)
+    for block in blocks:
+        low = np.concatenate([carry_min, block.min(axis=1)])
+        high = np.concatenate([carry_max, block.max(axis=1)])
+        full = len(low) // bucket * bucket
+        mins.append(low[:full].reshape(-1, bucket).min(axis=1))
+        maxs.append(high[:full].reshape(-1, bucket).max(axis=1))
+        carry_min, carry_max = low[full:], high[full:]
+    if len(carry_min):
+        mins.append(carry_min.min(keepdims=True))
+        maxs.append(carry_max.max(keepdims=True))
+    if not mins:
+        return np.empty(0, dtype=np.float32), np.empty(0, dtype=np.float32)
+    return np.concatenate(mins), np.concatenate(maxs)
+
+
+def reduce_peaks(mins, maxs, factor):
+    """Merge every factor buckets into one for coarser zoom level.
+
+    :param mins: bucket minimums.
+    :param maxs: bucket maximums.
+    :param factor: buckets merged together.
+    """
+    pad = -len(mins) % factor
+    mins = np.pad(mins, (0, pad), mode="edge")
+    maxs = np.pad(maxs, (0, pad), mode="edge")
+    return mins.reshape(-1, factor).min(axis=1), maxs.reshape(-1, factor).max(axis=1)
+
+
+def pack_waveform(sample_rate, levels, bits=8):
+    """Pack peak levels into compact binary waveform.
+
+    Layout, little endian: "WAVF" magic, uint8 version, uint8 bits per
+    value, uint16 number of levels, uint32 sample rate, then uint32
+    frames per bucket and uint32 number of buckets of every level,
+    then interleaved min, max int8 or int16 values of every level.
+
+    :param sample_rate: samples per second of audio.
+    :param levels: list of (frames per bucket, mins, maxs) finest first.
+    :param bits: 8 or 16 bits per value.
+    """
+    dtype = np.dtype("<i1") if bits == 8 else np.dtype("<i2")
+    scale = np.iinfo(dtype).max
+    header = [WAVEFORM_MAGIC, struct.pack("<BBHI", 1, bits, len(levels), sample_rate)]
+    body = []
+    for bucket, mins, maxs in levels:
+        header.append(struct.pack("<II", bucket, len(mins)))
+        values = np.empty(len(mins) * 2, dtype=np.float32)
+        values[0::2] = mins
+        values[1::2] = maxs
+        body.append(np.clip(np.rint(values * scale), -scale, scale).astype(dtype).tobytes())
+    return b"".join(header + body)
+
+
+def unpack_waveform(data):
+    """Unpack binary waveform made by pack_waveform.
+
+    :param data: binary waveform.
+    :return sample rate and list of (frames per bucket, values) finest first.
+    """
+    if data[:4] != WAVEFORM_MAGIC:
+        raise ValueError("Not a waveform.")
+    _, bits, count, sample_rate = struct.unpack_from("<BBHI", data, 4)
+    dtype = np.dtype("<i1") if bits == 8 else np.dtype("<i2")
+    sizes = [struct.unpack_from("<II", data, 12 + 8 * i) for i in range(count)]
+    offset = 12 + 8 * count
+    levels = []
+    for bucket, buckets in sizes:
+        values = np.frombuffer(data, dtype=dtype, count=buckets * 2, offset=offset)
+        levels.append((bucket, values))
+        offset += values.nbytes
+    return sample_rate, levels
+
+
+def build_waveform(path, codec):
+    """Decode audio file once and build waveform at every zoom level.
+
+    :param path: path of audio file.
+    :param codec: audio codec name.
+    :return binary waveform or None if codec can't be decoded.
+    """
+    decoder = decoder_for(codec)
+    if decoder is None:
+        return None
+    config = current_app.config
+    bucket = config["WAVEFORM_BUCKET"]
+    factor = config["WAVEFORM_ZOOM_FACTOR"]
+    sample_rate, blocks = decoder(path)
+    mins, maxs = bucket_peaks(blocks, bucket)
+    levels = [(bucket, mins, maxs)]
+    for _ in range(config["WAVEFORM_LEVELS"] - 1):
+        if len(mins) <= 1:
+            break
+        bucket *= factor
+        mins, maxs = reduce_peaks(mins, maxs, factor)
+        levels.append((bucket, mins, maxs))
+    return pack_waveform(sample_rate, levels, config["WAVEFORM_BITS"])
+
+
+def waveform_name(song_id):
+    """Get name of song waveform in storage.
+
+    :param song_id: song identifier.
+    """
+    return f"{song_id}.waveform"
+
+
+def store_song_waveform(song_id):
+    """Build waveform of uploaded song and put it to storage.
+
+    :param song_id: song identifier.
+    :return is waveform stored.
+    """
+    song = Song.query.get(song_id)
+    if song is None or song.url is None or decoder_for(song.codec) is None:
+        return False
+    audio_path = spool_song_file(song_id)
+    waveform_path = audio_path + ".waveform"
+    try:
+        waveform = build_waveform(audio_path, song.codec)
+        if waveform is None:
+            return False
+        with open(waveform_path, "wb") as f:
+            f.write(waveform)
+        current_app.storage.upload(waveform_path, waveform_name(song_id), "application/octet-stream")
+    finally:
+        for path in (audio_path, waveform_path):
+            if os.path.exists(path):
+                os.remove(path)
+    db.session.execute(db.update(Song).where(Song.song_id == song_id).values(has_waveform=True))
+    db.session.commit()
+    return True
+
+
+class WaveformBuilder(BackgroundJobs):
+    """Pool of threads building waveforms of uploaded songs.
+
+    :param app: flask application instance.
+    """
+
+    failure = "Waveform of song {} failed."
+
+    def __init__(self, app):
+        super().__init__(app, app.config.get("WAVEFORM_WORKERS", 2))
+
+    def run(self, song_id):
+        """Build waveform of song.
+
+        :param song_id: song identifier.
+        """
+        store_song_waveform(song_id)
@@ -1,8 +1,5 @@
 import os
 
-import firebase_admin
-from firebase_admin import credentials
-
 
 def generate_basedir():
     """Generate base directory path."""
@@ -12,13 +9,9 @@ def generate_basedir():
 class Config:
     """Config class."""
     
-    # Setting cridentials for firebase storage.
-    cred = credentials.Certificate(os.environ.get("FIREBASE_KEY"))
-     
     ELASTICSEARCH = os.environ.get("ELASTICSEARCH_URL")
-    FIREBASE = firebase_admin.initialize_app(cred, {
-        "storageBucket": os.environ.get("FIREBASE_BUCKET")
-    })
+    FIREBASE_KEY = os.environ.get("FIREBASE_KEY")
+    FIREBASE_BUCKET = os.environ.get("FIREBASE_BUCKET")
     MAIL_ADMIN = os.environ.get("MAIL_ADMIN")
     MAIL_SENDER = "Development Team"
     MAIL_USERNAME = os.environ.get("MAIL_USERNAME")
@@ -27,14 +20,55 @@ class Config:
     MAIL_PORT = os.environ.get("MAIL_PORT") or 587
     MAIL_USE_TLS = True
     SECRET_KEY = os.environ.get("SECTER_KEY") or "password"
+    API_CREDENTIAL_CACHE_SIZE = 1024
+    API_CREDENTIAL_CACHE_TTL = 60
+    API_REFRESH_TOKEN_EXPIRATION = int(os.environ.get("API_REFRESH_TOKEN_EXPIRATION") or 30 * 24 * 3600)
+    API_TOKEN_CACHE_SIZE = 4096
+    API_TOKEN_CACHE_TTL = 60
+    API_TOKEN_EXPIRATION = int(os.environ.get("API_TOKEN_EXPIRATION") or 3600)
     COMMENTS_PER_PAGE = 5
     COMMENTS_PER_MODERATE_PAGE = 10
     COMMENTS_PER_REQUEST = 10
     FOLLOW_PER_PAGE = 10
+    HLS_ENABLED = bool(os.environ.get("HLS_ENABLED"))
+    HLS_SEGMENT_DURATION = int(os.environ.get("HLS_SEGMENT_DURATION") or 10)
+    LAST_SEEN_FLUSH_INTERVAL = int(os.environ.get("LAST_SEEN_FLUSH_INTERVAL") or 60)
+    LAST_SEEN_THRESHOLD = int(os.environ.get("LAST_SEEN_THRESHOLD") or 60)
+    ROLE_PERMISSIONS_TTL = 60
     SONGS_PER_PAGE = 9
     SONGS_PER_USER_PAGE = 3
+    TIMELINE_DEPTH = int(os.environ.get("TIMELINE_DEPTH") or 500)
+    TIMELINE_FANOUT_LIMIT = int(os.environ.get("TIMELINE_FANOUT_LIMIT") or 1000)
     SEARCH_PER_PAGE = 6
+    SEARCH_BULK_SIZE = 500
+    SEARCH_CACHE_SIZE = 1024
+    SEARCH_CACHE_TTL = int(os.environ.get("SEARCH_CACHE_TTL") or 60)
+    SEARCH_FLUSH_INTERVAL = 1.0
+    SEARCH_RETRY_BACKOFF = 1.0
+    SUGGEST_LIMIT = 5
+    SUGGEST_REFRESH_INTERVAL = 300
+    STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND") or "firebase"
+    STORAGE_PATH = os.environ.get("STORAGE_PATH") or os.path.join(generate_basedir(), "media")
+    STORAGE_URL = "/media"
     USERS_PER_REQUEST = 10
+    UPLOAD_CHUNK_SIZE = 64 * 1024
+    UPLOAD_CLIENT_CHUNK_SIZE = 4 * 1024 * 1024
+    UPLOAD_MAX_SIZE = 512 * 1024 * 1024
+    UPLOAD_SPOOL_DIR = os.environ.get("UPLOAD_SPOOL_DIR") or os.path.join(generate_basedir(), "spool")
+    UPLOAD_WORKERS = int(os.environ.get("UPLOAD_WORKERS") or 4)
+    UPLOAD_QUEUE_SIZE = int(os.environ.get("UPLOAD_QUEUE_SIZE") or 32)
+    UPLOAD_QUEUE_TIMEOUT = 5
+    UPLOAD_RETRIES = 3
+    UPLOAD_RETRY_BACKOFF = 1.0
+    TRANSCODE_DEFAULT_QUALITY = "high"
+    TRANSCODE_ENCODER = os.environ.get("TRANSCODE_ENCODER") or "ffmpeg"
+    TRANSCODE_RENDITIONS = {"low": 64, "medium": 128, "high": 256}
+    TRANSCODE_WORKERS = int(os.environ.get("TRANSCODE_WORKERS") or 2)
+    WAVEFORM_BITS = 8
+    WAVEFORM_BUCKET = 256
+    WAVEFORM_LEVELS = 4
+    WAVEFORM_WORKERS = int(os.environ.get("WAVEFORM_WORKERS") or 2)
+    WAVEFORM_ZOOM_FACTOR = 4
     LANGUAGES = {
         "en": "EN",
         "ru": "РУС",
@@ -60,6 +94,9 @@ class TestingConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = os.environ.get("TEST_DATABASE_URL") or \
         "sqlite:///" + os.path.join(generate_basedir(), "test-database.sqlite")
+    STORAGE_BACKEND = "local"
+    STORAGE_PATH = os.path.join(generate_basedir(), "test-media")
+    UPLOAD_SPOOL_DIR = os.path.join(generate_basedir(), "test-spool")
 
 
 class ProductionConfig(Config):
@@ -0,0 +1,38 @@
+"""updated at columns
+
+Revision ID: 0a6e9d2b5c17
+Revises: f4b8c1d9a3e5
+Create Date: 2026-10-17 17:21:08.114562
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0a6e9d2b5c17'
+down_revision = 'f4b8c1d9a3e5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('songs', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+    with op.batch_alter_table('comments', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+    op.execute("UPDATE songs SET updated_at = timestamp")
+    op.execute("UPDATE users SET updated_at = member_since")
+    op.execute("UPDATE comments SET updated_at = timestamp")
+
+
+def downgrade():
+    with op.batch_alter_table('comments', schema=None) as batch_op:
+        batch_op.drop_column('updated_at')
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_column('updated_at')
+    # Recreating songs table on SQLite would drop search index triggers.
+    with op.batch_alter_table('songs', schema=None, recreate='never') as batch_op:
+        batch_op.drop_column('updated_at')
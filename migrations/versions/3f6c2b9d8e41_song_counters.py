@@ -0,0 +1,33 @@
+"""song like and comment counters
+
+Revision ID: 3f6c2b9d8e41
+Revises: a07bbdf97e0c
+Create Date: 2026-10-17 10:12:40.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f6c2b9d8e41'
+down_revision = 'a07bbdf97e0c'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('songs', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('like_count', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('comment_count', sa.Integer(), server_default='0', nullable=False))
+    op.execute(
+        "UPDATE songs SET "
+        "like_count = (SELECT count(*) FROM songlikes WHERE songlikes.song_id = songs.song_id), "
+        "comment_count = (SELECT count(*) FROM comments WHERE comments.song_id = songs.song_id)"
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('songs', schema=None) as batch_op:
+        batch_op.drop_column('comment_count')
+        batch_op.drop_column('like_count')
@@ -0,0 +1,60 @@
+"""timelines
+
+Revision ID: 6d3e8f2a9b14
+Revises: 0a6e9d2b5c17
+Create Date: 2026-10-17 19:02:41.508337
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6d3e8f2a9b14'
+down_revision = '0a6e9d2b5c17'
+branch_labels = None
+depends_on = None
+
+# Defaults of TIMELINE_DEPTH and TIMELINE_FANOUT_LIMIT settings.
+TIMELINE_DEPTH = 500
+TIMELINE_FANOUT_LIMIT = 1000
+
+
+def upgrade():
+    op.create_table('timelines',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('song_id', sa.Integer(), nullable=False),
+    sa.Column('author_id', sa.Integer(), nullable=True),
+    sa.Column('timestamp', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['author_id'], ['users.user_id'], ),
+    sa.ForeignKeyConstraint(['song_id'], ['songs.song_id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.user_id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'song_id')
+    )
+    op.create_index('ix_timelines_user_id_timestamp', 'timelines', ['user_id', 'timestamp'], unique=False)
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('fanout_on_read', sa.Boolean(), server_default=sa.false(), nullable=False))
+    op.execute(sa.text(
+        "UPDATE users SET fanout_on_read = :on_read WHERE user_id IN ("
+        "SELECT followed_id FROM follows GROUP BY followed_id HAVING COUNT(*) > :limit)"
+    ).bindparams(on_read=True, limit=TIMELINE_FANOUT_LIMIT))
+    op.execute(sa.text(
+        "INSERT INTO timelines (user_id, song_id, author_id, timestamp) "
+        "SELECT follows.follower_id, songs.song_id, songs.author_id, songs.timestamp "
+        "FROM follows JOIN songs ON songs.author_id = follows.followed_id "
+        "JOIN users ON users.user_id = follows.followed_id "
+        "WHERE users.fanout_on_read = :on_read"
+    ).bindparams(on_read=False))
+    op.execute(sa.text(
+        "DELETE FROM timelines WHERE timestamp < ("
+        "SELECT newer.timestamp FROM timelines AS newer "
+        "WHERE newer.user_id = timelines.user_id "
+        "ORDER BY newer.timestamp DESC LIMIT 1 OFFSET :offset)"
+    ).bindparams(offset=TIMELINE_DEPTH - 1))
+
+
+def downgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_column('fanout_on_read')
+    op.drop_index('ix_timelines_user_id_timestamp', table_name='timelines')
+    op.drop_table('timelines')
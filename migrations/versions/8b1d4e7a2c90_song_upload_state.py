@@ -0,0 +1,27 @@
+"""song upload state
+
+Revision ID: 8b1d4e7a2c90
+Revises: 3f6c2b9d8e41
+Create Date: 2026-10-17 11:02:05.441870
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b1d4e7a2c90'
+down_revision = '3f6c2b9d8e41'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('songs', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('upload_state', sa.String(length=16), server_default='pending', nullable=False))
+    op.execute("UPDATE songs SET upload_state = 'ready' WHERE url IS NOT NULL")
+
+
+def downgrade():
+    with op.batch_alter_table('songs', schema=None) as batch_op:
+        batch_op.drop_column('upload_state')
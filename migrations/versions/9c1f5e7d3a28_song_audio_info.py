@@ -0,0 +1,37 @@
+"""song audio info
+
+Revision ID: 9c1f5e7d3a28
+Revises: 6d3e8f2a9b14
+Create Date: 2026-10-17 20:14:52.730115
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9c1f5e7d3a28'
+down_revision = '6d3e8f2a9b14'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('songs', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('codec', sa.String(length=16), nullable=True))
+        batch_op.add_column(sa.Column('duration', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('bitrate', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('sample_rate', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('channels', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('size', sa.BigInteger(), nullable=True))
+
+
+def downgrade():
+    # Recreating songs table on SQLite would drop search index triggers.
+    with op.batch_alter_table('songs', schema=None, recreate='never') as batch_op:
+        batch_op.drop_column('size')
+        batch_op.drop_column('channels')
+        batch_op.drop_column('sample_rate')
+        batch_op.drop_column('bitrate')
+        batch_op.drop_column('duration')
+        batch_op.drop_column('codec')
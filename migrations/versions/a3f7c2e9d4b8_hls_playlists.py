@@ -0,0 +1,34 @@
+"""hls playlists
+
+Revision ID: a3f7c2e9d4b8
+Revises: d4a8b6e3f152
+Create Date: 2026-10-17 23:41:08.512377
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3f7c2e9d4b8'
+down_revision = 'd4a8b6e3f152'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Recreating songs table on SQLite would drop search index triggers.
+    with op.batch_alter_table('songs', schema=None, recreate='never') as batch_op:
+        batch_op.add_column(sa.Column('has_playlist', sa.Boolean(), server_default=sa.false(), nullable=False))
+
+    with op.batch_alter_table('renditions', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('has_playlist', sa.Boolean(), server_default=sa.false(), nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('renditions', schema=None) as batch_op:
+        batch_op.drop_column('has_playlist')
+
+    # Recreating songs table on SQLite would drop search index triggers.
+    with op.batch_alter_table('songs', schema=None, recreate='never') as batch_op:
+        batch_op.drop_column('has_playlist')
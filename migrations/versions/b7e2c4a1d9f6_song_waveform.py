@@ -0,0 +1,28 @@
+"""song waveform
+
+Revision ID: b7e2c4a1d9f6
+Revises: 9c1f5e7d3a28
+Create Date: 2026-10-17 21:07:19.264803
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e2c4a1d9f6'
+down_revision = '9c1f5e7d3a28'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Recreating songs table on SQLite would drop search index triggers.
+    with op.batch_alter_table('songs', schema=None, recreate='never') as batch_op:
+        batch_op.add_column(sa.Column('has_waveform', sa.Boolean(), server_default=sa.false(), nullable=False))
+
+
+def downgrade():
+    # Recreating songs table on SQLite would drop search index triggers.
+    with op.batch_alter_table('songs', schema=None, recreate='never') as batch_op:
+        batch_op.drop_column('has_waveform')
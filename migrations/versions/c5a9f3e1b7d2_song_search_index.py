@@ -0,0 +1,46 @@
+"""song search index
+
+Revision ID: c5a9f3e1b7d2
+Revises: 8b1d4e7a2c90
+Create Date: 2026-10-17 13:40:12.318904
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5a9f3e1b7d2'
+down_revision = '8b1d4e7a2c90'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        op.execute("CREATE VIRTUAL TABLE songs_fts USING fts5(name, lyrics, content='songs', content_rowid='song_id')")
+        op.execute("CREATE TRIGGER songs_fts_insert AFTER INSERT ON songs BEGIN "
+                   "INSERT INTO songs_fts(rowid, name, lyrics) VALUES (new.song_id, new.name, new.lyrics); END")
+        op.execute("CREATE TRIGGER songs_fts_delete AFTER DELETE ON songs BEGIN "
+                   "INSERT INTO songs_fts(songs_fts, rowid, name, lyrics) VALUES ('delete', old.song_id, old.name, old.lyrics); END")
+        op.execute("CREATE TRIGGER songs_fts_update AFTER UPDATE OF name, lyrics ON songs BEGIN "
+                   "INSERT INTO songs_fts(songs_fts, rowid, name, lyrics) VALUES ('delete', old.song_id, old.name, old.lyrics); "
+                   "INSERT INTO songs_fts(rowid, name, lyrics) VALUES (new.song_id, new.name, new.lyrics); END")
+        op.execute("INSERT INTO songs_fts(songs_fts) VALUES ('rebuild')")
+    elif dialect == 'postgresql':
+        op.execute("ALTER TABLE songs ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ("
+                   "setweight(to_tsvector('simple', coalesce(name, '')), 'A') || "
+                   "setweight(to_tsvector('simple', coalesce(lyrics, '')), 'B')) STORED")
+        op.execute("CREATE INDEX ix_songs_search_vector ON songs USING gin (search_vector)")
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        for trigger in ('insert', 'delete', 'update'):
+            op.execute(f"DROP TRIGGER IF EXISTS songs_fts_{trigger}")
+        op.execute("DROP TABLE IF EXISTS songs_fts")
+    elif dialect == 'postgresql':
+        op.execute("DROP INDEX IF EXISTS ix_songs_search_vector")
+        op.execute("ALTER TABLE songs DROP COLUMN IF EXISTS search_vector")
@@ -0,0 +1,35 @@
+"""renditions
+
+Revision ID: d4a8b6e3f152
+Revises: b7e2c4a1d9f6
+Create Date: 2026-10-17 22:03:35.918246
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4a8b6e3f152'
+down_revision = 'b7e2c4a1d9f6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('renditions',
+    sa.Column('rendition_id', sa.Integer(), nullable=False),
+    sa.Column('song_id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=16), nullable=False),
+    sa.Column('bitrate', sa.Integer(), nullable=False),
+    sa.Column('codec', sa.String(length=16), nullable=False),
+    sa.Column('url', sa.String(length=256), nullable=False),
+    sa.Column('size', sa.BigInteger(), nullable=True),
+    sa.ForeignKeyConstraint(['song_id'], ['songs.song_id'], ),
+    sa.PrimaryKeyConstraint('rendition_id'),
+    sa.UniqueConstraint('song_id', 'name', name='uq_renditions_song_id_name')
+    )
+
+
+def downgrade():
+    op.drop_table('renditions')
@@ -0,0 +1,40 @@
+"""hot query indexes
+
+Revision ID: e2d7a4c6f1b3
+Revises: c5a9f3e1b7d2
+Create Date: 2026-10-17 15:12:47.905133
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2d7a4c6f1b3'
+down_revision = 'c5a9f3e1b7d2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("DELETE FROM songlikes WHERE like_id NOT IN "
+               "(SELECT min(like_id) FROM songlikes GROUP BY song_id, user_id)")
+    op.execute("UPDATE songs SET like_count = "
+               "(SELECT count(*) FROM songlikes WHERE songlikes.song_id = songs.song_id)")
+    with op.batch_alter_table('songlikes', schema=None) as batch_op:
+        batch_op.create_unique_constraint('uq_songlikes_song_id_user_id', ['song_id', 'user_id'])
+    op.create_index('ix_songs_author_id_timestamp', 'songs', ['author_id', 'timestamp'], unique=False)
+    op.create_index('ix_songs_timestamp', 'songs', ['timestamp'], unique=False)
+    op.create_index('ix_comments_song_id_timestamp', 'comments', ['song_id', 'timestamp'], unique=False)
+    op.create_index('ix_comments_timestamp', 'comments', ['timestamp'], unique=False)
+    op.create_index('ix_follows_followed_id', 'follows', ['followed_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_follows_followed_id', table_name='follows')
+    op.drop_index('ix_comments_timestamp', table_name='comments')
+    op.drop_index('ix_comments_song_id_timestamp', table_name='comments')
+    op.drop_index('ix_songs_timestamp', table_name='songs')
+    op.drop_index('ix_songs_author_id_timestamp', table_name='songs')
+    with op.batch_alter_table('songlikes', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_songlikes_song_id_user_id', type_='unique')
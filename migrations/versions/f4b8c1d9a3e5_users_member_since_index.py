@@ -0,0 +1,24 @@
+"""users member since index
+
+Revision ID: f4b8c1d9a3e5
+Revises: e2d7a4c6f1b3
+Create Date: 2026-10-17 16:05:31.772410
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f4b8c1d9a3e5'
+down_revision = 'e2d7a4c6f1b3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_users_member_since', 'users', ['member_since'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_users_member_since', table_name='users')
@@ -5,8 +5,12 @@ from flask import g
 from flask_migrate import Migrate
 
 from app import create_app, db
-from app.models import User, Role, Comment, Follow, Song, SongLike
+from app.models import User, Role, Comment, Follow, Song, SongLike, UploadState
 from app.search import create_index
+from app.song_files import delete_song_files
+from app.storage import get_public_url
+from app.uploads import ChunkedUpload
+from app.waveform import store_song_waveform
 
 
 app = create_app(os.environ.get("FLASK_CONFIG") or "default")
@@ -49,6 +53,40 @@ def insert_roles():
     Role.insert_roles()
 
 
+@app.cli.command()
+def recount_songs():
+    """Recalculate like and comment counters of all songs."""
+    Song.recount()
+
+
+@app.cli.command()
+def resolve_song_urls():
+    """Resolve public urls of songs uploaded before upload states were tracked."""
+    songs = Song.query.filter_by(upload_state=UploadState.PENDING, url=None).all()
+    for song in songs:
+        try:
+            url = get_public_url(str(song.song_id))
+        except Exception:
+            url = None
+        Song.finish_upload(song.song_id, url)
+
+
+@app.cli.command()
+@click.option("--max-age", default=24, help="Hours unfinished upload may last.")
+def clean_uploads(max_age):
+    """Discard unfinished chunked uploads and mark their songs failed."""
+    ChunkedUpload.cleanup(max_age * 3600)
+
+
+@app.cli.command()
+def build_waveforms():
+    """Build waveforms of uploaded songs which don't have them yet."""
+    songs = Song.query.filter_by(upload_state=UploadState.READY, has_waveform=False) \
+        .with_entities(Song.song_id).all()
+    built = sum(store_song_waveform(song_id) for song_id, in songs)
+    click.echo(f"Built {built} of {len(songs)} waveforms.")
+
+
 @app.cli.group()
 def translate():
     """Group of translation cmd commands."""
@@ -88,15 +126,29 @@ def init(lang):
 
 @app.cli.command()
 @click.argument("class_names", nargs=-1)
-def reindex(class_names):
+@click.option("--batch-size", default=1000, help="Documents per bulk request.")
+@click.option("--workers", default=4, help="Parallel bulk requests.")
+@click.option("--swap", is_flag=True, help="Reindex into new index and swap alias.")
+def reindex(class_names, batch_size, workers, swap):
+    """Reindex models in elasticsearch.
+    
+    :param class_names: classes to reindex.
+    """
     _classes = {
         "Song": Song,
         "User": User,
         "Comment": Comment
     }
+    
+    def progress(done, elapsed):
+        click.echo(f"\r{done} documents, {done / max(elapsed, 0.001):.0f} docs/s", nl=False)
+    
     for class_name in class_names:
-        if class_name in _classes:
-            _classes[class_name].reindex()
+        if class_name in _classes and hasattr(_classes[class_name], "reindex"):
+            click.echo(f"Reindexing {class_name}")
+            _classes[class_name].reindex(batch_size=batch_size, workers=workers,
+                                         swap=swap, progress=progress)
+            click.echo()
   
   
 @app.cli.command()
@@ -112,6 +164,15 @@ def create_indx(class_name):
         "Comment": Comment
     }
     create_index(_classes[class_name].__tablename__)
+
+
+@app.cli.command()
+def index_suggestions():
+    """Create suggestions index and send all song names and usernames to it."""
+    if app.elasticsearch is None:
+        click.echo("Elasticsearch is not configured.")
+        return
+    app.suggestions.reindex()
     
     
 @app.cli.command()
@@ -119,11 +180,13 @@ def create_indx(class_name):
 def delete_song(song_name):
     if song_name == "all":
         for song in Song.query.all():
+            delete_song_files(song)
             db.session.delete(song)
         db.session.commit()
     else:
         song = Song.query.filter_by(name=song_name).first()
         if song is not None:
+            delete_song_files(song)
             db.session.delete(song)
             db.session.commit()
             
\ No newline at end of file
@@ -0,0 +1,66 @@
+import gc
+import unittest
+import weakref
+from datetime import datetime, timedelta
+
+from app import create_app, db, last_seen
+from app.activity import MemoryActivityStore
+from app.models import Role, User
+
+
+class LastSeenTrackerTestCase(unittest.TestCase):
+    """Case to test last seen tracker."""
+    
+    def setUp(self):
+        """Test case set up."""
+        self.app = create_app("testing")
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        last_seen.store.drain()
+        self.user = User(username="john", email="john@example.com", password="cat")
+        self.user.last_seen = datetime.utcnow() - timedelta(days=1)
+        db.session.add(self.user)
+        db.session.commit()
+    
+    def tearDown(self):
+        """Test case tear down."""
+        last_seen.store.drain()
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+    
+    def test_touch_is_written_on_flush(self):
+        """Test activity reaches database only after flush."""
+        old = self.user.last_seen
+        last_seen.touch(self.user)
+        db.session.expire_all()
+        self.assertEqual(self.user.last_seen, old)
+        last_seen.flush()
+        db.session.expire_all()
+        self.assertGreater(self.user.last_seen, old)
+    
+    def test_recently_seen_user_is_not_recorded(self):
+        """Test user seen within threshold is skipped."""
+        self.user.last_seen = datetime.utcnow()
+        last_seen.touch(self.user)
+        self.assertEqual(last_seen.store.drain(), {})
+    
+    def test_store_keeps_latest_time(self):
+        """Test store coalesces activity of the same user."""
+        store = MemoryActivityStore()
+        now = datetime.utcnow()
+        store.record(1, now)
+        store.record(1, now - timedelta(minutes=1))
+        store.record(2, now)
+        self.assertEqual(store.drain(), {1: now, 2: now})
+        self.assertEqual(store.drain(), {})
+    
+    def test_dropped_app_is_released(self):
+        """Test exit handlers don't keep dropped application alive."""
+        ref = weakref.ref(create_app("testing"))
+        # Babel extension keeps the last initialized application.
+        create_app("testing")
+        gc.collect()
+        self.assertIsNone(ref())
@@ -0,0 +1,101 @@
+import unittest
+from base64 import b64encode
+from unittest import mock
+
+from app import create_app, db
+from app.models import Permission, Role, User
+
+
+class TokenAuthTestCase(unittest.TestCase):
+    """Case to test API token authentication cache."""
+    
+    def setUp(self):
+        """Test case set up."""
+        self.app = create_app("testing")
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        self.user = User(username="john", email="john@example.com", password="cat", confirmed=True)
+        db.session.add(self.user)
+        db.session.commit()
+        self.client = self.app.test_client()
+        self.token = self.user.generate_auth_token()
+        self.url = "/api/v1/uploads/" + "0" * 32
+        self.statements = []
+        db.event.listen(db.engine, "before_cursor_execute", self.count_statement)
+    
+    def tearDown(self):
+        """Test case tear down."""
+        db.event.remove(db.engine, "before_cursor_execute", self.count_statement)
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+    
+    def count_statement(self, conn, cursor, statement, parameters, context, executemany):
+        """Remember executed statement."""
+        self.statements.append(statement)
+    
+    def get(self):
+        """Request url authorized with token."""
+        auth = b64encode(f"{self.token}:".encode("utf-8")).decode("utf-8")
+        return self.client.get(self.url, headers={"Authorization": "Basic " + auth})
+    
+    def test_cached_token_makes_no_queries(self):
+        """Test repeated token requests are authorized without database."""
+        self.assertEqual(self.get().status_code, 404)
+        self.statements.clear()
+        self.assertEqual(self.get().status_code, 404)
+        self.assertEqual(self.statements, [])
+    
+    def test_role_change_invalidates_principal(self):
+        """Test changed permissions take effect on next request."""
+        self.assertEqual(self.get().status_code, 404)
+        role = Role.query.filter_by(name="User").first()
+        role.permissions = Permission.FOLLOW | Permission.COMMENT
+        db.session.commit()
+        self.assertEqual(self.get().status_code, 403)
+        self.user.confirmed = False
+        db.session.commit()
+        self.assertEqual(self.get().status_code, 401)
+    
+    def test_invalid_token(self):
+        """Test invalid token is rejected."""
+        self.token = "invalid"
+        self.assertEqual(self.get().status_code, 401)
+    
+    def test_password_verified_once(self):
+        """Test repeated password requests hash password only once."""
+        auth = "Basic " + b64encode(b"john:cat").decode("utf-8")
+        with mock.patch.object(User, "verify_password", autospec=True,
+                               side_effect=User.verify_password) as verify:
+            for _ in range(3):
+                self.assertEqual(self.client.get(self.url, headers={"Authorization": auth}).status_code, 404)
+            wrong = "Basic " + b64encode(b"john:dog").decode("utf-8")
+            self.assertEqual(self.client.get(self.url, headers={"Authorization": wrong}).status_code, 401)
+        self.assertEqual(verify.call_count, 2)
+    
+    def test_refresh_token(self):
+        """Test refresh token issues new tokens until password changes."""
+        auth = "Basic " + b64encode(b"john:cat").decode("utf-8")
+        tokens = self.client.post("/api/v1/tokens/", headers={"Authorization": auth}).get_json()
+        self.assertEqual(tokens["expiration"], self.app.config["API_TOKEN_EXPIRATION"])
+        self.token = tokens["refresh_token"]
+        self.assertEqual(self.get().status_code, 401)
+        resp = self.client.post("/api/v1/tokens/refresh", json={"refresh_token": tokens["refresh_token"]})
+        self.assertEqual(resp.status_code, 200)
+        self.token = resp.get_json()["token"]
+        self.assertEqual(self.get().status_code, 404)
+        self.user.password = "dog"
+        db.session.commit()
+        resp = self.client.post("/api/v1/tokens/refresh", json={"refresh_token": tokens["refresh_token"]})
+        self.assertEqual(resp.status_code, 401)
+    
+    def test_anonymous_update_is_forbidden(self):
+        """Test anonymous user can't update accounts."""
+        headers = {"Authorization": "Basic " + b64encode(b":").decode("utf-8")}
+        resp = self.client.put("/api/v1/users/john", json={"about_me": "hacked"}, headers=headers)
+        self.assertEqual(resp.status_code, 403)
+        resp = self.client.put("/api/v1/users/nobody", json={}, headers=headers)
+        self.assertEqual(resp.status_code, 404)
+
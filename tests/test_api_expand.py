@@ -0,0 +1,84 @@
+import unittest
+
+from app import create_app, db
+from app.models import Comment, Role, Song, User
+
+
+class ApiExpandTestCase(unittest.TestCase):
+    """Case to test expanded representations in api collections."""
+    
+    def setUp(self):
+        """Test case set up."""
+        self.app = create_app("testing")
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        self.client = self.app.test_client()
+        for i in range(9):
+            u = User(username=f"user{i}", email=f"user{i}@example.com", password="cat")
+            s = Song(name=f"song{i}", author=u)
+            db.session.add_all([u, s, Comment(body=f"comment{i}", author=u, song=s)])
+        db.session.commit()
+        db.session.expunge_all()
+        self.statements = []
+    
+    def tearDown(self):
+        """Test case tear down."""
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+    
+    def count_statement(self, conn, cursor, statement, parameters, context, executemany):
+        """Remember every statement sent to database."""
+        self.statements.append(statement)
+    
+    def get(self, url):
+        """Get json counting database statements."""
+        db.event.listen(db.engine, "before_cursor_execute", self.count_statement)
+        try:
+            resp = self.client.get(url)
+        finally:
+            db.event.remove(db.engine, "before_cursor_execute", self.count_statement)
+        self.assertEqual(resp.status_code, 200)
+        return resp.json
+    
+    def test_songs_are_urls_by_default(self):
+        """Test collection without expand keeps returning urls."""
+        songs = self.get("/api/v1/songs/")["songs"]
+        self.assertTrue(all(isinstance(song, str) for song in songs))
+    
+    def test_expanded_songs_with_authors(self):
+        """Test page of songs with authors is loaded with constant number of queries."""
+        songs = self.get("/api/v1/songs/?expand=songs,author&after=")["songs"]
+        self.assertEqual(len(songs), 9)
+        self.assertEqual(songs[0]["name"], "song8")
+        self.assertEqual(songs[0]["published_by"]["username"], "user8")
+        self.assertEqual(songs[0]["published_by"]["songs_count"], 1)
+        self.assertLessEqual(len(self.statements), 3)
+    
+    def test_expanded_songs(self):
+        """Test page of songs links authors with constant number of queries."""
+        songs = self.get("/api/v1/songs/?expand=songs&after=")["songs"]
+        self.assertEqual(len(songs), 9)
+        self.assertTrue(songs[0]["published_by"].endswith("/users/user8"))
+        self.assertLessEqual(len(self.statements), 3)
+    
+    def test_sparse_fields(self):
+        """Test only requested fields are returned."""
+        songs = self.get("/api/v1/songs/?expand=songs&fields=url,name")["songs"]
+        self.assertEqual(set(songs[0]), {"url", "name"})
+    
+    def test_expanded_comments(self):
+        """Test comments embed authors and songs with constant number of queries."""
+        comments = self.get("/api/v1/comments/?expand=comments,author,song&after=")["comments"]
+        self.assertEqual(len(comments), 9)
+        self.assertEqual(comments[0]["author"]["username"], comments[0]["song"]["name"].replace("song", "user"))
+        self.assertLessEqual(len(self.statements), 3)
+    
+    def test_expanded_comments_links(self):
+        """Test comments link authors and songs with constant number of queries."""
+        comments = self.get("/api/v1/comments/?expand=comments&after=")["comments"]
+        self.assertEqual(len(comments), 9)
+        self.assertTrue(comments[0]["author"].endswith("/users/user8"))
+        self.assertLessEqual(len(self.statements), 2)
@@ -0,0 +1,59 @@
+import unittest
+from datetime import datetime
+
+from app import create_app, db
+from app.models import Role, Song, User
+
+
+class ApiPaginationTestCase(unittest.TestCase):
+    """Case to test cursor pagination of api collections."""
+    
+    def setUp(self):
+        """Test case set up."""
+        self.app = create_app("testing")
+        self.app.config["SONGS_PER_PAGE"] = 3
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        self.client = self.app.test_client()
+        author = User(username="john", email="john@example.com", password="cat")
+        db.session.add(author)
+        # Songs share timestamps to check ties are broken by identifier.
+        for i in range(8):
+            db.session.add(Song(name=f"song{i}", author=author, timestamp=datetime(2022, 1, 1 + i // 3)))
+        db.session.commit()
+    
+    def tearDown(self):
+        """Test case tear down."""
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+    
+    def walk(self, url):
+        """Follow next urls and collect songs."""
+        songs = []
+        while url:
+            resp = self.client.get(url)
+            self.assertEqual(resp.status_code, 200)
+            songs.extend(resp.json["songs"])
+            url = resp.json["next_url"]
+        return songs
+    
+    def test_cursor_walks_whole_collection(self):
+        """Test cursor pages contain every song once in page mode order."""
+        by_cursor = self.walk("/api/v1/songs/?after=")
+        self.assertEqual(len(by_cursor), 8)
+        self.assertEqual(by_cursor, self.walk("/api/v1/songs/?page=1"))
+        self.assertEqual(by_cursor, self.walk("/api/v1/users/john/songs/?after="))
+    
+    def test_cursor_page_has_no_prev_url(self):
+        """Test cursor page links only to next page."""
+        resp = self.client.get("/api/v1/songs/?after=")
+        self.assertIsNone(resp.json["prev_url"])
+        self.assertIn("after=", resp.json["next_url"])
+    
+    def test_invalid_cursor(self):
+        """Test broken cursor is rejected."""
+        resp = self.client.get("/api/v1/songs/?after=broken")
+        self.assertEqual(resp.status_code, 400)
@@ -0,0 +1,96 @@
+import os
+import struct
+import tempfile
+import unittest
+import wave
+
+from app.audio import probe
+
+
+def mp3_frame(padding=0):
+    """Build MPEG1 layer III frame, 128 kbps, 44100 Hz, joint stereo."""
+    header = bytes([0xff, 0xfb, 0x90 | (padding << 1), 0x40])
+    return header + bytes(417 + padding - 4)
+
+
+def ogg_page(granule, serial, body):
+    """Build Ogg page with single packet."""
+    segments = [255] * (len(body) // 255) + [len(body) % 255]
+    return b"OggS" + struct.pack("<BBqIIIB", 0, 0, granule, serial, 0, 0, len(segments)) \
+        + bytes(segments) + body
+
+
+class AudioProbeTestCase(unittest.TestCase):
+    """Case to test audio header parsing."""
+    
+    def setUp(self):
+        """Test case set up."""
+        fd, self.path = tempfile.mkstemp()
+        os.close(fd)
+    
+    def tearDown(self):
+        """Test case tear down."""
+        os.remove(self.path)
+    
+    def write(self, data):
+        """Write test file."""
+        with open(self.path, "wb") as f:
+            f.write(data)
+    
+    def test_wav(self):
+        """Test WAV duration is read from RIFF chunks."""
+        with wave.open(self.path, "wb") as w:
+            w.setnchannels(2)
+            w.setsampwidth(2)
+            w.setframerate(8000)
+            w.writeframes(bytes(8000 * 4 * 3))
+        info = probe(self.path)
+        self.assertEqual((info.codec, info.mime_type), ("pcm", "audio/wav"))
+        self.assertAlmostEqual(info.duration, 3.0)
+        self.assertEqual((info.sample_rate, info.channels, info.bitrate), (8000, 2, 256000))
+    
+    def test_cbr_mp3_with_id3(self):
+        """Test constant bitrate MP3 after ID3v2 tag."""
+        tag = b"ID3\x03\x00\x00" + bytes([0, 0, 1, 0]) + bytes(128)
+        self.write(tag + mp3_frame() * 1000)
+        info = probe(self.path)
+        self.assertEqual((info.codec, info.mime_type), ("mp3", "audio/mpeg"))
+        self.assertEqual((info.sample_rate, info.channels, info.bitrate), (44100, 2, 128000))
+        self.assertAlmostEqual(info.duration, 417 * 1000 * 8 / 128000)
+    
+    def test_vbr_mp3(self):
+        """Test frame count of Xing header gives MP3 duration."""
+        xing = bytearray(mp3_frame())
+        xing[36:48] = b"Xing" + struct.pack(">II", 1, 2000)
+        self.write(bytes(xing) + mp3_frame() * 10)
+        info = probe(self.path)
+        self.assertAlmostEqual(info.duration, 2000 * 1152 / 44100)
+    
+    def test_flac(self):
+        """Test FLAC STREAMINFO."""
+        streaminfo = bytes(10) + ((44100 << 44) | (1 << 41) | (15 << 36) | 441000).to_bytes(8, "big") + bytes(16)
+        self.write(b"fLaC" + bytes([0x80, 0, 0, 34]) + streaminfo + bytes(1000))
+        info = probe(self.path)
+        self.assertEqual((info.codec, info.sample_rate, info.channels), ("flac", 44100, 2))
+        self.assertAlmostEqual(info.duration, 10.0)
+    
+    def test_ogg_opus(self):
+        """Test Opus duration is read from last page granule position."""
+        head = b"OpusHead" + struct.pack("<BBHIhB", 1, 2, 312, 44100, 0, 0)
+        self.write(ogg_page(0, 7, head) + ogg_page(0, 7, bytes(300)) * 10
+                   + ogg_page(48000 * 5 + 312, 7, bytes(100)))
+        info = probe(self.path)
+        self.assertEqual((info.codec, info.mime_type, info.channels), ("opus", "audio/ogg", 2))
+        self.assertAlmostEqual(info.duration, 5.0)
+    
+    def test_truncated_wav(self):
+        """Test WAV with truncated "fmt " chunk isn't recognized."""
+        self.write(b"RIFF" + struct.pack("<I", 20) + b"WAVEfmt " + struct.pack("<I", 16) + bytes(6))
+        self.assertIsNone(probe(self.path))
+        self.write(b"RIFF" + struct.pack("<I", 28) + b"WAVEfmt " + struct.pack("<I", 8) + bytes(8))
+        self.assertIsNone(probe(self.path))
+    
+    def test_unknown(self):
+        """Test unrecognized file."""
+        self.write(os.urandom(100).replace(b"\xff", b"\x00"))
+        self.assertIsNone(probe(self.path))
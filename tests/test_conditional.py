@@ -0,0 +1,79 @@
+import unittest
+
+from app import create_app, db
+from app.models import Comment, Role, Song, User
+
+
+class ConditionalGetTestCase(unittest.TestCase):
+    """Case to test conditional get of api and song page."""
+    
+    def setUp(self):
+        """Test case set up."""
+        self.app = create_app("testing")
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        self.client = self.app.test_client()
+        self.author = User(username="john", email="john@example.com", password="cat")
+        self.listener = User(username="alex", email="alex@example.com", password="cat")
+        self.song = Song(name="song", author=self.author)
+        db.session.add_all([self.author, self.listener, self.song])
+        db.session.commit()
+    
+    def tearDown(self):
+        """Test case tear down."""
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+    
+    def revalidate(self, url, resp):
+        """Request url again with validators of previous response."""
+        return self.client.get(url, headers={"If-None-Match": resp.headers["ETag"]})
+    
+    def test_song_not_modified(self):
+        """Test unchanged song is answered with 304 and changed one with new body."""
+        url = f"/api/v1/songs/{self.song.song_id}"
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, 200)
+        self.assertIn("Last-Modified", first.headers)
+        self.assertEqual(self.revalidate(url, first).status_code, 304)
+        modified_since = self.client.get(url, headers={"If-Modified-Since": first.headers["Last-Modified"]})
+        self.assertEqual(modified_since.status_code, 304)
+        self.song.like(self.listener)
+        db.session.commit()
+        second = self.revalidate(url, first)
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.json["likes_count"], 1)
+    
+    def test_user_and_comment_not_modified(self):
+        """Test user and comment endpoints answer with 304."""
+        comment = Comment(body="nice", author=self.listener, song=self.song)
+        db.session.add(comment)
+        db.session.commit()
+        for url in ["/api/v1/users/john", f"/api/v1/comments/{comment.comment_id}"]:
+            first = self.client.get(url)
+            self.assertEqual(self.revalidate(url, first).status_code, 304, url)
+        first = self.client.get("/api/v1/users/john")
+        db.session.add(Song(name="other", author=self.author))
+        db.session.commit()
+        self.assertEqual(self.revalidate("/api/v1/users/john", first).status_code, 200)
+    
+    def test_collection_not_modified(self):
+        """Test collection page is answered with 304 until it changes."""
+        first = self.client.get("/api/v1/songs/")
+        self.assertEqual(self.revalidate("/api/v1/songs/", first).status_code, 304)
+        db.session.add(Song(name="other", author=self.author))
+        db.session.commit()
+        self.assertEqual(self.revalidate("/api/v1/songs/", first).status_code, 200)
+    
+    def test_song_page_not_modified(self):
+        """Test song page is revalidated and changes with comments."""
+        url = f"/song/{self.song.song_id}"
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, 200)
+        self.assertIn("Cookie", first.headers["Vary"])
+        self.assertEqual(self.revalidate(url, first).status_code, 304)
+        db.session.add(Comment(body="nice", author=self.listener, song=self.song))
+        db.session.commit()
+        self.assertEqual(self.revalidate(url, first).status_code, 200)
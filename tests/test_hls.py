@@ -0,0 +1,152 @@
+import io
+import os
+import struct
+import unittest
+
+from app import create_app, db
+from app.audio import id3v2_size
+from app.hls import segment_mp3, segment_song, timestamp_tag
+from app.models import Rendition, Role, Song, UploadState, User
+from app.song_files import delete_song_files, song_file_names
+
+
+# Samples per second over samples per frame of test MP3 frames.
+FRAME_DURATION = 1152 / 44100
+
+
+def mp3_frames(count):
+    """Build stream of MPEG1 layer III frames, 128 kbps, 44100 Hz."""
+    return (bytes([0xff, 0xfb, 0x90, 0x40]) + bytes(413)) * count
+
+
+def fake_encode(encoder, src, dst, bitrate):
+    """Write stream of MP3 frames instead of encoding."""
+    with open(dst, "wb") as f:
+        f.write(mp3_frames(100))
+
+
+class HLSTestCase(unittest.TestCase):
+    """Case to test HLS segments and playlists."""
+    
+    def setUp(self):
+        """Test case set up."""
+        self.app = create_app("testing")
+        self.app.config["HLS_SEGMENT_DURATION"] = 1
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        user = User(username="john", email="john@example.com", password="cat")
+        self.song = Song(name="song", author=user, url="/media/1", upload_state=UploadState.READY,
+                         codec="mp3", bitrate=128000)
+        db.session.add_all([user, self.song])
+        db.session.commit()
+        with open(self.app.storage.path(str(self.song.song_id)), "wb") as f:
+            f.write(b"ID3\x03\x00\x00\x00\x00\x00\x0a" + bytes(10) + mp3_frames(100) + b"TAG" + bytes(125))
+        self.client = self.app.test_client()
+    
+    def tearDown(self):
+        """Test case tear down."""
+        self.app.transcoder.shutdown()
+        self.app.waveforms.shutdown()
+        names = ["1", "1.low.mp3"]
+        for name in ["original", "low"]:
+            names.append(f"1.{name}.m3u8")
+            names.extend(f"1.{name}.{index}.mp3" for index in range(3))
+        for name in names:
+            self.app.storage.delete(name)
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+    
+    def test_segments(self):
+        """Test segments are cut at frame boundaries after tags."""
+        data = b"ID3\x03\x00\x00\x00\x00\x00\x0a" + bytes(10) + mp3_frames(100) + b"TAG" + bytes(125)
+        segments = segment_mp3(io.BytesIO(data), 1)
+        self.assertEqual([round(segment.duration / FRAME_DURATION) for segment in segments], [39, 39, 22])
+        self.assertEqual(segments[0].start, 20)
+        self.assertEqual(segments[1].start, segments[0].end)
+        self.assertEqual(segments[-1].end, 20 + 417 * 100)
+        self.assertAlmostEqual(segments[2].start_time, 78 * FRAME_DURATION)
+    
+    def test_timestamp_tag(self):
+        """Test segment timestamp is MPEG-2 clock in ID3 PRIV frame."""
+        tag = timestamp_tag(2.5)
+        self.assertEqual(id3v2_size(tag), len(tag))
+        self.assertEqual(tag[10:14], b"PRIV")
+        self.assertEqual(struct.unpack(">Q", tag[-8:])[0], 225000)
+    
+    def test_playlists(self):
+        """Test segmented song is served by master and media playlists."""
+        resp = self.client.get(f"/api/v1/songs/{self.song.song_id}/hls.m3u8")
+        self.assertEqual(resp.status_code, 404)
+        self.assertEqual(segment_song(self.song.song_id), ["original"])
+        self.assertEqual(segment_song(self.song.song_id), [])
+        song = Song.query.get(self.song.song_id)
+        self.assertTrue(song.has_playlist)
+        
+        resp = self.client.get(f"/api/v1/songs/{song.song_id}/hls.m3u8")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.mimetype, "application/vnd.apple.mpegurl")
+        self.assertIn('BANDWIDTH=128000,CODECS="mp4a.40.34"', resp.get_data(as_text=True))
+        self.assertIn("hls/original.m3u8", resp.get_data(as_text=True))
+        
+        resp = self.client.get(f"/api/v1/songs/{song.song_id}/hls/original.m3u8")
+        self.assertEqual(resp.status_code, 200)
+        playlist = resp.get_data(as_text=True).splitlines()
+        self.assertIn("#EXT-X-TARGETDURATION:2", playlist)
+        self.assertEqual(playlist[-2:], ["/media/1.original.2.mp3", "#EXT-X-ENDLIST"])
+        self.assertEqual(resp.headers["Cache-Control"], "no-cache")
+        
+        resp = self.client.get(playlist[-4])
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.mimetype, "audio/mpeg")
+        data = resp.get_data()
+        resp.close()
+        self.assertEqual(len(data), id3v2_size(data) + 417 * 39)
+        self.assertEqual(data[id3v2_size(data):][:2], b"\xff\xfb")
+        
+        self.assertEqual(self.client.get(f"/api/v1/songs/{song.song_id}/hls/high.m3u8").status_code, 404)
+        self.app.storage.delete(f"{song.song_id}.original.m3u8")
+        self.assertEqual(self.client.get(f"/api/v1/songs/{song.song_id}/hls/original.m3u8").status_code, 404)
+    
+    def test_playlist_etag_follows_rendition(self):
+        """Test media playlist of rendition segmented anew gets new entity tag."""
+        self.test_transcoder()
+        url = f"/api/v1/songs/{self.song.song_id}/hls/low.m3u8"
+        etag = self.client.get(url).headers["ETag"]
+        Rendition.store(self.song.song_id, "low", 64000, "mp3", "/media/1.low.mp3", 100)
+        self.assertEqual(self.client.get(url).status_code, 404)
+        segment_song(self.song.song_id)
+        self.assertNotEqual(self.client.get(url).headers["ETag"], etag)
+    
+    def test_transcoder(self):
+        """Test renditions are segmented after transcoding when enabled."""
+        self.app.config["HLS_ENABLED"] = True
+        self.app.config["TRANSCODE_ENCODER"] = "true"
+        self.app.config["TRANSCODE_RENDITIONS"] = {"low": 64}
+        self.app.transcoder.encode = fake_encode
+        self.app.transcoder.submit(self.song.song_id)
+        self.app.transcoder.join()
+        db.session.expire_all()
+        rendition = Rendition.query.filter_by(song_id=self.song.song_id, name="low").one()
+        self.assertTrue(rendition.has_playlist)
+        self.assertEqual(Song.query.get(self.song.song_id).playlist_variants(),
+                         [("low", 64000), ("original", 128000)])
+        resp = self.client.get(f"/api/v1/songs/{self.song.song_id}/hls.m3u8")
+        self.assertIn("hls/low.m3u8", resp.get_data(as_text=True))
+    
+    def test_delete_song_files(self):
+        """Test every file made of song is deleted from storage."""
+        self.test_transcoder()
+        song = Song.query.get(self.song.song_id)
+        song.has_waveform = True
+        db.session.commit()
+        with open(self.app.storage.path("1.waveform"), "wb") as f:
+            f.write(b"WAVF")
+        names = song_file_names(song)
+        self.assertEqual(len(names), 1 + 1 + 1 + 2 * (3 + 1))
+        self.assertTrue(all(os.path.exists(self.app.storage.path(name)) for name in names))
+        delete_song_files(song)
+        self.assertFalse(any(os.path.exists(self.app.storage.path(name)) for name in names))
+
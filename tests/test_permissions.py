@@ -0,0 +1,65 @@
+import unittest
+
+from app import create_app, db
+from app.models import Permission, Role, User, load_user
+
+
+class RolePermissionsTestCase(unittest.TestCase):
+    """Case to test cached role permissions."""
+    
+    def setUp(self):
+        """Test case set up."""
+        self.app = create_app("testing")
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        db.session.add(User(username="john", email="john@example.com", password="cat"))
+        db.session.commit()
+        db.session.remove()
+        self.statements = []
+        db.event.listen(db.engine, "before_cursor_execute", self.count_statement)
+    
+    def tearDown(self):
+        """Test case tear down."""
+        db.event.remove(db.engine, "before_cursor_execute", self.count_statement)
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+    
+    def count_statement(self, conn, cursor, statement, parameters, context, executemany):
+        """Remember executed statement."""
+        self.statements.append(statement)
+    
+    def test_can_makes_no_queries(self):
+        """Test loaded user checks permissions without database."""
+        self.app.role_permissions.load()
+        self.statements.clear()
+        user = load_user("1")
+        self.assertEqual(len(self.statements), 1)
+        self.assertTrue(user.can(Permission.COMMENT))
+        self.assertFalse(user.can(Permission.MODERATE))
+        self.assertFalse(user.is_administrator())
+        self.assertEqual(len(self.statements), 1)
+    
+    def test_role_edit_refreshes_permissions(self):
+        """Test committed role edit is seen by next permission check."""
+        user = load_user("1")
+        self.assertTrue(user.can(Permission.COMMENT))
+        user.role.permissions = Permission.FOLLOW
+        db.session.commit()
+        self.assertFalse(user.can(Permission.COMMENT))
+        user.role = Role.query.filter_by(name="Moderator").first()
+        db.session.commit()
+        self.assertTrue(user.can(Permission.MODERATE))
+    
+    def test_missing_role_is_loaded_once(self):
+        """Test missing role reloads table once until next refresh."""
+        self.app.role_permissions.load()
+        self.statements.clear()
+        self.assertEqual(self.app.role_permissions.get(100), 0)
+        self.assertEqual(self.app.role_permissions.get(100), 0)
+        self.assertEqual(len(self.statements), 1)
+        self.app.role_permissions.refresh()
+        self.assertEqual(self.app.role_permissions.get(100), 0)
+        self.assertEqual(len(self.statements), 2)
@@ -0,0 +1,86 @@
+import re
+import unittest
+from datetime import datetime
+
+from app import create_app, db
+from app.api.v1.pagination import encode_cursor
+from app.models import Comment, Role, Song, User
+
+
+# Plan line of table read without any index.
+FULL_SCAN = re.compile(r"^SCAN (\w+)(?: AS \w+)?$")
+
+
+class QueryPlanTestCase(unittest.TestCase):
+    """Case to test hot queries of views and api don't scan whole tables."""
+    
+    hot_tables = {"songs", "comments", "songlikes", "follows", "timelines"}
+    
+    def setUp(self):
+        """Test case set up."""
+        self.app = create_app("testing")
+        self.app.config["WTF_CSRF_ENABLED"] = False
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        john = User(username="john", email="john@example.com", password="cat", confirmed=True)
+        susan = User(username="susan", email="susan@example.com", password="dog", confirmed=True)
+        db.session.add_all([john, susan])
+        db.session.commit()
+        john.follow(susan)
+        for i in range(3):
+            song = Song(name=f"song{i}", author=susan)
+            db.session.add(song)
+            db.session.add(Comment(body="nice", author=john, song=song))
+            song.like(john)
+        db.session.commit()
+        self.client = self.app.test_client()
+        self.statements = []
+    
+    def tearDown(self):
+        """Test case tear down."""
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+    
+    def record_statement(self, conn, cursor, statement, parameters, context, executemany):
+        """Remember every select sent to database."""
+        if statement.lstrip().upper().startswith("SELECT"):
+            self.statements.append((statement, parameters))
+    
+    def full_scans(self, statement, parameters):
+        """Get hot tables statement reads without index."""
+        connection = db.engine.raw_connection()
+        try:
+            plan = connection.cursor().execute("EXPLAIN QUERY PLAN " + statement, parameters).fetchall()
+        finally:
+            connection.close()
+        scans = []
+        for row in plan:
+            match = FULL_SCAN.match(row[-1])
+            if match and match.group(1) in self.hot_tables:
+                scans.append(match.group(1))
+        return scans
+    
+    def test_hot_queries_use_indexes(self):
+        """Test queries issued by pages and api use indexes."""
+        self.client.post("/auth/login", data={"username": "john", "password": "cat"})
+        self.client.set_cookie("localhost", "show_followed", "1")
+        song_id = Song.query.first().song_id
+        after = encode_cursor(datetime.utcnow(), song_id)
+        db.event.listen(db.engine, "before_cursor_execute", self.record_statement)
+        try:
+            for url in ["/", "/user/susan", f"/song/{song_id}", "/followers/susan",
+                        "/followed-by/john", f"/like/{song_id}", f"/unlike/{song_id}",
+                        "/api/v1/songs/", f"/api/v1/songs/{song_id}/comments",
+                        "/api/v1/users/susan/songs/", "/api/v1/comments/",
+                        f"/api/v1/songs/?after={after}", f"/api/v1/songs/{song_id}/comments?after={after}",
+                        f"/api/v1/users/susan/songs/?after={after}", f"/api/v1/comments/?after={after}"]:
+                resp = self.client.get(url)
+                self.assertLess(resp.status_code, 400, url)
+        finally:
+            db.event.remove(db.engine, "before_cursor_execute", self.record_statement)
+        self.assertTrue(self.statements)
+        for statement, parameters in self.statements:
+            self.assertEqual(self.full_scans(statement, parameters), [], statement)
@@ -0,0 +1,307 @@
+import unittest
+
+from elasticsearch.exceptions import ConnectionError as ESConnectionError
+from flask import Flask
+
+from app import create_app, db
+from app.models import Role, Song, User
+from app.search import IndexQueue, SearchCache, bulk_reindex, query_index
+
+
+class FakeElasticsearch:
+    """Elasticsearch double which records bulk requests."""
+    
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.requests = []
+        self.on_bulk = None
+    
+    def bulk(self, body, refresh=None):
+        """Record bulk request or fail while failures are left."""
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("elasticsearch is down")
+        if self.on_bulk is not None:
+            self.on_bulk(refresh)
+        self.requests.append(body)
+        return {"errors": False, "items": []}
+
+
+class FakeIndices:
+    """Elasticsearch indices API double which keeps indices and aliases."""
+    
+    def __init__(self):
+        self.indices = {"songs": set()}
+    
+    def create(self, index):
+        self.indices[index] = set()
+    
+    def delete(self, index):
+        del self.indices[index]
+    
+    def exists(self, index):
+        return index in self.indices
+    
+    def exists_alias(self, name):
+        return any(name in aliases for aliases in self.indices.values())
+    
+    def get_alias(self, name):
+        return {index: {} for index, aliases in self.indices.items() if name in aliases}
+    
+    def refresh(self, index):
+        pass
+    
+    def update_aliases(self, body):
+        for action in body["actions"]:
+            for kind, params in action.items():
+                if kind == "remove_index":
+                    del self.indices[params["index"]]
+                    continue
+                aliases = self.indices[params["index"]]
+                if kind == "add":
+                    aliases.add(params["alias"])
+                else:
+                    aliases.discard(params["alias"])
+
+
+class IndexQueueTestCase(unittest.TestCase):
+    """Case to test search index queue."""
+    
+    def setUp(self):
+        """Test case set up."""
+        self.app = Flask(__name__)
+        self.app.config.update(SEARCH_FLUSH_INTERVAL=0.01, SEARCH_RETRY_BACKOFF=0.01)
+        self.app.elasticsearch = FakeElasticsearch()
+    
+    def test_changes_are_merged(self):
+        """Test only last change of document is sent."""
+        queue = IndexQueue(self.app)
+        queue.add("songs", 1, {"name": "first"})
+        queue.add("songs", 2, {"name": "other"})
+        queue.add("songs", 1, {"name": "second"})
+        queue.remove("songs", 2)
+        self.assertTrue(queue.join(5))
+        actions = [action for body in self.app.elasticsearch.requests for action in body]
+        self.assertEqual(actions, [
+            {"index": {"_index": "songs", "_id": 1}}, {"name": "second"},
+            {"delete": {"_index": "songs", "_id": 2}}
+        ])
+    
+    def test_failed_bulk_is_retried(self):
+        """Test changes survive elasticsearch outage."""
+        self.app.elasticsearch = FakeElasticsearch(failures=2)
+        queue = IndexQueue(self.app)
+        queue.add("songs", 1, {"name": "song"})
+        self.assertTrue(queue.join(5))
+        self.assertEqual(self.app.elasticsearch.requests,
+                         [[{"index": {"_index": "songs", "_id": 1}}, {"name": "song"}]])
+    
+    def test_cache_is_invalidated_after_refresh(self):
+        """Test search cached before sent changes are visible is dropped."""
+        self.app.search_cache = SearchCache(self.app)
+        refreshes = []
+        
+        def search(refresh):
+            refreshes.append(refresh)
+            self.app.search_cache.set("songs", "song", 1, 6, ([], 0))
+        
+        self.app.elasticsearch.on_bulk = search
+        queue = IndexQueue(self.app)
+        queue.add("songs", 1, {"name": "song"})
+        self.assertTrue(queue.join(5))
+        self.assertEqual(refreshes, ["wait_for"])
+        self.assertIsNone(self.app.search_cache.get("songs", "song", 1, 6))
+
+
+class BulkReindexTestCase(unittest.TestCase):
+    """Case to test bulk reindex."""
+    
+    def setUp(self):
+        """Test case set up."""
+        self.app = create_app("testing")
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        self.app.elasticsearch = FakeElasticsearch()
+        self.app.elasticsearch.indices = FakeIndices()
+        u = User(username="user", email="user@example.com", password="cat")
+        db.session.add(u)
+        db.session.add_all([Song(name=f"song{i}", lyrics=f"la{i}", author=u) for i in range(7)])
+        db.session.commit()
+        self.app.search_queue.join(5)
+        self.app.elasticsearch.requests.clear()
+    
+    def tearDown(self):
+        """Test case tear down."""
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+        self.app.search_queue.join(5)
+    
+    def test_all_rows_sent_in_batches(self):
+        """Test every song is sent once with searchable fields only."""
+        progress = []
+        done = bulk_reindex(Song, batch_size=3, workers=2,
+                            progress=lambda done, elapsed: progress.append(done))
+        es = self.app.elasticsearch
+        self.assertEqual(done, 7)
+        self.assertEqual(sorted(len(body) // 2 for body in es.requests), [1, 3, 3])
+        documents = [action for body in es.requests for action in body[1::2]]
+        self.assertEqual(sorted(doc["name"] for doc in documents), [f"song{i}" for i in range(7)])
+        self.assertEqual(set(documents[0]), set(Song.__searchable__))
+        self.assertEqual(progress[-1], 7)
+    
+    def test_swap_replaces_index_behind_alias(self):
+        """Test reindex into new index replaces concrete index with alias."""
+        bulk_reindex(Song, batch_size=5, swap=True)
+        indices = self.app.elasticsearch.indices.indices
+        self.assertEqual(len(indices), 1)
+        index, aliases = next(iter(indices.items()))
+        self.assertTrue(index.startswith("songs-"))
+        self.assertEqual(aliases, {"songs"})
+        self.assertEqual({body[0]["index"]["_index"] for body in self.app.elasticsearch.requests},
+                         {index})
+    
+    def test_swap_catches_up_changes(self):
+        """Test songs edited and deleted during reindex are caught up in new index."""
+        def change(done, elapsed):
+            if done == 7 and not changed:
+                changed.append(True)
+                Song.query.filter_by(name="song0").first().name = "renamed"
+                db.session.delete(Song.query.filter_by(name="song6").first())
+                db.session.commit()
+                self.app.search_queue.join(5)
+        
+        changed = []
+        deleted_id = Song.query.filter_by(name="song6").first().song_id
+        bulk_reindex(Song, batch_size=3, workers=2, swap=True, progress=change)
+        actions = [action for body in self.app.elasticsearch.requests for action in body]
+        new_index = next(iter(self.app.elasticsearch.indices.indices))
+        self.assertIn({"delete": {"_index": new_index, "_id": deleted_id}}, actions)
+        renamed = actions.index({"name": "renamed", "lyrics": "la0"})
+        self.assertEqual(actions[renamed - 1]["index"]["_index"], new_index)
+
+
+class DatabaseSearchTestCase(unittest.TestCase):
+    """Case to test database full text search."""
+    
+    def setUp(self):
+        """Test case set up."""
+        self.app = create_app("testing")
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        self.author = User(username="user", email="user@example.com", password="cat")
+        db.session.add(self.author)
+        db.session.commit()
+    
+    def tearDown(self):
+        """Test case tear down."""
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+    
+    def add_song(self, name, lyrics=None):
+        """Create song of test author."""
+        song = Song(name=name, lyrics=lyrics, author=self.author)
+        db.session.add(song)
+        db.session.commit()
+        return song
+    
+    def test_name_ranks_above_lyrics(self):
+        """Test match in name is ranked above match in lyrics."""
+        in_lyrics = self.add_song("Night", "walking under the summer rain")
+        in_name = self.add_song("Summer rain")
+        self.add_song("Winter", "snow")
+        ids, total = query_index("songs", "summer", 1, 10)
+        self.assertEqual(ids, [in_name.song_id, in_lyrics.song_id])
+        self.assertEqual(total, 2)
+    
+    def test_index_follows_changes(self):
+        """Test prefix query sees updated and deleted songs."""
+        song = self.add_song("Yesterday")
+        self.assertEqual(query_index("songs", "yester", 1, 10), ([song.song_id], 1))
+        song.name = "Tomorrow"
+        db.session.commit()
+        self.assertEqual(query_index("songs", "yester", 1, 10), ([], 0))
+        db.session.delete(song)
+        db.session.commit()
+        self.assertEqual(query_index("songs", "tomorrow", 1, 10), ([], 0))
+    
+    def test_query_syntax_is_escaped(self):
+        """Test operators typed by user don't break query."""
+        song = self.add_song("Rock and roll")
+        self.assertEqual(query_index("songs", 'rock" (* -', 1, 10), ([song.song_id], 1))
+        self.assertEqual(query_index("songs", "!!!", 1, 10), ([], 0))
+    
+    def test_fallback_when_elasticsearch_is_down(self):
+        """Test database is queried when elasticsearch fails."""
+        class DownElasticsearch:
+            def search(self, **kwargs):
+                raise ESConnectionError("N/A", "elasticsearch is down", None)
+        
+        song = self.add_song("Fallback")
+        self.app.elasticsearch = DownElasticsearch()
+        self.assertEqual(query_index("songs", "fallback", 1, 10), ([song.song_id], 1))
+
+
+class SearchCacheTestCase(unittest.TestCase):
+    """Case to test search result cache and hydration."""
+    
+    def setUp(self):
+        """Test case set up."""
+        self.app = create_app("testing")
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        self.author = User(username="user", email="user@example.com", password="cat")
+        self.song = Song(name="Summer", author=self.author)
+        db.session.add_all([self.author, self.song])
+        db.session.commit()
+        self.statements = []
+    
+    def tearDown(self):
+        """Test case tear down."""
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+    
+    def count_statement(self, conn, cursor, statement, parameters, context, executemany):
+        """Remember every statement sent to database."""
+        self.statements.append(statement)
+    
+    def test_repeated_search_is_cached(self):
+        """Test normalised repeated query doesn't reach search engine."""
+        self.assertEqual(query_index("songs", "summer", 1, 6), ([self.song.song_id], 1))
+        db.event.listen(db.engine, "before_cursor_execute", self.count_statement)
+        try:
+            self.assertEqual(query_index("songs", "  SUMMER ", 1, 6), ([self.song.song_id], 1))
+        finally:
+            db.event.remove(db.engine, "before_cursor_execute", self.count_statement)
+        self.assertEqual(self.statements, [])
+    
+    def test_write_invalidates_cache(self):
+        """Test new song is found after it is committed."""
+        query_index("songs", "summer", 1, 6)
+        other = Song(name="Summer night", author=self.author)
+        db.session.add(other)
+        db.session.commit()
+        ids, total = query_index("songs", "summer", 1, 6)
+        self.assertEqual(total, 2)
+        self.assertIn(other.song_id, ids)
+    
+    def test_hits_hydrated_with_authors(self):
+        """Test search results and their authors are loaded with one query."""
+        db.session.expunge_all()
+        query_index("songs", "summer", 1, 6)
+        db.event.listen(db.engine, "before_cursor_execute", self.count_statement)
+        try:
+            songs, total = Song.search("summer", 1, 6)
+            cards = Song.load_cards(songs, self.app.login_manager.anonymous_user())
+            self.assertEqual(cards[0].song.author.username, "user")
+        finally:
+            db.event.remove(db.engine, "before_cursor_execute", self.count_statement)
+        self.assertEqual(len(self.statements), 1)
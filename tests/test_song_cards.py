@@ -0,0 +1,72 @@
+import unittest
+
+from flask_login import AnonymousUserMixin
+
+from app import create_app, db
+from app.models import Role, Song, User
+
+
+class SongCardsTestCase(unittest.TestCase):
+    """Case to test song cards loader."""
+
+    def setUp(self):
+        """Test case set up."""
+        self.app = create_app("testing")
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        self.statements = []
+
+    def tearDown(self):
+        """Test case tear down."""
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def count_statement(self, conn, cursor, statement, parameters, context, executemany):
+        """Remember every statement sent to database."""
+        self.statements.append(statement)
+
+    def create_songs(self, amount):
+        """Create users with one song each."""
+        songs = []
+        for i in range(amount):
+            u = User(username=f"user{i}", email=f"user{i}@example.com", password="cat")
+            s = Song(name=f"song{i}", author=u)
+            db.session.add_all([u, s])
+            songs.append(s)
+        db.session.commit()
+        return songs
+
+    def test_cards_counts_and_liked_state(self):
+        """Test cards contain counts and viewer liked state."""
+        songs = self.create_songs(3)
+        viewer = User.query.filter_by(username="user0").first()
+        songs[1].like(viewer)
+        db.session.commit()
+        cards = Song.load_cards(Song.query.order_by(Song.song_id), viewer)
+        self.assertEqual([card.song.name for card in cards], ["song0", "song1", "song2"])
+        self.assertEqual([card.song.like_count for card in cards], [0, 1, 0])
+        self.assertEqual([card.liked for card in cards], [False, True, False])
+
+    def test_cards_use_constant_number_of_queries(self):
+        """Test loader doesn't issue query per song."""
+        self.create_songs(9)
+        viewer = User.query.first()
+        songs = Song.query.all()
+        db.event.listen(db.engine, "before_cursor_execute", self.count_statement)
+        try:
+            cards = Song.load_cards(songs, viewer)
+            for card in cards:
+                card.song.author.username
+        finally:
+            db.event.remove(db.engine, "before_cursor_execute", self.count_statement)
+        self.assertEqual(len(cards), 9)
+        self.assertLessEqual(len(self.statements), 2)
+
+    def test_cards_for_anonymous_viewer(self):
+        """Test anonymous viewer never likes songs."""
+        self.create_songs(2)
+        cards = Song.load_cards(Song.query.all(), AnonymousUserMixin())
+        self.assertFalse(any(card.liked for card in cards))
@@ -0,0 +1,103 @@
+import unittest
+
+from app import create_app, db
+from app.models import Comment, Role, Song, SongLike, UploadState, User
+
+
+class SongModelTestCase(unittest.TestCase):
+    """Case to test song model."""
+    
+    def setUp(self):
+        """Test case set up."""
+        self.app = create_app("testing")
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        self.author = User(username="john", email="john@example.com", password="cat")
+        self.listener = User(username="alex", email="alex@example.com", password="cat")
+        self.song = Song(name="song", author=self.author)
+        db.session.add_all([self.author, self.listener, self.song])
+        db.session.commit()
+    
+    def tearDown(self):
+        """Test case tear down."""
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+    
+    def test_like_counter(self):
+        """Test like and unlike keep like counter in sync."""
+        self.song.like(self.listener)
+        db.session.commit()
+        self.assertEqual(self.song.like_count, 1)
+        self.song.unlike(self.listener)
+        db.session.commit()
+        self.assertEqual(self.song.like_count, 0)
+    
+    def test_like_is_idempotent(self):
+        """Test repeated like and unlike change nothing."""
+        self.assertTrue(self.song.like(self.listener))
+        self.assertFalse(self.song.like(self.listener))
+        db.session.commit()
+        self.assertEqual(self.song.likes.count(), 1)
+        self.assertEqual(self.song.like_count, 1)
+        self.assertTrue(self.song.unlike(self.listener))
+        self.assertFalse(self.song.unlike(self.listener))
+        db.session.commit()
+        self.assertEqual(self.song.like_count, 0)
+    
+    def test_unlike_keeps_other_songs_likes(self):
+        """Test unlike deletes like of this song only."""
+        other = Song(name="other", author=self.author)
+        db.session.add(other)
+        other.like(self.listener)
+        db.session.commit()
+        self.assertFalse(self.song.unlike(self.listener))
+        db.session.commit()
+        self.assertEqual(other.likes.count(), 1)
+        self.assertEqual(other.like_count, 1)
+    
+    def test_comment_counter(self):
+        """Test comment creation increases comment counter."""
+        db.session.add(Comment(body="nice", author=self.listener, song=self.song))
+        db.session.add(Comment(body="cool", author=self.author, song=self.song))
+        db.session.commit()
+        self.assertEqual(self.song.comment_count, 2)
+    
+    def test_counters_follow_cascade_delete(self):
+        """Test counters decrease when user with likes and comments is deleted."""
+        self.song.like(self.listener)
+        db.session.add(Comment(body="nice", author=self.listener, song=self.song))
+        db.session.commit()
+        db.session.delete(self.listener)
+        db.session.commit()
+        self.assertEqual(self.song.like_count, 0)
+        self.assertEqual(self.song.comment_count, 0)
+    
+    def test_recount(self):
+        """Test recount restores counters from likes and comments tables."""
+        db.session.add(SongLike(song=self.song, user=self.listener))
+        db.session.commit()
+        db.session.execute(db.update(Song).values(like_count=42, comment_count=7))
+        db.session.commit()
+        Song.recount()
+        self.assertEqual(self.song.like_count, 1)
+        self.assertEqual(self.song.comment_count, 0)
+    
+    def test_pending_song_has_no_url(self):
+        """Test url of pending song is never resolved while reading it."""
+        self.assertEqual(self.song.upload_state, UploadState.PENDING)
+        self.assertIsNone(self.song.get_url())
+    
+    def test_finish_upload(self):
+        """Test finished upload stores url and marks song ready."""
+        Song.finish_upload(self.song.song_id, "https://storage/song")
+        self.assertEqual(self.song.upload_state, UploadState.READY)
+        self.assertEqual(self.song.get_url(), "https://storage/song")
+    
+    def test_failed_upload(self):
+        """Test failed upload marks song failed."""
+        Song.finish_upload(self.song.song_id, None)
+        self.assertEqual(self.song.upload_state, UploadState.FAILED)
+        self.assertIsNone(self.song.get_url())
@@ -0,0 +1,153 @@
+import os
+import tempfile
+import unittest
+
+from flask import Flask
+
+from app import create_app, db
+from app.models import Role, Song, User
+from app.storage import LocalStorage, StorageBackend, UploadExecutor, UploadQueueFull
+
+
+class UploadExecutorTestCase(unittest.TestCase):
+    """Case to test upload executor."""
+    
+    def setUp(self):
+        """Test case set up."""
+        self.app = Flask(__name__)
+        self.app.config.update(UPLOAD_WORKERS=2, UPLOAD_RETRIES=2, UPLOAD_RETRY_BACKOFF=0,
+                               UPLOAD_QUEUE_SIZE=1, UPLOAD_QUEUE_TIMEOUT=0.1)
+        self.results = []
+    
+    def create_file(self):
+        """Create local file to upload."""
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        return path
+    
+    def test_upload_is_retried(self):
+        """Test failed upload is retried and file is removed."""
+        attempts = []
+        
+        def upload(path, name, content_type):
+            attempts.append(name)
+            if len(attempts) < 3:
+                raise ConnectionError("storage is down")
+            return "https://storage/" + name
+        
+        executor = UploadExecutor(self.app, upload=upload)
+        path = self.create_file()
+        executor.submit(path, "1", "audio/mpeg", self.results.append)
+        executor.join()
+        self.assertEqual(len(attempts), 3)
+        self.assertEqual(self.results, ["https://storage/1"])
+        self.assertFalse(os.path.exists(path))
+    
+    def test_failed_upload_reports_none(self):
+        """Test callback gets None when all attempts failed."""
+        def upload(path, name, content_type):
+            raise ConnectionError("storage is down")
+        
+        executor = UploadExecutor(self.app, upload=upload)
+        path = self.create_file()
+        executor.submit(path, "1", "audio/mpeg", self.results.append)
+        executor.join()
+        self.assertEqual(self.results, [None])
+        self.assertFalse(os.path.exists(path))
+    
+    def test_init_app_stops_previous_workers(self):
+        """Test executor bound to another application stops its old workers."""
+        executor = UploadExecutor(self.app, upload=lambda path, name, content_type: "url")
+        executor.submit(self.create_file(), "1", "audio/mpeg", self.results.append)
+        executor.join()
+        workers = list(executor._workers)
+        self.assertEqual(len(workers), 2)
+        executor.init_app(Flask(__name__))
+        self.assertFalse(any(worker.is_alive() for worker in workers))
+        self.assertEqual(executor._workers, [])
+        self.assertEqual(self.results, ["url"])
+    
+    def test_full_queue_raises(self):
+        """Test submit raises when queue stays full."""
+        self.app.config["UPLOAD_WORKERS"] = 0
+        executor = UploadExecutor(self.app, upload=lambda path, name, content_type: "")
+        executor.submit("first", "1", "audio/mpeg", self.results.append)
+        with self.assertRaises(UploadQueueFull):
+            executor.submit("second", "2", "audio/mpeg", self.results.append)
+
+
+class LocalStorageTestCase(unittest.TestCase):
+    """Case to test local storage backend and media route."""
+    
+    def setUp(self):
+        """Test case set up."""
+        self.app = create_app("testing")
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        self.storage = self.app.storage
+        self.client = self.app.test_client()
+        fd, self.path = tempfile.mkstemp()
+        with os.fdopen(fd, "wb") as f:
+            f.write(bytes(range(256)) * 4)
+    
+    def tearDown(self):
+        """Test case tear down."""
+        self.storage.delete("song")
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.app_context.pop()
+    
+    def test_upload_moves_file(self):
+        """Test upload moves local file into storage."""
+        self.assertIsInstance(self.storage, LocalStorage)
+        url = self.storage.upload(self.path, "song", "audio/mpeg")
+        self.assertEqual(url, "/media/song")
+        self.assertFalse(os.path.exists(self.path))
+        with self.storage.open("song") as f:
+            self.assertEqual(len(f.read()), 1024)
+        self.storage.delete("song")
+        self.assertFalse(os.path.exists(self.storage.path("song")))
+    
+    def test_media_range_request(self):
+        """Test media route answers Range request with partial content."""
+        url = self.storage.upload(self.path, "song", "audio/mpeg")
+        resp = self.client.get(url, headers={"Range": "bytes=256-511"})
+        self.assertEqual(resp.status_code, 206)
+        self.assertEqual(resp.data, bytes(range(256)))
+        self.assertEqual(resp.headers["Content-Range"], "bytes 256-511/1024")
+        etag = resp.headers["ETag"]
+        resp.close()
+        resp = self.client.get(url, headers={"If-None-Match": etag})
+        self.assertEqual(resp.status_code, 304)
+        resp.close()
+    
+    def test_incomplete_backend(self):
+        """Test backend without every interface method can't be created."""
+        class UploadOnlyStorage(StorageBackend):
+            def upload(self, path, name, content_type):
+                return name
+        
+        with self.assertRaises(TypeError):
+            UploadOnlyStorage()
+    
+    def test_media_content_type(self):
+        """Test media route serves stored files with their own content type."""
+        db.create_all()
+        Role.insert_roles()
+        user = User(username="john", email="john@example.com", password="cat")
+        song = Song(name="song", author=user, codec="flac")
+        db.session.add_all([user, song])
+        db.session.commit()
+        try:
+            for name, mimetype in [(str(song.song_id), "audio/flac"), ("song.m3u8", "application/vnd.apple.mpegurl"),
+                                   ("song.waveform", "application/octet-stream")]:
+                with open(self.storage.path(name), "wb") as f:
+                    f.write(b"data")
+                resp = self.client.get(f"/media/{name}")
+                self.assertEqual(resp.mimetype, mimetype)
+                resp.close()
+                self.storage.delete(name)
+        finally:
+            db.session.remove()
+            db.drop_all()
+
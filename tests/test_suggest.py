@@ -0,0 +1,90 @@
+import unittest
+
+from app import create_app, db
+from app.models import Role, Song, User
+from app.search import PrefixIndex
+
+
+class PrefixIndexTestCase(unittest.TestCase):
+    """Case to test prefix index."""
+    
+    def setUp(self):
+        """Test case set up."""
+        self.index = PrefixIndex()
+        self.index.load([
+            ("songs", 1, "Summer rain"),
+            ("songs", 2, "Summertime"),
+            ("songs", 3, "Winter"),
+            ("users", 1, "summer_fan")
+        ])
+    
+    def test_prefix_of_any_word(self):
+        """Test names are found by prefix of every word."""
+        self.assertEqual(self.index.search("SUM", 5), {
+            "songs": [(1, "Summer rain"), (2, "Summertime")],
+            "users": [(1, "summer_fan")]
+        })
+        self.assertEqual(self.index.search("rain", 5)["songs"], [(1, "Summer rain")])
+    
+    def test_incremental_updates(self):
+        """Test renamed and removed entries aren't found by old name."""
+        self.index.add("songs", 1, "Autumn rain")
+        self.index.remove("songs", 2)
+        self.assertEqual(self.index.search("summer", 5)["songs"], [])
+        self.assertEqual(self.index.search("autumn", 5)["songs"], [(1, "Autumn rain")])
+    
+    def test_limit(self):
+        """Test amount of entries of one kind is limited."""
+        self.assertEqual(len(self.index.search("s", 1)["songs"]), 1)
+
+
+class SuggestApiTestCase(unittest.TestCase):
+    """Case to test suggestions api."""
+    
+    def setUp(self):
+        """Test case set up."""
+        self.app = create_app("testing")
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        self.client = self.app.test_client()
+        self.author = User(username="john", email="john@example.com", password="cat")
+        db.session.add_all([self.author, Song(name="Johnny B. Goode", author=self.author)])
+        db.session.commit()
+    
+    def tearDown(self):
+        """Test case tear down."""
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+    
+    def test_suggest(self):
+        """Test songs and users are suggested by prefix."""
+        resp = self.client.get("/api/v1/search/suggest?q=joh")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual([song["name"] for song in resp.json["songs"]], ["Johnny B. Goode"])
+        self.assertEqual([user["username"] for user in resp.json["users"]], ["john"])
+    
+    def test_suggestions_follow_commits(self):
+        """Test loaded index is updated on commit."""
+        self.client.get("/api/v1/search/suggest?q=j")
+        song = Song.query.first()
+        song.name = "Roll over Beethoven"
+        db.session.add(Song(name="Rock and roll music", author=self.author))
+        db.session.commit()
+        resp = self.client.get("/api/v1/search/suggest?q=ro")
+        self.assertEqual(sorted(song["name"] for song in resp.json["songs"]),
+                         ["Rock and roll music", "Roll over Beethoven"])
+        db.session.delete(Song.query.filter_by(name="Roll over Beethoven").first())
+        db.session.commit()
+        resp = self.client.get("/api/v1/search/suggest?q=beet")
+        self.assertEqual(resp.json["songs"], [])
+    
+    def test_registered_user_is_suggested(self):
+        """Test user flushed before commit by autoflush is added to loaded index."""
+        self.client.get("/api/v1/search/suggest?q=j")
+        db.session.add(User(username="mary", email="mary@example.com", password="dog"))
+        db.session.commit()
+        resp = self.client.get("/api/v1/search/suggest?q=mar")
+        self.assertEqual([user["username"] for user in resp.json["users"]], ["mary"])
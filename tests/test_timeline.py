@@ -0,0 +1,111 @@
+import unittest
+
+from app import create_app, db
+from app.models import Role, Song, TimelineEntry, User
+
+
+class TimelineTestCase(unittest.TestCase):
+    """Case to test fan-out timelines of followed songs."""
+    
+    def setUp(self):
+        """Test case set up."""
+        self.app = create_app("testing")
+        self.app.config["TIMELINE_DEPTH"] = 3
+        self.app.config["TIMELINE_FANOUT_LIMIT"] = 2
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        self.john = User(username="john", email="john@example.com", password="cat")
+        self.susan = User(username="susan", email="susan@example.com", password="dog")
+        db.session.add_all([self.john, self.susan])
+        db.session.commit()
+    
+    def tearDown(self):
+        """Test case tear down."""
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+    
+    def publish(self, author, *names):
+        """Publish songs of author."""
+        for name in names:
+            db.session.add(Song(name=name, author=author))
+            db.session.commit()
+    
+    def timeline(self, user):
+        """Get names of user timeline songs."""
+        return [song.name for song in user.timeline_songs]
+    
+    def test_fan_out_and_trim(self):
+        """Test published songs reach followers up to timeline depth."""
+        self.john.follow(self.susan)
+        db.session.commit()
+        self.publish(self.susan, "a", "b", "c", "d")
+        self.assertEqual(self.timeline(self.john), ["d", "c", "b"])
+        self.assertEqual(self.timeline(self.susan), ["d", "c", "b"])
+        self.assertEqual(TimelineEntry.query.filter_by(user_id=self.john.user_id).count(), 3)
+    
+    def test_follow_backfills_and_unfollow_removes(self):
+        """Test following copies recent songs and unfollowing removes them."""
+        self.publish(self.susan, "a", "b")
+        self.publish(self.john, "c")
+        self.john.follow(self.susan)
+        db.session.commit()
+        self.assertEqual(sorted(self.timeline(self.john)), ["a", "b", "c"])
+        self.john.unfollow(self.susan)
+        db.session.commit()
+        self.assertEqual(self.timeline(self.john), ["c"])
+    
+    def test_deleted_song_leaves_timelines(self):
+        """Test deleted song is removed from timelines."""
+        self.john.follow(self.susan)
+        db.session.commit()
+        self.publish(self.susan, "a")
+        db.session.delete(Song.query.filter_by(name="a").first())
+        db.session.commit()
+        self.assertEqual(self.timeline(self.john), [])
+    
+    def test_fan_out_on_read(self):
+        """Test songs of popular author are merged into timeline on read."""
+        alex = User(username="alex", email="alex@example.com", password="fox")
+        db.session.add(alex)
+        db.session.commit()
+        self.john.follow(self.susan)
+        alex.follow(self.susan)
+        db.session.commit()
+        self.publish(self.john, "a")
+        self.publish(self.susan, "b")
+        self.assertTrue(self.susan.fanout_on_read)
+        self.assertEqual(TimelineEntry.query.filter_by(song_id=Song.query.filter_by(name="b").first().song_id).count(), 0)
+        self.assertEqual(self.timeline(self.john), ["b", "a"])
+        self.assertEqual(self.timeline(alex), ["b"])
+    
+    def page(self, user, page):
+        """Get names of songs on page of two followed songs."""
+        return [song.name for song in user.paginate_timeline(page, 2).items]
+    
+    def test_pages_beyond_timeline(self):
+        """Test followed songs older than trimmed timeline are read from database."""
+        self.john.follow(self.susan)
+        db.session.commit()
+        self.publish(self.susan, "a", "b", "c", "d", "e")
+        self.assertEqual(self.timeline(self.john), ["e", "d", "c"])
+        self.assertEqual([self.page(self.john, page) for page in (1, 2, 3, 4)],
+                         [["e", "d"], ["c", "b"], ["a"], []])
+        self.assertEqual(self.john.paginate_timeline(1, 2).total, 5)
+    
+    def test_fan_out_on_read_is_bounded(self):
+        """Test at most timeline depth songs of popular author are merged in."""
+        alex = User(username="alex", email="alex@example.com", password="fox")
+        db.session.add(alex)
+        db.session.commit()
+        self.john.follow(self.susan)
+        alex.follow(self.susan)
+        db.session.commit()
+        self.publish(self.susan, "a", "b", "c", "d", "e")
+        self.assertTrue(self.susan.fanout_on_read)
+        self.assertEqual(self.timeline(self.john), ["e", "d", "c"])
+        self.assertEqual([self.page(self.john, page) for page in (1, 2, 3)],
+                         [["e", "d"], ["c", "b"], ["a"]])
+
@@ -0,0 +1,77 @@
+import os
+import unittest
+
+from app import create_app, db
+from app.models import Role, Song, UploadState, User
+
+
+def fake_encode(encoder, src, dst, bitrate):
+    """Write file of size proportional to bitrate instead of encoding."""
+    with open(dst, "wb") as f:
+        f.write(bytes(bitrate))
+
+
+class TranscodeTestCase(unittest.TestCase):
+    """Case to test renditions and their selection."""
+    
+    def setUp(self):
+        """Test case set up."""
+        self.app = create_app("testing")
+        self.app.config["TRANSCODE_ENCODER"] = "true"
+        self.app.transcoder.encode = fake_encode
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        user = User(username="john", email="john@example.com", password="cat")
+        self.song = Song(name="song", author=user, url="/media/1", upload_state=UploadState.READY,
+                         codec="pcm", bitrate=1411200)
+        db.session.add_all([user, self.song])
+        db.session.commit()
+        with open(self.app.storage.path(str(self.song.song_id)), "wb") as f:
+            f.write(bytes(1000))
+        self.client = self.app.test_client()
+    
+    def tearDown(self):
+        """Test case tear down."""
+        self.app.transcoder.shutdown()
+        self.app.waveforms.shutdown()
+        for name in ["1", "1.low.mp3", "1.medium.mp3", "1.high.mp3"]:
+            self.app.storage.delete(name)
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+    
+    def test_renditions_below_source_bitrate(self):
+        """Test only renditions with lower bitrate than source are made."""
+        self.assertEqual(self.app.transcoder.transcode(self.song.song_id), ["low", "medium", "high"])
+        self.assertEqual(os.path.getsize(self.app.storage.path("1.low.mp3")), 64)
+        self.song.bitrate = 128000
+        db.session.commit()
+        self.assertEqual(self.app.transcoder.transcode(self.song.song_id), ["low"])
+        self.assertEqual(len(Song.query.get(self.song.song_id).renditions), 3)
+    
+    def test_rendition_selection(self):
+        """Test rendition is chosen by query param and client hints."""
+        self.app.transcoder.transcode(self.song.song_id)
+        url = f"/api/v1/songs/{self.song.song_id}"
+        resp = self.client.get(url)
+        self.assertEqual(resp.json["stream_url"], "/media/1.high.mp3")
+        self.assertEqual(len(resp.json["renditions"]), 3)
+        self.assertIn("Save-Data", resp.headers["Vary"])
+        self.assertIn("ECT", resp.headers["Accept-CH"])
+        self.assertEqual(self.client.get(url, headers={"Save-Data": "on"}).json["stream_url"], "/media/1.low.mp3")
+        self.assertEqual(self.client.get(url, headers={"ECT": "3g"}).json["stream_url"], "/media/1.medium.mp3")
+        self.assertEqual(self.client.get(url + "?quality=original").json["stream_url"], "/media/1")
+        page = self.client.get(f"/song/{self.song.song_id}?quality=low").get_data(as_text=True)
+        self.assertIn('src="/media/1.low.mp3"', page)
+    
+    def test_shutdown_finishes_jobs(self):
+        """Test shutdown waits for submitted jobs and stops worker threads."""
+        self.app.config["TRANSCODE_RENDITIONS"] = {"low": 64}
+        self.app.transcoder.submit(self.song.song_id)
+        self.app.transcoder.shutdown()
+        self.assertEqual([rendition.name for rendition in Song.query.get(self.song.song_id).renditions], ["low"])
+        with self.assertRaises(RuntimeError):
+            self.app.transcoder.submit(self.song.song_id)
+
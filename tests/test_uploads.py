@@ -0,0 +1,138 @@
+import hashlib
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+from base64 import b64encode
+
+from app import create_app, db
+from app.models import Role, Song, UploadState, User
+
+
+class ChunkedUploadTestCase(unittest.TestCase):
+    """Case to test chunked upload API."""
+    
+    def setUp(self):
+        """Test case set up."""
+        self.app = create_app("testing")
+        self.spool = tempfile.mkdtemp()
+        self.app.config["UPLOAD_SPOOL_DIR"] = self.spool
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        u = User(username="john", email="john@example.com", password="cat", confirmed=True)
+        db.session.add(u)
+        db.session.commit()
+        self.client = self.app.test_client()
+        self.data = os.urandom(3000)
+    
+    def tearDown(self):
+        """Test case tear down."""
+        self.app.uploader.shutdown()
+        self.app.transcoder.shutdown()
+        self.app.waveforms.shutdown()
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+        shutil.rmtree(self.spool)
+    
+    def get_headers(self, **headers):
+        """Build API headers with basic auth."""
+        headers["Authorization"] = "Basic " + b64encode(b"john:cat").decode("utf-8")
+        return headers
+    
+    def start_upload(self, **kwargs):
+        """Start chunked upload of test data."""
+        payload = {"name": "song", "size": len(self.data)}
+        payload.update(kwargs)
+        resp = self.client.post("/api/v1/uploads/", json=payload, headers=self.get_headers())
+        self.assertEqual(resp.status_code, 201)
+        return resp.get_json()
+    
+    def put_chunk(self, url, start, end, **headers):
+        """Send chunk of test data."""
+        headers["Content-Range"] = f"bytes {start}-{end - 1}/{len(self.data)}"
+        return self.client.put(url, data=self.data[start:end], headers=self.get_headers(**headers))
+    
+    def test_upload_in_chunks(self):
+        """Test upload assembled from chunks reaches storage."""
+        status = self.start_upload(sha256=hashlib.sha256(self.data).hexdigest())
+        resp = self.put_chunk(status["url"], 0, 1000,
+                              **{"X-Chunk-Sha256": hashlib.sha256(self.data[:1000]).hexdigest()})
+        self.assertEqual(resp.get_json()["received"], 1000)
+        resp = self.put_chunk(status["url"], 1000, 3000)
+        self.assertTrue(resp.get_json()["complete"])
+        self.app.uploader.join()
+        self.app.waveforms.join()
+        db.session.expire_all()
+        song = Song.query.get(status["song_id"])
+        self.assertEqual(song.upload_state, UploadState.READY)
+        with self.app.storage.open(str(song.song_id)) as f:
+            self.assertEqual(f.read(), self.data)
+        self.app.storage.delete(str(song.song_id))
+    
+    def test_upload_stores_audio_info(self):
+        """Test uploaded audio headers are described on song."""
+        self.data = b"RIFF" + struct.pack("<I", 36 + 2000) + b"WAVEfmt " \
+            + struct.pack("<IHHIIHH", 16, 1, 1, 8000, 16000, 2, 16) + b"data" + struct.pack("<I", 2000) + bytes(2000)
+        status = self.start_upload()
+        self.put_chunk(status["url"], 0, len(self.data))
+        self.app.uploader.join()
+        self.app.waveforms.join()
+        db.session.expire_all()
+        song = Song.query.get(status["song_id"])
+        self.assertEqual((song.codec, song.channels, song.sample_rate), ("pcm", 1, 8000))
+        self.assertAlmostEqual(song.duration, 0.125)
+        self.assertEqual(song.audio_json()["content_type"], "audio/wav")
+        self.assertTrue(song.has_waveform)
+        self.app.storage.delete(str(song.song_id))
+        self.app.storage.delete(f"{song.song_id}.waveform")
+    
+    def test_upload_with_malformed_header(self):
+        """Test upload with truncated audio header is stored with given type."""
+        self.data = b"RIFF" + struct.pack("<I", 20) + b"WAVEfmt " + struct.pack("<I", 16) + bytes(6)
+        status = self.start_upload(content_type="audio/wav")
+        resp = self.put_chunk(status["url"], 0, len(self.data))
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp.get_json()["complete"])
+        self.app.uploader.join()
+        db.session.expire_all()
+        song = Song.query.get(status["song_id"])
+        self.assertEqual(song.upload_state, UploadState.READY)
+        self.assertIsNone(song.codec)
+        self.app.storage.delete(str(song.song_id))
+    
+    def test_upload_of_deleted_song_is_discarded(self):
+        """Test upload finished after its song was deleted leaves no files."""
+        status = self.start_upload()
+        db.session.delete(Song.query.get(status["song_id"]))
+        db.session.commit()
+        resp = self.put_chunk(status["url"], 0, len(self.data))
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(os.listdir(self.spool), [])
+    
+    def test_chunk_must_continue_upload(self):
+        """Test chunk with wrong offset is rejected and status allows resume."""
+        status = self.start_upload()
+        self.put_chunk(status["url"], 0, 1000)
+        resp = self.put_chunk(status["url"], 2000, 3000)
+        self.assertEqual(resp.status_code, 400)
+        resp = self.client.get(status["url"], headers=self.get_headers())
+        self.assertEqual(resp.get_json()["received"], 1000)
+    
+    def test_corrupted_chunk_is_rejected(self):
+        """Test chunk with wrong checksum is not stored."""
+        status = self.start_upload()
+        resp = self.put_chunk(status["url"], 0, 1000, **{"X-Chunk-Sha256": "0" * 64})
+        self.assertEqual(resp.status_code, 400)
+        resp = self.client.get(status["url"], headers=self.get_headers())
+        self.assertEqual(resp.get_json()["received"], 0)
+    
+    def test_checksum_mismatch_fails_song(self):
+        """Test whole file checksum is verified."""
+        status = self.start_upload(sha256="0" * 64)
+        resp = self.put_chunk(status["url"], 0, 3000)
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(Song.query.get(status["song_id"]).upload_state, UploadState.FAILED)
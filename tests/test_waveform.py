@@ -0,0 +1,82 @@
+import os
+import unittest
+import wave
+from base64 import b64decode
+
+import numpy as np
+
+from app import create_app, db
+from app.models import Role, Song, UploadState, User
+from app.waveform import bucket_peaks, pack_waveform, reduce_peaks, store_song_waveform, unpack_waveform
+
+
+class WaveformTestCase(unittest.TestCase):
+    """Case to test waveform peaks."""
+    
+    def setUp(self):
+        """Test case set up."""
+        self.app = create_app("testing")
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        self.client = self.app.test_client()
+    
+    def tearDown(self):
+        """Test case tear down."""
+        self.app.transcoder.shutdown()
+        self.app.waveforms.shutdown()
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+    
+    def test_peaks(self):
+        """Test bucket peaks across block boundaries and coarser levels."""
+        samples = np.sin(np.arange(1000, dtype=np.float32)).reshape(-1, 1)
+        mins, maxs = bucket_peaks(iter([samples[:300], samples[300:]]), 64)
+        self.assertEqual(len(mins), 16)
+        self.assertAlmostEqual(mins[1], samples[64:128].min())
+        self.assertAlmostEqual(maxs[-1], samples[960:].max())
+        coarse_mins, coarse_maxs = reduce_peaks(mins, maxs, 4)
+        self.assertEqual(len(coarse_mins), 4)
+        self.assertAlmostEqual(coarse_maxs[0], samples[:256].max())
+        sample_rate, levels = unpack_waveform(pack_waveform(8000, [(64, mins, maxs)], bits=16))
+        self.assertEqual((sample_rate, levels[0][0], len(levels[0][1])), (8000, 64, 32))
+        self.assertEqual(levels[0][1][1], round(float(maxs[0]) * 32767))
+    
+    def test_song_waveform(self):
+        """Test waveform of uploaded WAV is stored and served with long caching."""
+        user = User(username="john", email="john@example.com", password="cat")
+        song = Song(name="song", author=user, codec="pcm", url="/media/1", upload_state=UploadState.READY)
+        db.session.add_all([user, song])
+        db.session.commit()
+        path = self.app.storage.path(str(song.song_id))
+        with wave.open(path, "wb") as w:
+            w.setnchannels(2)
+            w.setsampwidth(2)
+            w.setframerate(8000)
+            w.writeframes((np.ones((8000, 2)) * 16384).astype("<i2").tobytes())
+        self.assertTrue(store_song_waveform(song.song_id))
+        url = f"/api/v1/songs/{song.song_id}/waveform"
+        resp = self.client.get(url)
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn("immutable", resp.headers["Cache-Control"])
+        sample_rate, levels = unpack_waveform(resp.data)
+        self.assertEqual(sample_rate, 8000)
+        self.assertEqual([bucket for bucket, _ in levels], [256, 1024, 4096, 16384])
+        self.assertEqual(len(levels[0][1]), 2 * 32)
+        self.assertEqual(levels[0][1].max(), 64)
+        resp = self.client.get(url, headers={"If-None-Match": resp.headers["ETag"]})
+        self.assertEqual(resp.status_code, 304)
+        resp = self.client.get(url + "?encoding=base64")
+        self.assertEqual(unpack_waveform(b64decode(resp.get_json()["data"]))[0], 8000)
+        os.remove(path)
+        self.app.storage.delete(f"{song.song_id}.waveform")
+    
+    def test_missing_waveform(self):
+        """Test song without waveform."""
+        user = User(username="john", email="john@example.com", password="cat")
+        song = Song(name="song", author=user)
+        db.session.add_all([user, song])
+        db.session.commit()
+        self.assertEqual(self.client.get(f"/api/v1/songs/{song.song_id}/waveform").status_code, 404)